@@ -0,0 +1,185 @@
+"""
+热路径基准测试
+用合成的16通道音频帧测量 compute_rms、merge_stereo_to_mono、estimate_position_enhanced、多声源分解、
+detect_goals、GoalDetector.update、TempoMapper.update_bpm、逐通道响度映射和分频滤波在不同帧长和采样率下的单次调用耗时和内存分配，
+结果以JSON输出，便于在不同版本之间比较。
+
+用法:
+    python benchmarks/bench_hotpaths.py --output bench_before.json
+    python benchmarks/bench_hotpaths.py --output bench_after.json
+    python benchmarks/bench_hotpaths.py --compare bench_before.json bench_after.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.localization import compute_rms, merge_stereo_to_mono, estimate_position_enhanced, detect_goals, GoalDetector
+from utils.filterbank import DEFAULT_BANDS, FilterBank
+from utils.kernels import NUMPY_KERNELS, load_kernels
+from utils.multisource import MultiSourceLocalizer
+from utils.sliding import SlidingRMS
+from utils.tempo_mapper import TempoMapper
+
+CHUNK_DURATIONS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2)
+SAMPLE_RATES = (44100, 48000, 96000)
+CHANNELS = 16
+
+# 已安装numba时同时测量编译内核
+KERNELS = load_kernels('auto', os.path.join('.cache', 'numba'))
+
+# 定位麦克风坐标（通道3-8）
+MIC_POSITIONS = np.array([[0, 0], [0, 68], [58.5, 0], [58.5, 68], [117, 0], [117, 68]], dtype=float)
+MULTI_SOURCE = MultiSourceLocalizer(MIC_POSITIONS, max_sources=2)
+
+def make_frame(rng, samplerate, chunk_duration):
+    """生成一帧合成音频 (channels, samples)：低电平噪声 + 一个定位通道上的撞击"""
+    samples = int(samplerate * chunk_duration)
+    frame = (rng.standard_normal((CHANNELS, samples)) * 0.02).astype(np.float32)
+    frame[2 + rng.integers(6), :samples // 4] += 0.5
+    return frame
+
+def measure(func, repeat):
+    """
+    测量单次调用耗时和内存分配
+    返回字典: 耗时中位数/p95/最小值（微秒）和单次调用的峰值分配字节数
+    """
+    func()  # 预热
+    times = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        times[i] = time.perf_counter_ns() - start
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    times /= 1000.0
+    return {
+        'median_us': float(np.median(times)),
+        'p95_us': float(np.percentile(times, 95)),
+        'min_us': float(times.min()),
+        'peak_alloc_bytes': int(peak),
+    }
+
+def bench_cases(frame, samplerate):
+    """返回 {名称: 无参调用} 的基准用例"""
+    main_channels = frame[2:8]
+    goal_channels = frame[:2]
+    main_rms = compute_rms(main_channels, merge_stereo=False)
+    goal_rms = compute_rms(goal_channels, merge_stereo=False)
+    tempo_mapper = TempoMapper()
+    goal_detector = GoalDetector()
+    merged = np.empty((main_channels.shape[0] // 2, main_channels.shape[1]), dtype=np.float32)
+    filterbank = FilterBank(samplerate, DEFAULT_BANDS, channels=8, frame_samples=frame.shape[1])
+    # 滑动窗口：窗口为整帧，每次加入1/10帧的新样本，与compute_rms整帧重算比较
+    hop = main_channels[:, :max(1, frame.shape[1] // 10)]
+    sliding = SlidingRMS(6, frame.shape[1], hop.shape[1])
+    cases = {
+        'compute_rms': lambda: compute_rms(main_channels, merge_stereo=False),
+        'merge_stereo_to_mono': lambda: merge_stereo_to_mono(main_channels),
+        'merge_stereo_to_mono_out': lambda: merge_stereo_to_mono(main_channels, out=merged),
+        'compute_rms_stereo': lambda: compute_rms(main_channels, merge_stereo=True),
+        'sliding_rms_hop': lambda: sliding.update(hop),
+        'estimate_position_enhanced': lambda: estimate_position_enhanced(main_rms, MIC_POSITIONS),
+        'multi_source_decompose': lambda: MULTI_SOURCE.decompose(main_rms),
+        'detect_goals': lambda: detect_goals(goal_rms),
+        'goal_detector_update': lambda: goal_detector.update(goal_rms),
+        'tempo_update_bpm': lambda: tempo_mapper.update_bpm(main_rms),
+        'tempo_map_channels_loop': lambda: [tempo_mapper.map_intensity_to_0_127(tempo_mapper.calculate_intensity([v]))
+                                            for v in main_rms],
+        'tempo_map_channels_batch': lambda: tempo_mapper.map_intensity_to_0_127_batch(
+            tempo_mapper.calculate_intensity_batch(main_rms)),
+        'filterbank_process': lambda: (filterbank.process(frame[:8]), filterbank.band_energies()),
+    }
+    # 逐样本内核：NumPy版本，以及已安装numba时的编译版本
+    energies = np.zeros(8)
+    pair_energies = np.zeros(3)
+    for kernels in {NUMPY_KERNELS.name: NUMPY_KERNELS, KERNELS.name: KERNELS}.values():
+        cases[f'frame_sum_squares_{kernels.name}'] = (
+            lambda kernels=kernels: kernels.sum_squares(frame[:8], 0, energies))
+        cases[f'stereo_sum_squares_{kernels.name}'] = (
+            lambda kernels=kernels: kernels.stereo_sum_squares(main_channels, 0, pair_energies))
+        cases[f'merge_stereo_{kernels.name}'] = lambda kernels=kernels: kernels.merge_stereo(main_channels, merged)
+    return cases
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(repeat, seed):
+    rng = np.random.default_rng(seed)
+    results = []
+    for samplerate in SAMPLE_RATES:
+        for chunk_duration in CHUNK_DURATIONS:
+            frame = make_frame(rng, samplerate, chunk_duration)
+            for name, func in bench_cases(frame, samplerate).items():
+                entry = {'function': name, 'samplerate': samplerate, 'chunk_duration': chunk_duration,
+                         'samples': frame.shape[1]}
+                entry.update(measure(func, repeat))
+                results.append(entry)
+                print(f"{name:28s} {samplerate:6d}Hz {chunk_duration * 1000:6.1f}ms  "
+                      f"median {entry['median_us']:9.1f}us  p95 {entry['p95_us']:9.1f}us  "
+                      f"alloc {entry['peak_alloc_bytes']:9d}B")
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+def compare(before_path, after_path):
+    """比较两次基准结果，打印中位耗时和分配的变化"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    key = lambda r: (r['function'], r['samplerate'], r['chunk_duration'])
+    before_results = {key(r): r for r in before['results']}
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+    for r in after['results']:
+        old = before_results.get(key(r))
+        if old is None:
+            continue
+        ratio = r['median_us'] / old['median_us'] if old['median_us'] > 0 else float('inf')
+        print(f"{r['function']:28s} {r['samplerate']:6d}Hz {r['chunk_duration'] * 1000:6.1f}ms  "
+              f"{old['median_us']:9.1f}us -> {r['median_us']:9.1f}us ({ratio:5.2f}x)  "
+              f"alloc {old['peak_alloc_bytes']:9d}B -> {r['peak_alloc_bytes']:9d}B")
+
+def main():
+    parser = argparse.ArgumentParser(description="热路径基准测试")
+    parser.add_argument('--repeat', type=int, default=200, help="每个用例的调用次数")
+    parser.add_argument('--seed', type=int, default=0, help="合成数据随机种子")
+    parser.add_argument('--output', default=None, help="结果JSON文件")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="比较两个结果文件")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args.repeat, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"结果已写入: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,135 +1,201 @@
-import yaml
-import numpy as np
-from utils.audio_stream import AudioStream
-from utils.localization import compute_rms, estimate_position_enhanced, estimate_position_with_smoothing, detect_goals
-from utils.osc_sender import OSCSender
-from utils.tempo_mapper import TempoMapper
+import time
+
+# 启动计时起点，在导入其他模块之前记录
+LAUNCH_TIME = time.perf_counter()
+
+import argparse
+import logging
+import sys
+
+log = logging.getLogger("foosball")
+
+# 逐帧状态行，按日志限流（默认每秒最多一行），格式化在后台日志线程中完成
+STATUS_FORMAT = ("映射响度: %s, 原始位置: (%.1f, %.1f), OSC位置: (%.3f, %.3f), 球门音量: 左门[%.3f] 右门[%.3f], "
+                 "进球检测: %s, BPM: %.1f, 队列深度: %s")
 
 def load_config(path="mic_config.yaml"):
+    import yaml
     with open(path, 'r') as f:
         config = yaml.safe_load(f)
     return config
 
-def map_coordinates_to_osc_range(x, y):
-    """
-    将原始坐标映射到OSC范围（-1到1）
-    新坐标系: x: -10到127 -> -1到1, y: 0-68 -> -1到1
-    """
-    # x坐标范围：-10到127，总范围137
-    x_mapped = 2.0 * (float(x) + 10.0) / 137.0 - 1.0
-    y_mapped = 2.0 * float(y) / 68.0 - 1.0
-    return x_mapped, y_mapped
-
-def main():
-    print("=== Foosball 声音定位系统 ===")
-    print("程序开始运行...")
-    config = load_config()
-    print(f"配置加载成功")
+def __getattr__(name):
+    # 兼容旧代码的 from main import map_coordinates_to_osc_range，按需导入
+    if name == 'map_coordinates_to_osc_range':
+        from utils.processor import map_coordinates_to_osc_range
+        return map_coordinates_to_osc_range
+    raise AttributeError(f"module 'main' has no attribute {name!r}")
+
+class StartupTimer:
+    """记录启动各阶段的耗时，首个OSC包发出时打印一次"""
+
+    def __init__(self, launch_time):
+        self.launch_time = launch_time
+        self.marks = []
+        self.first_packet_time = None
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def first_packet(self):
+        if self.first_packet_time is not None:
+            return
+        self.first_packet_time = time.perf_counter()
+        previous = self.launch_time
+        parts = []
+        for name, t in self.marks:
+            parts.append(f"{name} {(t - previous) * 1000:.0f}ms")
+            previous = t
+        log.info("首个OSC包: 启动后 %.0fms（%s）", (self.first_packet_time - self.launch_time) * 1000, ', '.join(parts))
+
+def publish_result(result, osc_sender, stats, startup=None, frame_log=None):
+    """输出一帧分析结果：记录状态日志和逐帧记录，发送OSC，到达间隔时发布耗时统计"""
+    mapped_channels = result['mapped_channels']
+    raw_pos = result['raw_pos']
+    osc_x, osc_y = result['osc_pos']
+    goal_rms = result['goal_rms']
+    goal_detection = result['goal_detection']
+    bpm = result['bpm']
     
-    # 使用通道3-8进行定位（对应索引2-7）
-    mic_positions = np.array([mic['position'] for mic in config['mics'][2:8]])
-    device_id = config['device_id']
-    sample_rate = config['sample_rate']
-    channels = config['channels']
-    chunk_duration = config['chunk_duration']
+    # 输出原始坐标和OSC坐标，确保同步，并显示球门音量（参数不在这里格式化）
+    log.info(STATUS_FORMAT, mapped_channels, raw_pos[0], raw_pos[1], osc_x, osc_y, goal_rms[0], goal_rms[1],
+             goal_detection, bpm, result.get('queue_depths', '-'))
+    if frame_log is not None:
+        frame_log.write(result)
     
-    # OSC配置
-    osc_ip = config['osc']['ip']
-    osc_port = config['osc']['port']
-    osc_address = config['osc']['address']
+    t_osc = time.perf_counter()
+    # 发送主状态数据（使用原始坐标）
+    osc_sender.send_full_status(mapped_channels, raw_pos[0], raw_pos[1], goal_detection, bpm)
     
-    # 位置估计独立OSC配置
-    position_osc_ip = config['position_osc']['ip']
-    position_osc_port = config['position_osc']['port']
-    position_osc_address = config['position_osc']['address']
+    # 发送位置估计到独立端口（使用OSC坐标）
+    osc_sender.send_position(osc_x, osc_y)
+    # 多声源定位：每个声源发送到自己的 /source/N/xyz，消失的声源静音
+    osc_sender.send_sources(result.get('osc_sources') or ())
     
-    print(f"麦克风位置: {mic_positions}")
-    print(f"音频设备ID: {device_id}")
-    print(f"采样率: {sample_rate}")
-    print(f"通道数: {channels}")
-    print(f"采样时长: {chunk_duration}")
-    print(f"主OSC目标: {osc_ip}:{osc_port}")
-    print(f"主OSC地址: {osc_address}")
-    print(f"位置OSC目标: {position_osc_ip}:{position_osc_port}")
-    print(f"位置OSC地址: {position_osc_address}")
-
-    audio_stream = AudioStream(device=device_id, samplerate=sample_rate,
-                               channels=channels, chunk_duration=chunk_duration)
-    osc_sender = OSCSender(ip=osc_ip, port=osc_port, 
-                          position_ip=position_osc_ip, position_port=position_osc_port)
+    # 发送带样本精度时间戳的进球事件（transient模式）
+    for goal_index, sample_index, stream_time in result['goal_events']:
+        osc_sender.send_goal_event(goal_index, stream_time, sample_index)
+    # 球速、方向和射门事件（启用射门分析时）
+    if result.get('ball') is not None:
+        osc_sender.send_ball(*result['ball'])
+    for event, goal_index, speed, stream_time in result.get('shot_events', ()):
+        osc_sender.send_shot_event(event, goal_index, speed, stream_time)
+    stats.maybe_publish(osc_sender)
     
-    # 初始化BPM映射器
-    tempo_mapper = TempoMapper(
-        base_bpm=120,
-        max_bpm=180,
-        min_bpm=60,
-        attack_rate=0.1,
-        decay_rate=0.05,
-        silence_decay_rate=0.3,
-        silence_threshold=0.05
-    )
+    # bundle模式下把本帧的消息打包交给发送线程
+    osc_sender.flush()
+    stats.record('osc', time.perf_counter() - t_osc)
+    if startup is not None:
+        startup.first_packet()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Foosball 声音定位系统：实时采集、定位、进球检测并发送OSC")
+    parser.add_argument('--config', default="mic_config.yaml", help="麦克风配置文件")
+    parser.add_argument('--cache-dir', default=".cache", help="编译后配置的缓存目录")
+    parser.add_argument('--no-cache', action='store_true', help="不使用配置缓存，重新解析和校验配置文件")
+    parser.add_argument('--check', action='store_true', help="只校验配置文件后退出")
+    parser.add_argument('--verbose', action='store_true', help="打印完整的启动信息")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    startup = StartupTimer(LAUNCH_TIME)
+
+    from utils.config import ConfigError, load_runtime_config
+    try:
+        runtime, cached = load_runtime_config(args.config, cache_dir=args.cache_dir, use_cache=not args.no_cache)
+    except ConfigError as e:
+        print(e)
+        return 2
+    startup.mark("配置（缓存）" if cached else "配置")
+    if args.check:
+        print(f"配置有效: {runtime.summary()}")
+        return 0
+
+    print("=== Foosball 声音定位系统 ===")
+    print(runtime.summary())
+    if args.verbose:
+        print(f"麦克风位置: {runtime.main_mic_positions.tolist()}")
+        print("请确保:")
+        print("1. BlackHole 16ch 设备正在接收音频")
+        print("2. Max/MSP 已启动并配置了OSC接收")
+        print(f"3. Max/MSP 监听端口 {runtime.osc_target.port} (主状态)")
+        print(f"4. Max/MSP 监听端口 {runtime.position_target.port} (位置估计)")
+        print("麦克风布局: 1左门, 2右门, 3左下, 4左上, 5中下, 6中上, 7右下, 8右上")
+        print("坐标系统: 原始坐标(0-117, 0-68) -> OSC坐标(-1到1, -1到1)")
+
+    # 日志在后台线程中格式化和写出；逐帧记录写入预分配的记录块
+    from utils.log import create_frame_log, setup_logging
+    logging_service = setup_logging(runtime)
+    frame_log = create_frame_log(runtime)
+
+    # 重量级模块在配置校验通过后才导入
+    from utils.audio_stream import create_audio_stream
+    from utils.osc_sender import create_osc_sender
+    from utils.processor import create_processor
+    from utils.stats import create_stats
+
+    # 工厂函数直接使用编译后的RuntimeConfig，不再重新解析原始配置
+    audio_stream = create_audio_stream(runtime)
+    # simple: 每条消息单独发送；bundle: 预编码消息打包为bundle，由后台线程发送
+    osc_sender = create_osc_sender(runtime)
     
-    # 位置平滑处理变量
-    prev_position = None
-    smoothing_factor = 0.6  # 平滑因子，可以调整
-
-    print("\n开始采集与定位，按 Ctrl+C 退出")
-    print("使用增强定位算法 + 平滑处理")
-    print("请确保:")
-    print("1. BlackHole 16ch 设备正在接收音频")
-    print("2. Max/MSP 已启动并配置了OSC接收")
-    print("3. Max/MSP 监听端口 11111 (主状态)")
-    print("4. Max/MSP 监听端口 7777 (位置估计)")
-    print("新布局: 蓝方(左) vs 红方(右)")
-    print("麦克风布局: 1左门, 2右门, 3左下, 4左上, 5中下, 6中上, 7右下, 8右上")
-    print("坐标系统: 原始坐标(0-117, 0-68) -> OSC坐标(-1到1, -1到1)")
+    # 热路径耗时统计（p50/p95/p99、overrun），定期发布到OSC和JSON lines文件
+    stats = create_stats(runtime)
+    processor = create_processor(runtime, audio_stream.chunk_samples, stats=stats,
+                                 hop_samples=audio_stream.hop_samples)
+    pipeline_config = runtime.section('pipeline')
+    startup.mark("初始化")
+    print("开始采集与定位，按 Ctrl+C 退出")
 
     try:
-        while True:
-            audio_chunk = audio_stream.get_audio_chunk()  # (channels, samples)
-            
-            # 提取球门麦克风通道（1-2通道，对应索引0-1）
-            goal_channels = audio_chunk[:2]  # 通道1-2用于进球检测
-            # 提取定位麦克风通道（3-8通道，对应索引2-7）
-            main_channels = audio_chunk[2:8]  # 通道3-8用于定位
-            
-            # 处理定位麦克风通道
-            main_rms = compute_rms(main_channels, merge_stereo=False)  # 单声道处理
-            
-            # 使用增强的定位算法和平滑处理
-            raw_pos = estimate_position_with_smoothing(main_rms, mic_positions, prev_position, smoothing_factor)
-            prev_position = raw_pos.copy()  # 保存当前位置用于下次平滑
-            
-            # 映射到OSC坐标范围
-            osc_x, osc_y = map_coordinates_to_osc_range(raw_pos[0], raw_pos[1])
-            
-            # 处理球门麦克风
-            goal_rms = compute_rms(goal_channels, merge_stereo=False)  # 球门麦克风是单声道
-            goal_detection = detect_goals(goal_rms)  # [左球门进球(0/1), 右球门进球(0/1)]
-            
-            # 计算BPM和映射响度
-            bpm, mapped_intensity = tempo_mapper.update_bpm(main_rms)
-            
-            # 计算每个通道的映射响度
-            mapped_channels = []
-            for i in range(6):  # 6个定位麦克风通道
-                channel_rms = main_rms[i] if i < len(main_rms) else 0
-                channel_intensity = tempo_mapper.calculate_intensity([channel_rms])
-                mapped_channel = tempo_mapper.map_intensity_to_0_127(channel_intensity)
-                mapped_channels.append(mapped_channel)
-            
-            # 输出原始坐标和OSC坐标，确保同步，并显示球门音量
-            print(f"映射响度: {[f'{v:.1f}' for v in mapped_channels]}, 原始位置: ({raw_pos[0]:.1f}, {raw_pos[1]:.1f}), OSC位置: ({osc_x:.3f}, {osc_y:.3f}), 球门音量: 左门[{goal_rms[0]:.3f}] 右门[{goal_rms[1]:.3f}], 进球检测: {goal_detection}, BPM: {bpm:.1f}")
-            
-            # 发送主状态数据（使用原始坐标）
-            osc_sender.send_full_status(mapped_channels, raw_pos[0], raw_pos[1], goal_detection, bpm)
-            
-            # 发送位置估计到独立端口（使用OSC坐标）
-            osc_sender.send_position(osc_x, osc_y)
+        if pipeline_config.get('enabled', False) and runtime.pipeline_runtime == 'asyncio':
+            # 事件驱动运行时：分析在专用线程中运行，事件循环处理控制端口的参数修改和输出
+            import asyncio
+            from utils.async_runtime import AsyncRuntime, ControlServer
+            control_config = runtime.section('control')
+            control = None
+            if control_config.get('enabled', False):
+                control = ControlServer(processor, ip=control_config.get('ip', '127.0.0.1'),
+                                        port=control_config.get('port', 9000),
+                                        prefix=control_config.get('prefix', '/foosball/control'))
+            async_runtime = AsyncRuntime(audio_stream, processor,
+                                         lambda result: publish_result(result, osc_sender, stats, startup, frame_log),
+                                         control=control,
+                                         queue_size=pipeline_config.get('capture_queue_size', 4))
+            asyncio.run(async_runtime.run())
+        elif pipeline_config.get('enabled', False):
+            # 采集、分析、输出分别在独立线程中运行，分析跟不上时丢弃最旧的帧
+            from utils.pipeline import Pipeline
+            pipeline = Pipeline(audio_stream, processor,
+                                lambda result: publish_result(result, osc_sender, stats, startup, frame_log),
+                                capture_queue_size=pipeline_config.get('capture_queue_size', 4),
+                                output_queue_size=pipeline_config.get('output_queue_size', 8))
+            pipeline.run()
+        else:
+            audio_stream.start()
+            while True:
+                # stream模式下返回预分配缓冲，按帧移连续读取，帧之间没有间隙
+                t_capture = time.perf_counter()
+                audio_chunk = audio_stream.get_audio_chunk()  # (channels, samples)
+                t_frame = time.perf_counter()
+                stats.record('capture', t_frame - t_capture)
+                result = processor.process(audio_chunk, audio_stream.frame_start_sample)
+                result['frame_start_sample'] = audio_stream.frame_start_sample
+                publish_result(result, osc_sender, stats, startup, frame_log)
+                frame_time = time.perf_counter() - t_frame
+                stats.end_frame(frame_time)
+                processor.report_latency(frame_time)
     except KeyboardInterrupt:
         print("\n退出程序")
     finally:
         audio_stream.close()
+        processor.close()
+        osc_sender.close()
+        stats.close()
+        frame_log.close()
+        logging_service.close()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
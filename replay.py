@@ -0,0 +1,62 @@
+import argparse
+import sys
+from utils.config import ConfigError, load_runtime_config
+from utils.log import setup_logging
+from utils.processor import create_processor
+from utils.replay import FileAudioStream, ResultWriter, run_replay
+from utils.stats import PerformanceStats
+
+def main():
+    parser = argparse.ArgumentParser(description="离线回放：用多通道录音跑完整分析流程，结果写入文件")
+    parser.add_argument('recording', help="16通道WAV/FLAC录音文件")
+    parser.add_argument('--config', default="mic_config.yaml", help="麦克风配置文件")
+    parser.add_argument('--output', default="replay_results.csv", help="逐帧结果CSV文件")
+    parser.add_argument('--hop', type=float, default=None, help="帧移（秒），默认使用配置中的hop_duration")
+    parser.add_argument('--no-output', action='store_true', help="不写结果文件，只测量分析速度")
+    args = parser.parse_args()
+
+    try:
+        runtime, _ = load_runtime_config(args.config)
+    except ConfigError as e:
+        print(e)
+        return 2
+    chunk_duration = runtime.chunk_duration
+    hop_duration = args.hop if args.hop is not None else runtime.hop_duration
+    # 与配置文件的hop_duration使用相同的规则
+    if hop_duration <= 0:
+        parser.error(f"--hop 必须是正数，当前为 {hop_duration!r}")
+    if hop_duration > chunk_duration:
+        parser.error(f"--hop 不能大于 chunk_duration ({chunk_duration})")
+    logging_service = setup_logging(runtime)
+
+    audio_stream = FileAudioStream(args.recording, chunk_duration=chunk_duration, hop_duration=hop_duration)
+    if audio_stream.samplerate != runtime.sample_rate:
+        print(f"注意: 录音采样率 {audio_stream.samplerate} 与配置 {runtime.sample_rate} 不一致，按录音采样率处理")
+        runtime = runtime.with_sample_rate(audio_stream.samplerate)
+
+    # 回放时帧间没有等待，统计只用于汇总各阶段耗时
+    stats = PerformanceStats(hop_duration)
+    processor = create_processor(runtime, audio_stream.chunk_samples, stats=stats,
+                                 hop_samples=audio_stream.hop_samples, live=False)
+    writer = None if args.no_output else ResultWriter(args.output)
+
+    print(f"回放: {args.recording} ({audio_stream.channels}通道, {audio_stream.samplerate}Hz)")
+    try:
+        result = run_replay(audio_stream, processor, writer)
+    finally:
+        audio_stream.close()
+        processor.close()
+        if writer is not None:
+            writer.close()
+        logging_service.close()
+
+    print(f"帧数: {result['frames']}, 录音时长: {result['audio_seconds']:.1f}s, "
+          f"处理耗时: {result['elapsed_seconds']:.2f}s, 帧率: {result['fps']:.0f} fps, "
+          f"实时倍数: {result['realtime_factor']:.1f}x")
+    for stage, values in stats.summary()['stages'].items():
+        print(f"  {stage}: p50 {values['p50']:.3f}ms, p95 {values['p95']:.3f}ms, p99 {values['p99']:.3f}ms")
+    if writer is not None:
+        print(f"结果已写入: {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import argparse
+import sys
+from utils.config import ConfigError
+from utils.log import setup_logging
+from utils.supervisor import Supervisor, load_tables
+
+def main():
+    parser = argparse.ArgumentParser(description="多球桌调度：每张球桌一个工作进程，结果集中输出")
+    parser.add_argument('--tables', default="tables.yaml", help="多球桌配置文件")
+    args = parser.parse_args()
+
+    tables, options = load_tables(args.tables)
+    logging_service = setup_logging({'logging': options.get('logging', {})})
+    print(f"=== Foosball 多球桌调度 ({len(tables)}张球桌) ===")
+    for table in tables:
+        print(f"{table.get('name')}: 配置 {table['config']}, CPU {table.get('cpu')}")
+
+    try:
+        supervisor = Supervisor(tables,
+                                restart_delay=options.get('restart_delay', 2.0),
+                                poll_interval=options.get('poll_interval', 0.002),
+                                report_interval=options.get('report_interval', 5.0))
+    except ConfigError as e:
+        print(e)
+        logging_service.close()
+        return 2
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        print("\n退出程序")
+    finally:
+        logging_service.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""自适应校准的warmup：按衰减加权的累计时长有上限，超出上限的warmup在校准器中截断、在配置校验中拒绝"""
+import math
+import os
+import numpy as np
+import yaml
+
+from utils.calibration import NoiseCalibrator
+from utils.config import validate_config
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mic_config.yaml")
+
+def base_config():
+    with open(CONFIG_PATH) as f:
+        return yaml.safe_load(f)
+
+def frames_until_ready(calibrator, limit):
+    levels = np.full(calibrator.channels, 0.01)
+    for frame in range(limit):
+        if calibrator.ready:
+            return frame
+        calibrator.update(levels)
+    return None
+
+def test_reachable_warmup_is_not_clamped():
+    calibrator = NoiseCalibrator(2, frame_duration=0.1, half_life=120.0, warmup=10.0)
+    # 半衰期远大于warmup时，衰减只让生效时间稍晚几帧
+    assert 100 <= frames_until_ready(calibrator, 1000) <= 105
+
+def test_unreachable_warmup_is_clamped():
+    # 累计时长最多趋近 half_life/ln2 ≈ 14.4秒，60秒的warmup不截断就永远不会生效
+    calibrator = NoiseCalibrator(2, frame_duration=0.1, half_life=10.0, warmup=60.0)
+    frames = frames_until_ready(calibrator, 10000)
+    assert frames is not None
+    # 截断到上限的95%：1 - 0.5**n = 0.95，约4.3个半衰期
+    assert 420 <= frames <= 445
+
+def test_validate_rejects_warmup_beyond_decayed_total():
+    raw = base_config()
+    raw['calibration'] = dict(raw.get('calibration') or {}, enabled=True, half_life=10.0,
+                              warmup=10.0 / math.log(2))
+    assert any("calibration.warmup" in error for error in validate_config(raw))
+
+    raw['calibration']['warmup'] = 10.0
+    assert validate_config(raw) == []
+
+def test_validate_rejects_non_positive_half_life():
+    raw = base_config()
+    raw['calibration'] = dict(raw.get('calibration') or {}, enabled=True, half_life=0.0, warmup=1.0)
+    assert any("calibration.half_life" in error for error in validate_config(raw))
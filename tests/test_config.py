@@ -0,0 +1,35 @@
+"""配置编译：帧移和帧时长的推导"""
+import os
+import pytest
+import yaml
+
+from utils.config import ConfigError, compile_config
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mic_config.yaml")
+
+def base_config(**overrides):
+    with open(CONFIG_PATH) as f:
+        raw = yaml.safe_load(f)
+    raw.update(overrides)
+    return raw
+
+def test_blocking_mode_ignores_hop_duration():
+    runtime = compile_config(base_config(capture_mode="blocking", chunk_duration=0.1, hop_duration=0.02))
+    # sd.rec每次录完整的一帧，帧之间没有重叠
+    assert runtime.hop_samples == runtime.chunk_samples
+    assert runtime.frame_duration == pytest.approx(0.1)
+
+def test_stream_mode_uses_hop_duration():
+    runtime = compile_config(base_config(capture_mode="stream", chunk_duration=0.1, hop_duration=0.02))
+    assert runtime.hop_samples == round(runtime.sample_rate * 0.02)
+    assert runtime.frame_duration == pytest.approx(0.02)
+
+def test_hop_longer_than_chunk_is_rejected():
+    with pytest.raises(ConfigError):
+        compile_config(base_config(capture_mode="stream", chunk_duration=0.02, hop_duration=0.1))
+
+def test_shipped_config_is_valid():
+    runtime = compile_config(base_config())
+    assert runtime.capture_mode == "blocking"
+    assert runtime.osc_mode == "simple"
+    assert not runtime.pipeline_enabled
@@ -0,0 +1,70 @@
+"""按秒配置的窗口、冷却和平滑速率：帧移不同时响应时间应该一致"""
+import numpy as np
+import pytest
+
+from utils.localization import GoalDetector, estimate_position_with_smoothing
+from utils.tempo_mapper import TempoMapper
+
+HOPS = (0.1, 0.02, 0.005)
+MIC_POSITIONS = np.array([[0, 0], [0, 68], [58.5, 0], [58.5, 68], [117, 0], [117, 68]], dtype=float)
+
+def goal_times(hop, levels):
+    """levels: [(持续秒数, 球门RMS)]，返回左门每次进球的时刻（帧末尾，秒）"""
+    detector = GoalDetector.from_durations(hop)
+    times = []
+    frame = 0
+    for seconds, level in levels:
+        for _ in range(round(seconds / hop)):
+            frame += 1
+            if detector.update(np.array([level, 0.0]))[0]:
+                times.append(frame * hop)
+    return times
+
+def test_from_durations_matches_default_frames_at_reference_hop():
+    detector = GoalDetector.from_durations(0.1)
+    assert (detector.recent_frames, detector.previous_frames, detector.cooldown_frames) == (5, 10, 30)
+    assert detector.cooldown == pytest.approx(3.0)
+
+def test_goal_detection_timing_is_independent_of_hop():
+    # 2秒安静后持续的撞击声，2秒后（冷却中）和4秒后（冷却结束）再各有一次
+    levels = [(2.0, 0.01), (0.5, 1.0), (1.5, 0.01), (0.5, 1.0), (1.5, 0.01), (0.5, 1.0)]
+    reference = goal_times(0.1, levels)
+    assert len(reference) == 2
+    for hop in HOPS[1:]:
+        times = goal_times(hop, levels)
+        assert len(times) == len(reference)
+        assert np.allclose(times, reference, atol=0.1)
+
+def bpm_trace(hop, level, seconds, boost=0.0):
+    mapper = TempoMapper(history_length=max(1, round(5.0 / hop)), frame_duration=hop)
+    mapper.add_boost(boost)
+    trace = []
+    for _ in range(round(seconds / hop)):
+        trace.append(mapper.update_bpm(np.full(6, level))[0])
+    return np.array(trace), mapper
+
+@pytest.mark.parametrize("level", [0.0, 0.1, 0.5])
+def test_bpm_smoothing_is_independent_of_hop(level):
+    reference, _ = bpm_trace(0.1, level, 2.0)
+    for hop in HOPS[1:]:
+        trace, _ = bpm_trace(hop, level, 2.0)
+        # 每100ms比较一次
+        step = round(0.1 / hop)
+        assert np.allclose(trace[step - 1::step], reference, atol=1.0)
+
+def test_bpm_boost_decays_per_second():
+    boosts = []
+    for hop in HOPS:
+        _, mapper = bpm_trace(hop, 0.1, 1.0, boost=20.0)
+        boosts.append(mapper.boost)
+    assert np.allclose(boosts, 20.0 * 0.5 ** (1.0 / 0.65))
+
+def test_position_smoothing_is_independent_of_hop():
+    rms = np.array([1.0, 1.0, 0.1, 0.1, 0.01, 0.01])
+    positions = []
+    for hop in HOPS:
+        position = np.array([100.0, 34.0])
+        for _ in range(round(0.2 / hop)):
+            position = estimate_position_with_smoothing(rms, MIC_POSITIONS, position, 0.6, frame_ratio=hop / 0.1)
+        positions.append(position)
+    assert np.allclose(positions, positions[0])
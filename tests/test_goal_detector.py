@@ -0,0 +1,53 @@
+"""环形缓冲GoalDetector与原来基于列表的逐帧检测结果一致"""
+import numpy as np
+import pytest
+
+from utils.localization import GoalDetector
+
+def reference_detect(history, cooldowns, rms_values, goal_threshold=0.3, history_length=20,
+                     volume_increase_threshold=3.0, cooldown_frames=30):
+    """原来的detect_goals：每个球门一个RMS列表，最近5帧与之前10帧的平均音量比较"""
+    goals = [0, 0]
+    for i in range(2):
+        history[i].append(rms_values[i])
+        del history[i][:-history_length]
+        if cooldowns[i] > 0:
+            cooldowns[i] -= 1
+        if cooldowns[i] == 0 and len(history[i]) >= 5:
+            recent_avg = np.mean(history[i][-5:])
+            previous = history[i][-15:-5] if len(history[i]) >= 15 else history[i][:-5]
+            if not previous:
+                continue
+            previous_avg = np.mean(previous)
+            if (recent_avg > goal_threshold and recent_avg > previous_avg * volume_increase_threshold and
+                    rms_values[i] > goal_threshold):
+                goals[i] = 127
+                cooldowns[i] = cooldown_frames
+    return goals
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_list_based_detection(seed):
+    rng = np.random.default_rng(seed)
+    frames = 3000
+    levels = rng.uniform(0.0, 0.05, size=(frames, 2))
+    # 随机插入持续数帧的撞击声
+    for start in rng.integers(0, frames - 10, size=80):
+        levels[start:start + rng.integers(1, 8), rng.integers(0, 2)] = rng.uniform(0.2, 2.0)
+
+    detector = GoalDetector()
+    history, cooldowns = [[], []], [0, 0]
+    detected = 0
+    for values in levels:
+        expected = reference_detect(history, cooldowns, values)
+        assert detector.update(values) == expected
+        detected += sum(expected) // 127
+    assert detected > 0
+
+def test_instances_keep_independent_state():
+    first, second = GoalDetector(), GoalDetector()
+    for _ in range(15):
+        first.update(np.array([0.01, 0.01]))
+    goals = [first.update(np.array([1.0, 0.01])) for _ in range(2)]
+    assert goals[-1] == [127, 0]
+    # 另一个检测器没有历史，同样的输入不会触发
+    assert second.update(np.array([1.0, 0.01])) == [0, 0]
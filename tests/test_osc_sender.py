@@ -0,0 +1,102 @@
+"""OSC发送器的消息编码：进球事件的样本序号为int64、时间为float64，无法编码的消息只丢弃自己"""
+import socket
+import pytest
+
+from utils.osc_sender import BundledOSCSender, OSCSender
+
+pythonosc = pytest.importorskip("pythonosc")
+from pythonosc.osc_bundle import OscBundle
+from pythonosc.osc_message import OscMessage
+
+# 运行约14小时后的样本序号（44.1kHz），超出int32范围
+LONG_RUN_SAMPLE = 2 ** 31 + 12345
+# 运行一小时后的时间：float32在这里的分辨率约为0.24毫秒
+LONG_RUN_TIME = 3600.0001234
+
+@pytest.fixture
+def receiver():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2.0)
+    yield sock
+    sock.close()
+
+def receive_messages(sock):
+    """读取一个UDP包，返回其中的 (地址, 参数) 列表"""
+    data = sock.recv(4096)
+    if OscBundle.dgram_is_bundle(data):
+        return [(message.address, message.params) for message in OscBundle(data)]
+    message = OscMessage(data)
+    return [(message.address, message.params)]
+
+def drain_messages(sock, timeout=0.2):
+    """读取已到达的全部UDP包（逐条发送模式下每条消息一个包）"""
+    messages = []
+    sock.settimeout(timeout)
+    try:
+        while True:
+            messages += receive_messages(sock)
+    except socket.timeout:
+        return messages
+    finally:
+        sock.settimeout(2.0)
+
+def test_bundled_goal_event_keeps_int64_sample_and_float64_time(receiver):
+    sender = BundledOSCSender(port=receiver.getsockname()[1])
+    try:
+        sender.send_goal_event(1, LONG_RUN_TIME, LONG_RUN_SAMPLE)
+        sender.flush()
+        assert receive_messages(receiver) == [("/foosball_goal", [1, LONG_RUN_TIME, LONG_RUN_SAMPLE])]
+    finally:
+        sender.close()
+
+def test_simple_goal_event_keeps_int64_sample_and_float64_time(receiver):
+    sender = OSCSender(port=receiver.getsockname()[1])
+    sender.send_goal_event(0, LONG_RUN_TIME, LONG_RUN_SAMPLE)
+    assert receive_messages(receiver) == [("/foosball_goal", [0, LONG_RUN_TIME, LONG_RUN_SAMPLE])]
+
+def test_unencodable_message_is_dropped_without_corrupting_bundle(receiver):
+    sender = BundledOSCSender(port=receiver.getsockname()[1])
+    try:
+        sender.send_ball(100.0, 45.0)
+        # 超出int64范围的样本序号无法编码，只丢弃这一条
+        sender.send_goal_event(0, 1.0, 2 ** 63)
+        sender.send_ball(200.0, 90.0)
+        sender.flush()
+        assert receive_messages(receiver) == [("/foosball_ball", [100.0, 45.0]),
+                                              ("/foosball_ball", [200.0, 90.0])]
+        assert sender.dropped == 1
+    finally:
+        sender.close()
+
+def test_shot_event_time_is_float64(receiver):
+    port = receiver.getsockname()[1]
+    simple = OSCSender(port=port)
+    simple.send_shot_event(1, 0, 350.0, LONG_RUN_TIME)
+    assert receive_messages(receiver) == [("/foosball_shot", [1, 0, 350.0, LONG_RUN_TIME])]
+
+    bundled = BundledOSCSender(port=port)
+    try:
+        bundled.send_shot_event(0, 1, 350.0, LONG_RUN_TIME)
+        bundled.flush()
+        assert receive_messages(receiver) == [("/foosball_shot", [0, 1, 350.0, LONG_RUN_TIME])]
+    finally:
+        bundled.close()
+
+@pytest.mark.parametrize("sender_class", [OSCSender, BundledOSCSender])
+def test_disappearing_sources_are_muted(receiver, sender_class):
+    sender = sender_class(position_port=receiver.getsockname()[1])
+    try:
+        received = []
+        for sources in ([(2, 0.1, 0.2), (3, 0.5, 0.5)], [(2, 0.1, 0.2)], [(3, -0.5, 0.0)]):
+            sender.send_sources(sources)
+            sender.flush()
+            frame = drain_messages(receiver)
+            received.append([(address, params) for address, params in frame if address.endswith("/mute")])
+        assert received == [
+            [("/source/2/mute", [0]), ("/source/3/mute", [0])],
+            [("/source/3/mute", [1])],
+            [("/source/3/mute", [0]), ("/source/2/mute", [1])],
+        ]
+    finally:
+        sender.close()
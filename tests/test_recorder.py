@@ -0,0 +1,65 @@
+"""比赛录音：按索引直接定位到进球的音频和遥测，block模式下写线程出错时不挂起"""
+import numpy as np
+import pytest
+
+import utils.recorder as recorder_module
+from utils.recorder import MatchRecorder, RecordingReader
+
+SAMPLE_RATE = 1000
+CHANNELS = 4
+FRAME_SAMPLES = 100
+
+def make_result(frame, goal_events=()):
+    return {'frame_start_sample': frame * FRAME_SAMPLES, 'main_rms': np.zeros(6), 'goal_rms': np.zeros(2),
+            'mapped_channels': np.zeros(6, dtype=np.uint8), 'raw_pos': (0.0, 0.0), 'osc_pos': (0.0, 0.0),
+            'goal_detection': [0, 0], 'bpm': float(frame), 'goal_events': list(goal_events)}
+
+def make_signal(frames):
+    rng = np.random.default_rng(0)
+    return rng.uniform(-0.5, 0.5, size=(CHANNELS, frames * FRAME_SAMPLES)).astype(np.float32)
+
+def record(recorder, signal, goals):
+    """goals: {帧序号: 进球样本序号}"""
+    for frame in range(signal.shape[1] // FRAME_SAMPLES):
+        chunk = signal[:, frame * FRAME_SAMPLES:(frame + 1) * FRAME_SAMPLES]
+        events = [(0, goals[frame], goals[frame] / SAMPLE_RATE)] if frame in goals else ()
+        recorder.record(chunk, 0, frame * FRAME_SAMPLES, make_result(frame, events))
+
+@pytest.mark.parametrize("block", [False, True])
+def test_goal_index_seeks_audio_and_telemetry(tmp_path, block):
+    frames = 120
+    signal = make_signal(frames)
+    goals = {35: 3550, 90: 9020}
+    recorder = MatchRecorder(str(tmp_path), SAMPLE_RATE, CHANNELS, ring_minutes=0.5, segment_seconds=2.0,
+                             block=block)
+    record(recorder, signal, goals)
+    recorder.close()
+    assert recorder.dropped_segments == 0
+
+    reader = RecordingReader(str(tmp_path))
+    assert [segment['start_sample'] for segment in reader.segments] == list(range(0, frames * FRAME_SAMPLES, 2000))
+    assert [goal['sample'] for goal in reader.goals] == sorted(goals.values())
+
+    # int16量化误差
+    tolerance = 1.0 / 32768.0
+    assert np.allclose(reader.read_audio(0, signal.shape[1]), signal, atol=tolerance)
+    # 跨段读取
+    assert np.allclose(reader.read_audio(1950, 4100), signal[:, 1950:4100], atol=tolerance)
+    audio = reader.goal_audio(1, before=0.5, after=0.2)
+    assert np.allclose(audio, signal[:, 9020 - 500:9020 + 200], atol=tolerance)
+    # 录音之外的部分填0
+    assert np.all(reader.read_audio(signal.shape[1], signal.shape[1] + 50) == 0)
+
+    telemetry = reader.goal_telemetry(0, before=5, after=2)
+    assert list(telemetry['bpm']) == [float(frame) for frame in range(30, 38)]
+
+def test_block_mode_raises_writer_errors(tmp_path, monkeypatch):
+    def failing_encode(block, level=1):
+        raise OSError("disk full")
+    monkeypatch.setattr(recorder_module, 'encode_segment', failing_encode)
+    # 环形缓冲只能容纳2段，写线程出错后分析线程必须停止等待
+    recorder = MatchRecorder(str(tmp_path), SAMPLE_RATE, CHANNELS, ring_minutes=0.001, segment_seconds=1.0,
+                             block=True)
+    with pytest.raises(OSError, match="disk full"):
+        record(recorder, make_signal(100), {})
+    recorder.close()
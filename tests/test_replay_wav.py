@@ -0,0 +1,74 @@
+"""内存映射WAV读取和FileAudioStream分帧"""
+import struct
+import numpy as np
+import pytest
+
+from utils.replay import WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, FileAudioStream, open_wav_memmap
+
+SAMPLE_RATE = 8000
+CHANNELS = 3
+
+def write_wav(path, payload, format_tag, bits, frames, data_size=None, extra_chunk=True):
+    """写入WAV文件：可选在fmt和data之间插入一个其他块，data_size可以写错（例如录音软件写入的0）"""
+    fmt = struct.pack('<HHIIHH', format_tag, CHANNELS, SAMPLE_RATE, SAMPLE_RATE * CHANNELS * bits // 8,
+                      CHANNELS * bits // 8, bits)
+    chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    if extra_chunk:
+        # 奇数长度的块后面有一个填充字节
+        chunks += b'LIST' + struct.pack('<I', 3) + b'abc\0'
+    chunks += b'data' + struct.pack('<I', len(payload) if data_size is None else data_size) + payload
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks)
+
+def reference_signal(frames):
+    t = np.arange(frames) / SAMPLE_RATE
+    return np.stack([0.5 * np.sin(2 * np.pi * 440 * t * (k + 1)) for k in range(CHANNELS)], axis=1)
+
+@pytest.mark.parametrize("bits", [16, 24, 32])
+def test_pcm_samples_are_scaled_to_unit_range(tmp_path, bits):
+    frames = 1000
+    signal = reference_signal(frames)
+    ints = np.round(signal * 2 ** (bits - 1)).astype(np.int32)
+    if bits == 24:
+        payload = ints.astype('<i4').view(np.uint8).reshape(frames, CHANNELS, 4)[..., :3].tobytes()
+    else:
+        payload = ints.astype('<i2' if bits == 16 else '<i4').tobytes()
+    path = str(tmp_path / "pcm.wav")
+    write_wav(path, payload, WAVE_FORMAT_PCM, bits, frames)
+
+    stream = FileAudioStream(path, chunk_duration=frames / SAMPLE_RATE)
+    frame = stream.read_frame()
+    assert stream.samplerate == SAMPLE_RATE and stream.channels == CHANNELS
+    assert np.allclose(frame, signal.T, atol=2.0 / 2 ** (bits - 1))
+    stream.close()
+
+def test_float_wav_with_zero_data_size_uses_file_length(tmp_path):
+    frames = 800
+    signal = reference_signal(frames).astype('<f4')
+    path = str(tmp_path / "float.wav")
+    write_wav(path, signal.tobytes(), WAVE_FORMAT_IEEE_FLOAT, 32, frames, data_size=0)
+    data, samplerate, scale = open_wav_memmap(path)
+    assert data.shape == (frames, CHANNELS) and samplerate == SAMPLE_RATE and scale == 1.0
+    assert np.array_equal(np.asarray(data), signal)
+
+def test_overlapping_frames_advance_by_hop(tmp_path):
+    frames = 1000
+    signal = reference_signal(frames).astype('<f4')
+    path = str(tmp_path / "float.wav")
+    write_wav(path, signal.tobytes(), WAVE_FORMAT_IEEE_FLOAT, 32, frames, extra_chunk=False)
+    stream = FileAudioStream(path, chunk_duration=0.02, hop_duration=0.005)
+    starts = []
+    while True:
+        frame = stream.read_frame()
+        if frame is None:
+            break
+        start = stream.frame_start_sample
+        assert np.array_equal(frame, signal[start:start + stream.chunk_samples].T)
+        starts.append(start)
+    assert starts == list(range(0, frames - stream.chunk_samples + 1, stream.hop_samples))
+
+def test_rejects_hop_longer_than_chunk(tmp_path):
+    path = str(tmp_path / "float.wav")
+    write_wav(path, np.zeros((100, CHANNELS), dtype='<f4').tobytes(), WAVE_FORMAT_IEEE_FLOAT, 32, 100)
+    with pytest.raises(ValueError):
+        FileAudioStream(path, chunk_duration=0.005, hop_duration=0.01)
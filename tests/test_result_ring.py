@@ -0,0 +1,51 @@
+"""共享内存结果环形缓冲：读到正在写入或已被覆盖的记录时丢弃"""
+import numpy as np
+import pytest
+
+from utils.supervisor import FIELD_INDEX, RECORD_FIELDS, ResultRing
+
+@pytest.fixture
+def ring():
+    ring = ResultRing(slots=8)
+    yield ring
+    ring.close()
+
+def make_record(bpm):
+    record = np.zeros(len(RECORD_FIELDS))
+    record[FIELD_INDEX['bpm']] = bpm
+    return record
+
+def test_reads_records_in_order(ring):
+    for bpm in (100.0, 110.0, 120.0):
+        ring.write(make_record(bpm))
+    records = ring.read_new()
+    assert [record[FIELD_INDEX['bpm']] for record in records] == [100.0, 110.0, 120.0]
+    assert [int(record[0]) for record in records] == [0, 1, 2]
+    assert ring.read_new() == []
+    assert ring.dropped == 0
+
+def test_drops_record_torn_by_in_progress_write(ring):
+    for bpm in (100.0, 110.0, 120.0):
+        ring.write(make_record(bpm))
+    # 写入方开始覆盖序号1的槽位时先把序号置为-1
+    ring._records[1, 0] = -1
+    records = ring.read_new()
+    assert [record[FIELD_INDEX['bpm']] for record in records] == [100.0, 120.0]
+    assert ring.dropped == 1
+
+def test_drops_records_overwritten_before_reading(ring):
+    for bpm in range(ring.slots + 3):
+        ring.write(make_record(float(bpm)))
+    records = ring.read_new()
+    # 最旧的槽位（序号3）是写入方下一次要覆盖的位置，也视为不完整
+    assert [int(record[0]) for record in records] == list(range(4, ring.slots + 3))
+    assert ring.dropped == 4
+
+def test_reader_attached_by_name_sees_writer_records(ring):
+    reader = ResultRing(slots=ring.slots, name=ring.name)
+    try:
+        ring.write(make_record(130.0))
+        records = reader.read_new()
+        assert len(records) == 1 and records[0][FIELD_INDEX['bpm']] == 130.0
+    finally:
+        reader.close()
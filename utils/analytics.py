@@ -0,0 +1,153 @@
+import logging
+import math
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# 射门事件类型
+SHOT = 0        # 朝球门方向的突然高速移动
+SHOT_GOAL = 1   # 射门之后goal_window秒内该球门检测到进球
+
+class ShotAnalyzer:
+    """
+    由位置轨迹计算球速、方向和射门事件
+    最近history_frames帧的位置和时间保存在预分配的环形缓冲中；速度取当前位置与span秒之前位置的差分
+    （窗口起点随时间单调前移，每帧均摊O(1)），启用位置跟踪时直接使用卡尔曼滤波的速度。
+    速度超过shot_speed且方向与指向某个球门的方向夹角小于shot_angle时产生射门事件，
+    之后goal_window秒内该球门检测到进球时产生射门得分事件。射门时按速度给TempoMapper加入BPM增量。
+    """
+
+    def __init__(self, goal_positions, span=0.1, history_frames=64, shot_speed=300.0, shot_angle=30.0,
+                 max_speed=2000.0, cooldown=0.5, goal_window=2.0, tempo_mapper=None, bpm_boost=15.0):
+        """
+        Args:
+            goal_positions: 左门、右门坐标 np.array, shape (2, 2)（厘米）
+            span: 差分速度的时间跨度（秒）
+            history_frames: 位置历史的帧数上限，span内的帧数超过该值时按缓冲中最早的一帧计算
+            shot_speed: 射门的最低速度（厘米/秒）
+            shot_angle: 运动方向与指向球门方向的最大夹角（度）
+            max_speed: 超过该速度的位移视为定位跳变（例如从静音进入撞击），丢弃历史重新开始
+            cooldown: 两次射门事件的最小间隔（秒）
+            goal_window: 射门之后等待进球确认的时间（秒）
+            tempo_mapper: 可选的TempoMapper，射门时加入BPM增量
+            bpm_boost: 以shot_speed射门时的BPM增量，按速度比例增加，最多两倍
+        """
+        self.goal_positions = np.asarray(goal_positions, dtype=float)
+        self.span = span
+        self.shot_speed = shot_speed
+        self.shot_cos = math.cos(math.radians(shot_angle))
+        self.max_speed = max_speed
+        self.cooldown = cooldown
+        self.goal_window = goal_window
+        self.tempo_mapper = tempo_mapper
+        self.bpm_boost = bpm_boost
+
+        self._capacity = max(2, int(history_frames))
+        self._times = np.zeros(self._capacity)
+        self._positions = np.zeros((self._capacity, 2))
+        self._head = 0      # 下一个写入位置
+        self._tail = 0      # 差分窗口起点
+        self._length = 0
+        # 最近一次射门的时间，以及每个球门等待确认的射门 (时间, 速度)
+        self._last_shot = -math.inf
+        self._pending = [None] * len(self.goal_positions)
+
+        self.speed = 0.0
+        self.direction = 0.0
+        self.velocity = np.zeros(2)
+        self.shots = 0
+        self.shot_goals = 0
+        self.last_events = []
+
+    def reset(self):
+        """清空位置历史（定位无效或跳变时调用），不影响等待确认的射门"""
+        self._head = 0
+        self._tail = 0
+        self._length = 0
+        self.speed = 0.0
+        self.velocity.fill(0.0)
+
+    def _push(self, position, timestamp):
+        """写入一帧位置，把差分窗口起点前移到span之内的最早一帧"""
+        capacity = self._capacity
+        head = self._head
+        if self._length == capacity:
+            # 缓冲已满，最旧的一帧被覆盖；窗口起点不能早于最旧的一帧
+            if self._tail == head:
+                self._tail = (head + 1) % capacity
+        else:
+            self._length += 1
+        self._times[head] = timestamp
+        self._positions[head] = position
+        self._head = (head + 1) % capacity
+        while self._tail != head and timestamp - self._times[(self._tail + 1) % capacity] >= self.span:
+            self._tail = (self._tail + 1) % capacity
+
+    def update(self, position, timestamp, goal_detection, valid=True, velocity=None):
+        """
+        处理一帧位置
+        position: 本帧位置 np.array, shape (2,)（原始坐标，厘米）
+        timestamp: 本帧的流时间（秒）
+        goal_detection: 本帧的进球检测结果 [左门, 右门]，非0表示检测到进球
+        valid: 本帧定位是否有效（有效信号不足时为False，位置只是回退值）
+        velocity: 可选的跟踪器速度（厘米/秒），提供时代替差分速度
+        返回本帧的事件列表 [(事件类型, 球门, 速度, 时间)]，同时保存在last_events
+        """
+        events = []
+        if not valid:
+            self.reset()
+        elif velocity is not None:
+            self.velocity[:] = velocity
+        else:
+            self._push(position, timestamp)
+            tail = self._tail
+            latest = (self._head - 1) % self._capacity
+            dt = self._times[latest] - self._times[tail]
+            if dt > 0.0:
+                np.subtract(self._positions[latest], self._positions[tail], out=self.velocity)
+                self.velocity /= dt
+            else:
+                self.velocity.fill(0.0)
+
+        vx, vy = self.velocity
+        speed = math.hypot(vx, vy)
+        if speed > self.max_speed:
+            # 定位跳变，不是球的运动
+            self.reset()
+            if valid and velocity is None:
+                self._push(position, timestamp)
+            speed = 0.0
+        self.speed = speed
+        if speed > 0.0:
+            self.direction = math.degrees(math.atan2(vy, vx))
+
+        if valid and speed >= self.shot_speed and timestamp - self._last_shot >= self.cooldown:
+            # 运动方向与指向各球门方向的夹角余弦，取最接近的球门
+            to_goals = self.goal_positions - position
+            distances = np.hypot(to_goals[:, 0], to_goals[:, 1])
+            cosines = (to_goals @ self.velocity) / (np.maximum(distances, 1e-9) * speed)
+            goal = int(np.argmax(cosines))
+            if cosines[goal] >= self.shot_cos:
+                self._last_shot = timestamp
+                self._pending[goal] = (timestamp, speed)
+                self.shots += 1
+                events.append((SHOT, goal, speed, timestamp))
+                if self.tempo_mapper is not None:
+                    self.tempo_mapper.add_boost(self.bpm_boost * min(speed / self.shot_speed, 2.0))
+
+        # 与进球检测交叉验证
+        for goal, detected in enumerate(goal_detection[:len(self._pending)]):
+            pending = self._pending[goal]
+            if pending is None:
+                continue
+            shot_time, shot_speed = pending
+            if timestamp - shot_time > self.goal_window:
+                self._pending[goal] = None
+            elif detected:
+                self._pending[goal] = None
+                self.shot_goals += 1
+                events.append((SHOT_GOAL, goal, shot_speed, timestamp))
+                log.info("射门得分: %s, 射门速度 %.0f厘米/秒, 射门后 %.2f秒",
+                         "左门" if goal == 0 else "右门", shot_speed, timestamp - shot_time, extra={'rate_limit': False})
+        self.last_events = events
+        return events
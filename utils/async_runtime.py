@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+import numpy as np
+
+class ControlServer:
+    """
+    OSC控制端口：运行中修改分析参数、查询参数和运行状态
+    处理函数只做解析和校验，把更新暂存起来；同一个UDP包（包括bundle）中的全部更新在包处理完后
+    与当前参数一起做组合检查（例如BPM范围），通过后一起提交并回复ack，否则整组回复error、不生效。
+    分析线程在下一帧开始前一次取走，所以一组参数总是在两帧之间原子生效。
+    手动设置的goal_threshold和silence_threshold不再被自动校准覆盖。
+
+    地址:
+        {prefix}/param/<参数名> <值>   修改参数，回复 {prefix}/ack [参数名, 值] 或 {prefix}/error [参数名, 错误信息]
+        {prefix}/params                回复 {prefix}/params [参数名1, 值1, 参数名2, 值2, ...]
+        {prefix}/status                回复 {prefix}/status [帧数, 丢弃帧数, 队列深度, BPM, x, y]
+    """
+
+    def __init__(self, processor, ip="127.0.0.1", port=9000, prefix="/foosball/control"):
+        self.processor = processor
+        self.ip = ip
+        self.port = port
+        self.prefix = prefix
+        self.runtime = None
+        self._staging = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._commit_scheduled = False
+        self._loop = None
+        self._transport = None
+
+    def _dispatcher(self):
+        from pythonosc.dispatcher import Dispatcher
+        dispatcher = Dispatcher()
+        dispatcher.map(f"{self.prefix}/param/*", self._handle_param, needs_reply_address=True)
+        dispatcher.map(f"{self.prefix}/params", self._handle_params, needs_reply_address=True)
+        dispatcher.map(f"{self.prefix}/status", self._handle_status, needs_reply_address=True)
+        return dispatcher
+
+    async def start(self):
+        from pythonosc.osc_server import AsyncIOOSCUDPServer
+        self._loop = asyncio.get_running_loop()
+        server = AsyncIOOSCUDPServer((self.ip, self.port), self._dispatcher(), self._loop)
+        self._transport, _ = await server.create_serve_endpoint()
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _reply(self, client_address, address, values):
+        from pythonosc.osc_message_builder import OscMessageBuilder
+        builder = OscMessageBuilder(address=address)
+        for value in values:
+            builder.add_arg(value)
+        self._transport.sendto(builder.build().dgram, client_address)
+
+    def _handle_param(self, client_address, address, *args):
+        name = address.rsplit('/', 1)[-1]
+        try:
+            if len(args) != 1:
+                raise ValueError(f"参数 {name} 需要1个值，收到 {len(args)} 个")
+            value = self.processor.validate_parameter(name, args[0])
+        except ValueError as e:
+            self._reply(client_address, f"{self.prefix}/error", [name, str(e)])
+            return
+        self._staging[name] = (value, client_address)
+        if not self._commit_scheduled:
+            # 当前UDP包中的消息全部处理完之后再检查和提交
+            self._commit_scheduled = True
+            self._loop.call_soon(self._commit)
+
+    def _commit(self):
+        staging, self._staging = self._staging, {}
+        self._commit_scheduled = False
+        updates = {name: value for name, (value, _) in staging.items()}
+        with self._lock:
+            try:
+                self.processor.check_parameters({**self._pending, **updates})
+            except ValueError as e:
+                error = str(e)
+            else:
+                error = None
+                self._pending.update(updates)
+        for name, (value, client_address) in staging.items():
+            if error is None:
+                self._reply(client_address, f"{self.prefix}/ack", [name, value])
+            else:
+                self._reply(client_address, f"{self.prefix}/error", [name, error])
+
+    def take_pending(self):
+        """取走已提交的参数更新（分析线程在两帧之间调用）"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _handle_params(self, client_address, address, *args):
+        values = []
+        for name, value in self.processor.get_parameters().items():
+            values += [name, float(value)]
+        self._reply(client_address, f"{self.prefix}/params", values)
+
+    def _handle_status(self, client_address, address, *args):
+        runtime = self.runtime
+        status = [0, 0, 0, 0.0, 0.0, 0.0]
+        if runtime is not None:
+            status[:3] = [runtime.frames, runtime.dropped, runtime.queue.qsize() if runtime.queue else 0]
+            if runtime.last_result is not None:
+                raw_pos = runtime.last_result['raw_pos']
+                status[3:] = [float(runtime.last_result['bpm']), float(raw_pos[0]), float(raw_pos[1])]
+        self._reply(client_address, f"{self.prefix}/status", status)
+
+class AsyncRuntime:
+    """
+    基于asyncio的事件驱动运行时
+    采集线程把帧放入事件循环中的有界队列（满时丢弃最旧的帧）；分析在专用的单线程执行器中运行，
+    事件循环在分析期间继续处理控制端口和输出，控制流量不会让分析线程等待。
+    参数更新在每帧分析前于分析线程中应用，与process不会交错。
+    """
+
+    def __init__(self, audio_stream, processor, output, control=None, queue_size=4):
+        """
+        Args:
+            audio_stream: AudioStream实例
+            processor: FrameProcessor实例
+            output: 输出回调 output(result)，在事件循环线程中调用
+            control: 可选的ControlServer
+            queue_size: 采集->分析队列长度
+        """
+        self.audio_stream = audio_stream
+        self.processor = processor
+        self.output = output
+        self.control = control
+        if control is not None:
+            control.runtime = self
+        self.queue_size = queue_size
+        self.queue = None
+        self.frames = 0
+        self.dropped = 0
+        self.last_result = None
+        self._free_frames = collections.deque()
+        self._stop_event = threading.Event()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+        # 采集线程中出现的异常
+        self.error = None
+        # 事件循环中测量的最近一次延迟，由分析线程在下一帧之前交给processor
+        self._latency = None
+
+    def _acquire_frame(self, chunk):
+        if self._free_frames:
+            frame = self._free_frames.popleft()
+            if frame.shape == chunk.shape:
+                return frame
+        return np.empty(chunk.shape, dtype=np.float32)
+
+    def _enqueue(self, item):
+        """在事件循环线程中放入队列，队列满时丢弃最旧的帧"""
+        if self.queue.full():
+            dropped = self.queue.get_nowait()
+            if dropped is not None:
+                self._free_frames.append(dropped[0])
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    def _capture_loop(self, loop):
+        stats = self.processor.stats
+        try:
+            while not self._stop_event.is_set():
+                t_capture = time.perf_counter()
+                chunk = self.audio_stream.get_audio_chunk()
+                stats.record('capture', time.perf_counter() - t_capture)
+                frame = self._acquire_frame(chunk)
+                frame[:] = chunk
+                item = (frame, self.audio_stream.frame_start_sample, time.monotonic())
+                loop.call_soon_threadsafe(self._enqueue, item)
+        except Exception as e:
+            self.error = e
+            loop.call_soon_threadsafe(self._enqueue, None)
+
+    def _analyze(self, frame, frame_start_sample):
+        """在分析线程中运行：先应用两帧之间提交的参数，再处理本帧"""
+        if self.control is not None:
+            updates = self.control.take_pending()
+            if updates:
+                self.processor.apply_parameters(updates)
+        latency, self._latency = self._latency, None
+        if latency is not None:
+            self.processor.report_latency(latency)
+        t_analysis = time.perf_counter()
+        result = self.processor.process(frame, frame_start_sample)
+        self.processor.stats.end_frame(time.perf_counter() - t_analysis)
+        return result
+
+    def _submit(self, loop, item):
+        """把一帧交给分析线程，返回 (future, 帧, 帧起始样本序号, 采集时间)"""
+        if item is None:
+            raise RuntimeError(f"采集线程异常退出: {self.error}") from self.error
+        frame, frame_start_sample, capture_time = item
+        future = loop.run_in_executor(self._executor, self._analyze, frame, frame_start_sample)
+        return future, frame, frame_start_sample, capture_time
+
+    async def run(self):
+        """运行直到取消或采集出错"""
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.queue_size)
+        if self.control is not None:
+            await self.control.start()
+        self.audio_stream.start()
+        capture_thread = threading.Thread(target=self._capture_loop, args=(loop,), name="capture", daemon=True)
+        capture_thread.start()
+        stats = self.processor.stats
+        analyzing = None
+        try:
+            while True:
+                if analyzing is None:
+                    analyzing = self._submit(loop, await self.queue.get())
+                future, frame, frame_start_sample, capture_time = analyzing
+                result = await future
+                self._free_frames.append(frame)
+                # 下一帧已经在队列中时先交给分析线程，本帧的输出与下一帧的分析重叠
+                analyzing = self._submit(loop, self.queue.get_nowait()) if not self.queue.empty() else None
+                result['frame_start_sample'] = frame_start_sample
+                result['capture_time'] = capture_time
+                result['queue_depths'] = {'capture': self.queue.qsize()}
+                self.output(result)
+                latency = time.monotonic() - capture_time
+                stats.record('latency', latency)
+                self._latency = latency
+                self.frames += 1
+                self.last_result = result
+        finally:
+            self._stop_event.set()
+            if self.control is not None:
+                self.control.close()
+            self._executor.shutdown(wait=True)
@@ -1,21 +1,183 @@
-import sounddevice as sd
+import logging
+import threading
+import time
 import numpy as np
+from utils.config import as_runtime_config
+
+log = logging.getLogger(__name__)
 
 class AudioStream:
-    def __init__(self, device, samplerate=44100, channels=6, chunk_duration=0.1):
+    def __init__(self, device, samplerate=44100, channels=6, chunk_duration=0.1,
+                 mode="blocking", hop_duration=None, buffer_duration=2.0, read_timeout=2.0):
+        """
+        音频采集
+
+        Args:
+            device: 音频设备ID
+            samplerate: 采样率
+            channels: 通道数
+            chunk_duration: 每帧分析窗口时长（秒）
+            mode: "blocking" 每帧调用一次sd.rec；"stream" 使用持续的InputStream回调写入环形缓冲
+            hop_duration: 帧移（秒），仅stream模式有效；小于chunk_duration时相邻帧重叠，默认等于chunk_duration
+            buffer_duration: 环形缓冲时长（秒），仅stream模式有效
+            read_timeout: stream模式下等待新数据的最长时间（秒），超时说明设备断开或流已停止，抛出RuntimeError
+        """
+        if mode not in ("blocking", "stream"):
+            raise ValueError(f"未知的采集模式: {mode}")
         self.device = device
         self.samplerate = samplerate
         self.channels = channels
         self.chunk_duration = chunk_duration
         self.chunk_samples = int(samplerate * chunk_duration)
+        self.mode = mode
+        self.read_timeout = read_timeout
+        self.hop_samples = int(samplerate * hop_duration) if hop_duration else self.chunk_samples
+        if self.hop_samples <= 0 or self.hop_samples > self.chunk_samples:
+            raise ValueError("hop_duration必须大于0且不大于chunk_duration")
+        if mode == "blocking":
+            # sd.rec每次录完整的一帧，相邻帧不重叠，帧移只能等于帧长
+            self.hop_samples = self.chunk_samples
+
+        # 当前帧第一个样本在整个采集流中的序号
+        self.frame_start_sample = 0
+        # 读取过慢导致环形缓冲被覆盖的次数
+        self.overruns = 0
+        # 音频驱动报告的状态异常次数（例如input overflow），以及最近一次的状态
+        self.status_errors = 0
+        self.last_status = None
+        self._reported_status_errors = 0
+        self._stream = None
+        self._blocking_frames = 0
+        # 预分配的输出帧：通道主序、C连续的float32 (channels, samples)，每次读取复用
+        # 各通道组（球门、定位、立体声对）都是它的行切片，不需要拷贝
+        self._frame = np.zeros((channels, self.chunk_samples), dtype=np.float32)
+
+        if mode == "blocking":
+            # sd.rec的录音缓冲 (samples, channels)
+            self._recording = np.zeros((self.chunk_samples, channels), dtype=np.float32)
+        else:
+            capacity = max(int(samplerate * buffer_duration), 2 * self.chunk_samples)
+            # 环形缓冲按 (samples, channels) 存储，与回调数据布局一致，写入时无需转置
+            self._ring = np.zeros((capacity, channels), dtype=np.float32)
+            self._capacity = capacity
+            # 单生产者单消费者：_write_count只由回调线程修改，_read_count只由读取线程修改
+            self._write_count = 0
+            self._read_count = self.chunk_samples - self.hop_samples
+            # 回调的最大块长：回调写入期间这一块覆盖的是缓冲中最旧的数据，读取时要留出余量
+            self._max_block = 0
+            self._data_ready = threading.Event()
+
+    def start(self):
+        """启动持续采集（blocking模式下无需启动）"""
+        if self.mode != "stream" or self._stream is not None:
+            return
+        # sounddevice导入时初始化PortAudio，推迟到真正开始采集时
+        import sounddevice as sd
+        self._stream = sd.InputStream(device=self.device, channels=self.channels,
+                                      samplerate=self.samplerate, dtype='float32',
+                                      callback=self._callback)
+        self._stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        """音频线程回调：将新样本写入环形缓冲，不加锁、不分配内存"""
+        if status:
+            self.status_errors += 1
+            self.last_status = status
+        capacity = self._capacity
+        if frames > capacity:
+            # 单次回调超过缓冲容量时只保留最新的数据
+            self._write_count += frames - capacity
+            indata = indata[frames - capacity:]
+            frames = capacity
+        if frames > self._max_block:
+            self._max_block = frames
+        start = self._write_count % capacity
+        end = start + frames
+        if end <= capacity:
+            self._ring[start:end] = indata
+        else:
+            first = capacity - start
+            self._ring[start:] = indata[:first]
+            self._ring[:end - capacity] = indata[first:]
+        # 数据写完后再发布写指针，读取线程看到的计数对应的数据一定完整
+        self._write_count += frames
+        self._data_ready.set()
+
+    def read_frame(self):
+        """
+        从环形缓冲读取下一帧（stream模式）
+        每次前进hop_samples个样本，返回长度为chunk_samples的帧，帧之间没有间隙
+        返回的数组为预分配缓冲，下一次读取时会被覆盖
+        read_timeout秒内没有新数据时抛出RuntimeError
+        """
+        self.start()
+        target = self._read_count + self.hop_samples
+        written = self._write_count
+        stalled_since = time.monotonic()
+        while self._write_count < target:
+            self._data_ready.wait(0.5)
+            self._data_ready.clear()
+            if self._write_count != written:
+                written = self._write_count
+                stalled_since = time.monotonic()
+            elif time.monotonic() - stalled_since > self.read_timeout:
+                raise RuntimeError(f"音频流 {self.read_timeout:.1f}秒没有新数据（设备断开或流已停止），"
+                                   f"状态异常 {self.status_errors} 次，最近状态: {self.last_status}")
+        if self.status_errors != self._reported_status_errors:
+            log.warning("音频驱动报告状态异常 %d 次: %s",
+                        self.status_errors - self._reported_status_errors, self.last_status)
+            self._reported_status_errors = self.status_errors
+
+        capacity = self._capacity
+        while True:
+            # 回调正在写入的一块会覆盖最旧的数据，可安全读取的最早样本要留出一个最大块的余量
+            oldest = self._write_count + min(self._max_block, capacity - self.chunk_samples) - capacity
+            if target - self.chunk_samples < oldest:
+                # 读取过慢：最旧的数据已被覆盖或即将被覆盖，跳到最新的完整帧
+                self.overruns += 1
+                target = self._write_count
+
+            start = (target - self.chunk_samples) % capacity
+            end = start + self.chunk_samples
+            if end <= capacity:
+                self._frame[:] = self._ring[start:end].T
+            else:
+                first = capacity - start
+                self._frame[:, :first] = self._ring[start:].T
+                self._frame[:, first:] = self._ring[:end - capacity].T
+            # 复制期间回调可能继续写入：复制的样本没有被覆盖才有效，否则重新读取最新的帧
+            oldest = self._write_count + min(self._max_block, capacity - self.chunk_samples) - capacity
+            if target - self.chunk_samples >= oldest:
+                break
+
+        self._read_count = target
+        self.frame_start_sample = target - self.chunk_samples
+        return self._frame
 
     def get_audio_chunk(self):
-        recording = sd.rec(self.chunk_samples, samplerate=self.samplerate,
-                           channels=self.channels, device=self.device)
+        if self.mode == "stream":
+            return self.read_frame()
+        import sounddevice as sd
+        sd.rec(out=self._recording, samplerate=self.samplerate, device=self.device)
         sd.wait()
-        return recording.T  # 转置为 (channels, samples)
-    
+        # blocking模式下帧之间的间隙无法统计，按连续帧计数
+        self.frame_start_sample = self._blocking_frames * self.chunk_samples
+        self._blocking_frames += 1
+        # 转置拷贝到通道主序的连续缓冲 (channels, samples)，返回的数组下一次读取时会被覆盖
+        self._frame[:] = self._recording.T
+        return self._frame
+
     def close(self):
         """关闭音频流"""
-        # sounddevice会自动管理资源，这里不需要特殊处理
-        pass
+        # blocking模式下sounddevice会自动管理资源
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+def create_audio_stream(config):
+    """根据配置（RuntimeConfig或原始配置字典）创建AudioStream"""
+    runtime = as_runtime_config(config)
+    return AudioStream(device=runtime.device_id, samplerate=runtime.sample_rate,
+                       channels=runtime.channels, chunk_duration=runtime.chunk_duration,
+                       mode=runtime.capture_mode, hop_duration=runtime.hop_duration)
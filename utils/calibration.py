@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+CALIBRATION_VERSION = 1
+
+log = logging.getLogger(__name__)
+
+class NoiseCalibrator:
+    """
+    自适应噪声底和麦克风增益校准
+    每个通道维护一个按指数衰减加权的对数直方图（固定的bins个计数），用它计算长时间窗口上的RMS分位数：
+    低分位数即该通道的噪声底。每帧更新只需把当前RMS所在的计数加上一个逐帧增大的权重，O(通道数)且内存恒定；
+    分位数只在刷新阈值时计算。
+    场地噪声近似均匀分布，定位麦克风噪声底的差异视为增益差异，由此得到每个麦克风的增益校正系数。
+    状态可保存到磁盘，重启后直接使用上次的校准结果。
+    """
+
+    def __init__(self, channels, frame_duration, half_life=120.0, bins=120, min_level=1e-5, max_level=1.0,
+                 noise_percentile=20.0, warmup=10.0, path=None):
+        """
+        Args:
+            channels: 通道数
+            frame_duration: 每次update对应的时长（秒，即帧移）
+            half_life: 统计窗口的半衰期（秒）
+            bins: 对数直方图的分格数
+            min_level, max_level: 直方图覆盖的RMS范围
+            noise_percentile: 作为噪声底的分位数（0-100）
+            warmup: 累计多少秒的数据后校准结果才生效；按衰减加权的累计时长最多趋近 half_life/ln2，
+                更长的warmup永远达不到，按该上限的95%截断
+            path: 校准状态文件（.npz），None表示不保存
+        """
+        self.channels = channels
+        self.bins = bins
+        self.min_level = min_level
+        self.max_level = max_level
+        self.noise_percentile = noise_percentile
+        self.path = path
+        self._log_min = np.log10(min_level)
+        self._bin_scale = bins / (np.log10(max_level) - self._log_min)
+        # 每格的几何中心RMS
+        self.levels = 10.0 ** (self._log_min + (np.arange(bins) + 0.5) / self._bin_scale)
+
+        # 衰减不逐格相乘：新样本的权重每帧乘以1/decay，等价于旧计数每帧乘以decay
+        self._growth = 0.5 ** (-frame_duration / half_life)
+        self._counts = np.zeros((channels, bins))
+        self._weight = 1.0
+        # 有效样本数（按衰减加权）及warmup对应的样本数
+        self._total = 0.0
+        saturation = 1.0 / (1.0 - 1.0 / self._growth)
+        self._warmup_total = min(warmup / frame_duration, 0.95 * saturation)
+        self._channel_index = np.arange(channels)
+        self._save_thread = None
+
+        if path is not None:
+            self.load()
+
+    @property
+    def ready(self):
+        """累计的数据是否足够让校准结果生效"""
+        return self._total >= self._warmup_total
+
+    def update(self, rms_values):
+        """加入一帧各通道的RMS，shape (channels,)"""
+        levels = np.log10(np.maximum(rms_values, self.min_level))
+        index = np.clip(((levels - self._log_min) * self._bin_scale).astype(np.int64), 0, self.bins - 1)
+        self._weight *= self._growth
+        self._counts[self._channel_index, index] += self._weight
+        self._total = self._total * (1.0 / self._growth) + 1.0
+        if self._weight > 1e100:
+            # 权重过大时整体缩放，避免溢出
+            self._counts /= self._weight
+            self._weight = 1.0
+
+    def percentile(self, q):
+        """各通道RMS的q分位数（0-100），shape (channels,)"""
+        cumulative = np.cumsum(self._counts, axis=1)
+        totals = cumulative[:, -1:]
+        totals[totals == 0] = 1.0
+        index = np.argmax(cumulative / totals >= q / 100.0, axis=1)
+        return self.levels[index]
+
+    def noise_floor(self):
+        """各通道的噪声底，shape (channels,)"""
+        return self.percentile(self.noise_percentile)
+
+    def gain_correction(self, channels, min_gain=0.25, max_gain=4.0):
+        """
+        指定通道的增益校正系数：把各通道的噪声底校正到它们的中位数
+        channels: 通道切片或索引
+        """
+        floors = self.noise_floor()[channels]
+        return np.clip(np.median(floors) / floors, min_gain, max_gain)
+
+    def reset(self):
+        self._counts.fill(0.0)
+        self._weight = 1.0
+        self._total = 0.0
+
+    def _state(self):
+        return {'version': CALIBRATION_VERSION, 'channels': self.channels, 'bins': self.bins,
+                'min_level': self.min_level, 'max_level': self.max_level,
+                'counts': self._counts / self._weight, 'total': self._total}
+
+    def load(self):
+        """读取校准状态文件，参数不一致或文件不存在时忽略"""
+        if self.path is None or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as data:
+                if (int(data['version']) != CALIBRATION_VERSION or int(data['channels']) != self.channels or
+                        int(data['bins']) != self.bins or float(data['min_level']) != self.min_level or
+                        float(data['max_level']) != self.max_level):
+                    log.warning("校准文件参数不一致，重新校准: %s", self.path)
+                    return False
+                self._counts[:] = data['counts']
+                self._total = float(data['total'])
+        except (OSError, KeyError, ValueError) as e:
+            log.warning("无法读取校准文件 %s: %s", self.path, e)
+            return False
+        self._weight = 1.0
+        return True
+
+    def save(self, background=False):
+        """
+        保存校准状态
+        background: 在后台线程中写文件，不阻塞分析线程；上一次保存未完成时跳过
+        """
+        if self.path is None:
+            return
+        if self._save_thread is not None and self._save_thread.is_alive():
+            if not background:
+                self._save_thread.join()
+            else:
+                return
+        state = self._state()
+        if background:
+            self._save_thread = threading.Thread(target=self._write, args=(state,), daemon=True)
+            self._save_thread.start()
+        else:
+            self._write(state)
+
+    def _write(self, state):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # 先写临时文件再替换，进程中途退出不会留下损坏的文件
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, **state)
+        os.replace(tmp_path, self.path)
+
+class AutoThresholds:
+    """
+    根据NoiseCalibrator的噪声底自动设置定位、进球检测和BPM的阈值
+    每隔refresh_interval秒刷新一次；校准数据不足时保持配置中的固定阈值
+    """
+
+    def __init__(self, calibrator, main_channels=slice(2, 8), goal_channels=slice(0, 2),
+                 noise_margin=2.0, goal_margin=10.0, min_goal_threshold=0.05, silence_margin=3.0,
+                 gain_correction=True, refresh_interval=1.0, save_interval=60.0):
+        """
+        Args:
+            calibrator: NoiseCalibrator，通道顺序与采集通道1-8一致
+            main_channels, goal_channels: 定位和球门麦克风在校准通道中的位置
+            noise_margin: 定位噪声阈值 = 校正后定位麦克风噪声底 × noise_margin
+            goal_margin: 进球阈值 = 球门麦克风噪声底 × goal_margin
+            min_goal_threshold: 进球阈值下限
+            silence_margin: BPM静音阈值 = 校正后定位麦克风噪声底 × silence_margin
+            gain_correction: 是否对定位麦克风做增益校正
+            refresh_interval: 阈值刷新间隔（秒）
+            save_interval: 校准状态保存间隔（秒）
+        """
+        self.calibrator = calibrator
+        self.main_channels = main_channels
+        self.goal_channels = goal_channels
+        self.noise_margin = noise_margin
+        self.goal_margin = goal_margin
+        self.min_goal_threshold = min_goal_threshold
+        self.silence_margin = silence_margin
+        self.gain_correction = gain_correction
+        self.refresh_interval = refresh_interval
+        self.save_interval = save_interval
+
+        main_count = len(range(*main_channels.indices(calibrator.channels)))
+        # 定位麦克风增益校正系数，未校准时为1
+        self.gains = np.ones(main_count)
+        # 当前阈值，未校准时为None（各模块使用自己的默认值）
+        self.noise_threshold = None
+        self.goal_threshold = None
+        self.silence_threshold = None
+        self._last_refresh = time.monotonic()
+        self._last_save = self._last_refresh
+        if calibrator.ready:
+            self.refresh()
+
+    def update(self, rms_values):
+        """
+        加入一帧各通道的RMS（通道1-8），到刷新间隔时重新计算阈值
+        返回是否刷新了阈值
+        """
+        self.calibrator.update(rms_values)
+        now = time.monotonic()
+        if now - self._last_save >= self.save_interval:
+            self._last_save = now
+            self.calibrator.save(background=True)
+        if now - self._last_refresh < self.refresh_interval or not self.calibrator.ready:
+            return False
+        self._last_refresh = now
+        self.refresh()
+        return True
+
+    def refresh(self):
+        floors = self.calibrator.noise_floor()
+        main_floors = floors[self.main_channels]
+        if self.gain_correction:
+            self.gains = self.calibrator.gain_correction(self.main_channels)
+        main_floor = float(np.median(main_floors * self.gains))
+        self.noise_threshold = main_floor * self.noise_margin
+        self.silence_threshold = main_floor * self.silence_margin
+        self.goal_threshold = max(self.min_goal_threshold, float(np.max(floors[self.goal_channels])) * self.goal_margin)
+
+    def close(self):
+        self.calibrator.save()
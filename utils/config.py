@@ -0,0 +1,307 @@
+import hashlib
+import logging
+import math
+import os
+import pickle
+
+# 编译结果格式版本，RuntimeConfig字段变化时递增，旧的缓存自动失效
+# （校验规则变化不需要递增：读取缓存时总是重新校验原始配置）
+COMPILED_CONFIG_VERSION = 4
+
+CAPTURE_MODES = ('blocking', 'stream')
+LOCALIZATION_METHODS = ('rms', 'grid', 'gcc_phat')
+GOAL_MODES = ('rms', 'transient')
+OSC_MODES = ('simple', 'bundle')
+PIPELINE_RUNTIMES = ('threads', 'asyncio')
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+FRAME_LOG_FORMATS = ('binary', 'csv')
+KERNEL_BACKENDS = ('numpy', 'numba', 'auto')
+
+log = logging.getLogger(__name__)
+
+class ConfigError(ValueError):
+    """配置文件错误，errors为全部错误信息的列表"""
+
+    def __init__(self, path, errors):
+        self.path = path
+        self.errors = errors
+        super().__init__(f"配置文件 {path} 有 {len(errors)} 处错误:\n" + "\n".join(f"  - {e}" for e in errors))
+
+class OSCTarget:
+    """OSC发送目标"""
+
+    def __init__(self, ip, port, address):
+        self.ip = ip
+        self.port = port
+        self.address = address
+
+    def __repr__(self):
+        return f"{self.ip}:{self.port}{self.address}"
+
+class RuntimeConfig:
+    """
+    校验并预计算后的运行配置
+    各create_*工厂函数接收RuntimeConfig：核心参数（采样率、帧长、麦克风坐标、OSC目标等）在编译时一次
+    转换为类型确定的字段，可选子系统的配置段通过section()读取。原始配置字典保留在raw中。
+    """
+
+    def __init__(self, raw, source_path):
+        import numpy as np
+
+        self.raw = raw
+        self.source_path = source_path
+        positions = np.array([mic['position'] for mic in raw['mics'][:8]], dtype=float)
+        # 通道1-8的麦克风坐标，以及其中的球门（通道1-2）和定位（通道3-8）麦克风
+        self.mic_positions = positions
+        self.goal_mic_positions = positions[:2]
+        self.main_mic_positions = positions[2:8]
+
+        self.device_id = raw['device_id']
+        self.sample_rate = int(raw['sample_rate'])
+        self.channels = int(raw['channels'])
+        self.chunk_duration = float(raw['chunk_duration'])
+        self.capture_mode = raw.get('capture_mode', 'blocking')
+        # blocking模式每帧调用一次sd.rec录完整的一帧，帧移固定等于帧长，hop_duration只在stream模式有效
+        if self.capture_mode == 'blocking':
+            self.hop_duration = self.chunk_duration
+        else:
+            self.hop_duration = float(raw.get('hop_duration') or self.chunk_duration)
+        self.chunk_samples = int(self.sample_rate * self.chunk_duration)
+        self.hop_samples = int(self.sample_rate * self.hop_duration)
+        # 每次分析的时间间隔（秒），按帧计数的参数据此换算
+        self.frame_duration = self.hop_duration
+
+        self.localization_method = raw.get('localization', {}).get('method', 'rms')
+        self.goal_mode = raw.get('goal_detection', {}).get('mode', 'rms')
+        self.pipeline_enabled = bool(raw.get('pipeline', {}).get('enabled', False))
+        self.pipeline_runtime = raw.get('pipeline', {}).get('runtime', 'threads')
+        self.osc_mode = raw.get('osc_output', {}).get('mode', 'simple')
+        self.osc_target = OSCTarget(raw['osc']['ip'], int(raw['osc']['port']), raw['osc']['address'])
+        self.position_target = OSCTarget(raw['position_osc']['ip'], int(raw['position_osc']['port']),
+                                         raw['position_osc']['address'])
+
+    def section(self, name):
+        """可选子系统的配置段，缺省或不是字典时返回空字典"""
+        value = self.raw.get(name)
+        return value if isinstance(value, dict) else {}
+
+    def with_sample_rate(self, sample_rate):
+        """返回采样率替换后重新编译的配置（例如回放录音的采样率与配置不一致时）"""
+        raw = dict(self.raw, sample_rate=int(sample_rate))
+        return compile_config(raw, self.source_path)
+
+    def summary(self):
+        """一行的配置摘要"""
+        return (f"设备 {self.device_id}, {self.sample_rate}Hz x {self.channels}通道, "
+                f"帧长 {self.chunk_duration * 1000:.0f}ms/帧移 {self.hop_duration * 1000:.0f}ms ({self.capture_mode}), "
+                f"定位 {self.localization_method}, 进球 {self.goal_mode}, "
+                f"流水线 {self.pipeline_runtime if self.pipeline_enabled else '关'}, "
+                f"OSC {self.osc_mode} -> {self.osc_target}, 位置 -> {self.position_target}")
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _check_choice(errors, section, key, choices, default):
+    value = section.get(key, default) if isinstance(section, dict) else default
+    if value not in choices:
+        errors.append(f"{key}: {value!r} 不是有效值，可选 {', '.join(choices)}")
+
+def _check_osc(errors, raw, name):
+    target = raw.get(name)
+    if not isinstance(target, dict):
+        errors.append(f"缺少 {name} 配置")
+        return
+    if not isinstance(target.get('ip'), str):
+        errors.append(f"{name}.ip 必须是字符串")
+    port = target.get('port')
+    if not isinstance(port, int) or not 0 < port < 65536:
+        errors.append(f"{name}.port 必须是1-65535的整数，当前为 {port!r}")
+    address = target.get('address')
+    if not isinstance(address, str) or not address.startswith('/'):
+        errors.append(f"{name}.address 必须是以/开头的OSC地址")
+
+def validate_config(raw):
+    """
+    校验原始配置字典
+    返回错误信息列表，为空表示配置有效；一次列出全部错误，而不是运行到深处才失败
+    """
+    errors = []
+    if not isinstance(raw, dict):
+        return ["配置文件内容必须是字典"]
+
+    mics = raw.get('mics')
+    if not isinstance(mics, list) or len(mics) < 8:
+        errors.append("mics 必须是至少8个麦克风的列表（1左门, 2右门, 3-8定位麦克风）")
+    else:
+        for i, mic in enumerate(mics[:8]):
+            position = mic.get('position') if isinstance(mic, dict) else None
+            if not isinstance(position, list) or len(position) != 2 or not all(_is_number(v) for v in position):
+                errors.append(f"mics[{i}].position 必须是 [x, y] 两个数")
+
+    if not isinstance(raw.get('device_id'), (int, str)) or isinstance(raw.get('device_id'), bool):
+        errors.append("device_id 必须是设备编号或名称")
+    sample_rate = raw.get('sample_rate')
+    if not isinstance(sample_rate, int) or sample_rate <= 0:
+        errors.append(f"sample_rate 必须是正整数，当前为 {sample_rate!r}")
+    channels = raw.get('channels')
+    if not isinstance(channels, int) or channels < 8:
+        errors.append(f"channels 至少为8，当前为 {channels!r}")
+    chunk_duration = raw.get('chunk_duration')
+    if not _is_number(chunk_duration) or chunk_duration <= 0:
+        errors.append(f"chunk_duration 必须是正数，当前为 {chunk_duration!r}")
+    hop_duration = raw.get('hop_duration', chunk_duration)
+    if not _is_number(hop_duration) or hop_duration <= 0:
+        errors.append(f"hop_duration 必须是正数，当前为 {hop_duration!r}")
+    elif _is_number(chunk_duration) and hop_duration > chunk_duration:
+        errors.append("hop_duration 不能大于 chunk_duration")
+    _check_choice(errors, raw, 'capture_mode', CAPTURE_MODES, 'blocking')
+
+    localization = raw.get('localization', {})
+    _check_choice(errors, localization, 'method', LOCALIZATION_METHODS, 'rms')
+    multi_source = localization.get('multi_source', {}) if isinstance(localization, dict) else {}
+    if isinstance(multi_source, dict) and multi_source.get('enabled', False):
+        max_sources = multi_source.get('max_sources', 2)
+        if not isinstance(max_sources, int) or not 1 <= max_sources <= 4:
+            errors.append(f"localization.multi_source.max_sources 必须是1-4的整数，当前为 {max_sources!r}")
+        for key in ('resolution', 'refine_resolution'):
+            value = multi_source.get(key, 1.0)
+            if not _is_number(value) or value <= 0:
+                errors.append(f"localization.multi_source.{key} 必须是正数，当前为 {value!r}")
+    goal_detection = raw.get('goal_detection', {})
+    _check_choice(errors, goal_detection, 'mode', GOAL_MODES, 'rms')
+    if isinstance(goal_detection, dict):
+        for key in ('recent_window', 'previous_window'):
+            value = goal_detection.get(key, 1.0)
+            if not _is_number(value) or value <= 0:
+                errors.append(f"goal_detection.{key} 必须是正数（秒），当前为 {value!r}")
+        cooldown = goal_detection.get('cooldown', 3.0)
+        if not _is_number(cooldown) or cooldown < 0:
+            errors.append(f"goal_detection.cooldown 不能为负（秒），当前为 {cooldown!r}")
+    _check_choice(errors, raw.get('osc_output', {}), 'mode', OSC_MODES, 'simple')
+    _check_choice(errors, raw.get('pipeline', {}), 'runtime', PIPELINE_RUNTIMES, 'threads')
+    _check_choice(errors, raw.get('kernels', {}), 'backend', KERNEL_BACKENDS, 'numpy')
+    control = raw.get('control', {})
+    if isinstance(control, dict) and 'port' in control and (
+            not isinstance(control['port'], int) or not 0 < control['port'] < 65536):
+        errors.append(f"control.port 必须是1-65535的整数，当前为 {control['port']!r}")
+
+    calibration = raw.get('calibration', {})
+    if isinstance(calibration, dict) and calibration.get('enabled', False):
+        half_life = calibration.get('half_life', 120.0)
+        warmup = calibration.get('warmup', 10.0)
+        if not _is_number(half_life) or half_life <= 0:
+            errors.append(f"calibration.half_life 必须是正数，当前为 {half_life!r}")
+        elif not _is_number(warmup) or warmup < 0:
+            errors.append(f"calibration.warmup 不能为负，当前为 {warmup!r}")
+        elif warmup >= half_life / math.log(2):
+            # 按衰减加权的累计时长最多趋近 half_life/ln2，校准结果永远不会生效
+            errors.append(f"calibration.warmup 必须小于 half_life/ln2 = {half_life / math.log(2):.1f}秒，"
+                          f"当前为 {warmup!r}")
+
+    windows = raw.get('windows', {})
+    if isinstance(windows, dict) and windows.get('enabled', False):
+        for key in ('rms', 'goal'):
+            value = windows.get(key, 0.05)
+            if not _is_number(value) or value <= 0:
+                errors.append(f"windows.{key} 必须是正数，当前为 {value!r}")
+
+    recorder = raw.get('recorder', {})
+    if isinstance(recorder, dict) and recorder.get('enabled', False):
+        for key in ('ring_minutes', 'segment_seconds'):
+            value = recorder.get(key, 1.0)
+            if not _is_number(value) or value <= 0:
+                errors.append(f"recorder.{key} 必须是正数，当前为 {value!r}")
+
+    analytics = raw.get('analytics', {})
+    if isinstance(analytics, dict) and analytics.get('enabled', False):
+        for key in ('span', 'shot_speed', 'max_speed', 'goal_window', 'bpm_boost_half_life'):
+            value = analytics.get(key, 1.0)
+            if not _is_number(value) or value <= 0:
+                errors.append(f"analytics.{key} 必须是正数，当前为 {value!r}")
+        shot_angle = analytics.get('shot_angle', 30.0)
+        if not _is_number(shot_angle) or not 0 < shot_angle <= 90:
+            errors.append(f"analytics.shot_angle 必须在0-90度之间，当前为 {shot_angle!r}")
+
+    log_config = raw.get('logging', {})
+    if isinstance(log_config, dict):
+        level = log_config.get('level', 'INFO')
+        if str(level).upper() not in LOG_LEVELS:
+            errors.append(f"logging.level: {level!r} 不是有效值，可选 {', '.join(LOG_LEVELS)}")
+        if log_config.get('frame_log_format') is not None:
+            _check_choice(errors, log_config, 'frame_log_format', FRAME_LOG_FORMATS, 'binary')
+
+    filterbank = raw.get('filterbank', {})
+    if isinstance(filterbank, dict) and filterbank.get('enabled', False):
+        from utils.filterbank import DEFAULT_BANDS
+        bands = filterbank.get('bands', DEFAULT_BANDS)
+        if not isinstance(bands, dict) or not all(
+                isinstance(b, list) and len(b) == 2 and all(_is_number(v) for v in b) and b[0] < b[1]
+                for b in bands.values()):
+            errors.append("filterbank.bands 必须是 {频带名: [低频, 高频]}")
+        elif filterbank.get('impact_band', 'impact') not in bands:
+            errors.append(f"filterbank.impact_band {filterbank.get('impact_band', 'impact')!r} 不在 bands 中")
+
+    _check_osc(errors, raw, 'osc')
+    _check_osc(errors, raw, 'position_osc')
+    return errors
+
+def compile_config(raw, source_path="<dict>"):
+    """校验原始配置字典并编译为RuntimeConfig，配置无效时抛出ConfigError"""
+    errors = validate_config(raw)
+    if errors:
+        raise ConfigError(source_path, errors)
+    return RuntimeConfig(raw, source_path)
+
+def as_runtime_config(config):
+    """工厂函数的参数：RuntimeConfig直接返回，原始配置字典先校验编译"""
+    if isinstance(config, RuntimeConfig):
+        return config
+    return compile_config(config)
+
+def config_section(config, name):
+    """从RuntimeConfig或（可能只包含部分配置段的）原始字典中取出一个配置段"""
+    if isinstance(config, RuntimeConfig):
+        return config.section(name)
+    value = config.get(name) if isinstance(config, dict) else None
+    return value if isinstance(value, dict) else {}
+
+def _cache_path(cache_dir, source_bytes):
+    digest = hashlib.sha1(source_bytes).hexdigest()[:16]
+    return os.path.join(cache_dir, f"config_v{COMPILED_CONFIG_VERSION}_{digest}.pickle")
+
+def load_runtime_config(path="mic_config.yaml", cache_dir=".cache", use_cache=True):
+    """
+    读取、校验并编译配置文件
+    编译结果按配置文件内容的哈希缓存到cache_dir，配置未修改时重启直接读取缓存（不解析YAML），但按当前代码的规则重新校验
+    返回 (RuntimeConfig, 是否来自缓存)；配置无效时抛出ConfigError
+    """
+    with open(path, 'rb') as f:
+        source = f.read()
+    cache_path = _cache_path(cache_dir, source)
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                runtime = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            runtime = None
+        if runtime is not None:
+            # 缓存可能由校验规则较旧的代码写入：跳过YAML解析，但总是按当前规则重新校验
+            errors = validate_config(runtime.raw)
+            if errors:
+                raise ConfigError(path, errors)
+            runtime.source_path = path
+            return runtime, True
+
+    import yaml
+    runtime = compile_config(yaml.safe_load(source), path)
+
+    if use_cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(runtime, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            log.warning("无法写入配置缓存 %s: %s", cache_path, e)
+    return runtime, False
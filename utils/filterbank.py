@@ -0,0 +1,109 @@
+import numpy as np
+
+# 默认频带（Hz）：低频隆隆声、人声和观众噪声、球撞击声
+DEFAULT_BANDS = {'low': [0, 250], 'voice': [250, 2000], 'impact': [2000, 12000]}
+
+def design_bandpass(samplerate, low, high, taps):
+    """
+    设计线性相位FIR带通滤波器（Blackman窗加窗sinc）
+    low为0时为低通，high不小于奈奎斯特频率时为高通
+    返回长度为taps的滤波器系数
+    """
+    nyquist = samplerate / 2.0
+    n = np.arange(taps) - (taps - 1) / 2.0
+    high = min(high, nyquist)
+    # 理想带通 = 截止high的低通 - 截止low的低通
+    h = 2.0 * high / samplerate * np.sinc(2.0 * high / samplerate * n)
+    if low > 0:
+        h -= 2.0 * low / samplerate * np.sinc(2.0 * low / samplerate * n)
+    h *= np.blackman(taps)
+    # 通带中心频率处增益归一化为1
+    center = (low + high) / 2.0 if low > 0 else 0.0
+    gain = np.abs(np.sum(h * np.exp(-2j * np.pi * center / samplerate * np.arange(taps))))
+    return h / gain
+
+class FilterBank:
+    """
+    流式分频滤波器组
+    所有通道、所有频带在一次批量运算中完成：新样本与上一块保留的尾部拼接后做一次rfft，
+    乘以预先计算的各频带频率响应，再做一次irfft（重叠保留法），滤波状态跨块保持，块边界没有截断。
+    每个频带保留最近frame_samples个滤波输出，用于计算与帧对齐的频带能量。
+    """
+
+    def __init__(self, samplerate, bands, channels, frame_samples, taps=255):
+        """
+        Args:
+            samplerate: 采样率
+            bands: {频带名: [低频, 高频]}（Hz），低频为0时为低通
+            channels: 通道数
+            frame_samples: 每帧样本数，频带能量按最近一帧的滤波输出计算
+            taps: FIR滤波器长度（奇数），越长过渡带越窄，延迟为(taps-1)/2个样本
+        """
+        if taps % 2 == 0:
+            taps += 1
+        self.samplerate = samplerate
+        self.band_names = list(bands)
+        self.channels = channels
+        self.frame_samples = frame_samples
+        self.taps = taps
+        # 线性相位FIR的群延迟（样本）
+        self.delay = (taps - 1) // 2
+        self._kernels = np.array([design_bandpass(samplerate, low, high, taps) for low, high in bands.values()])
+
+        # 滤波状态：上一块的最后taps-1个输入样本
+        self._tail = np.zeros((channels, taps - 1))
+        # 每个频带最近一帧的滤波输出 (bands, channels, frame_samples)
+        self.output = np.zeros((len(self.band_names), channels, frame_samples))
+        # 按块长缓存的FFT长度和频率响应
+        self._responses = {}
+        self._block = None
+
+    def band_index(self, name):
+        return self.band_names.index(name)
+
+    def _response(self, samples):
+        if samples not in self._responses:
+            n_fft = 1 << int(np.ceil(np.log2(samples + self.taps - 1)))
+            self._responses[samples] = (n_fft, np.fft.rfft(self._kernels, n_fft)[:, None, :])
+        return self._responses[samples]
+
+    def reset(self):
+        self._tail.fill(0.0)
+        self.output.fill(0.0)
+
+    def process(self, samples):
+        """
+        滤波新到达的样本
+        samples: np.array, shape (channels, n) - 只包含新样本（重叠帧时为最后hop个样本）
+        返回本块各频带的滤波输出 (bands, channels, n)，延迟为self.delay个样本
+        """
+        n = samples.shape[1]
+        n_fft, response = self._response(n)
+        keep = self.taps - 1
+        if self._block is None or self._block.shape[1] != keep + n:
+            self._block = np.zeros((self.channels, keep + n))
+        block = self._block
+        block[:, :keep] = self._tail
+        block[:, keep:] = samples[:self.channels]
+        self._tail[:] = block[:, n:]
+
+        # 一次rfft、一次广播乘法、一次irfft完成所有频带和通道
+        spectrum = np.fft.rfft(block, n_fft)
+        filtered = np.fft.irfft(spectrum[None, :, :] * response, n_fft)[:, :, keep:keep + n]
+
+        # 更新每个频带最近一帧的滤波输出
+        if n >= self.frame_samples:
+            self.output[:] = filtered[:, :, n - self.frame_samples:]
+        else:
+            self.output[:, :, :-n] = self.output[:, :, n:]
+            self.output[:, :, -n:] = filtered
+        return filtered
+
+    def band_energies(self):
+        """最近一帧各频带各通道的能量（均方值），shape (bands, channels)"""
+        return np.einsum('bcs,bcs->bc', self.output, self.output) / self.frame_samples
+
+    def band_rms(self, name):
+        """最近一帧指定频带各通道的RMS，shape (channels,)"""
+        band = self.output[self.band_index(name)]
+        return np.sqrt(np.einsum('cs,cs->c', band, band) / self.frame_samples)
@@ -0,0 +1,138 @@
+import logging
+import os
+import numpy as np
+from utils.config import config_section
+
+KERNEL_BACKENDS = ('numpy', 'numba', 'auto')
+
+log = logging.getLogger(__name__)
+
+class Kernels:
+    """
+    逐样本数值内核
+    每个内核把通道切片、样本切片、立体声合并、平方和归约合在一次遍历中完成，结果写入调用方提供的out数组；
+    NumPy和Numba两个后端接口完全一致，平方和都在float64中累加。输入为 (channels, samples) 的float32或float64数组，
+    按行切片得到的C连续数组（例如 frame[2:8]）最快，样本范围用start参数指定而不是先切片。
+
+    内核:
+        sum_squares(signals, start, out)                out[c] = Σ signals[c, start:]^2
+        stereo_sum_squares(signals, start, out)         out[p] = Σ (L + R)^2，L、R为第2p、2p+1通道
+        merge_stereo(signals, out)                      out[p] = (L + R) / 2
+        window_energies(signals, num_windows, window, out)
+                                                        out[c, w] = 第w个长度为window的窗内样本平方的均值
+    """
+
+    def __init__(self, name, sum_squares, stereo_sum_squares, merge_stereo, window_energies):
+        self.name = name
+        self.sum_squares = sum_squares
+        self.stereo_sum_squares = stereo_sum_squares
+        self.merge_stereo = merge_stereo
+        self.window_energies = window_energies
+
+    def __repr__(self):
+        return f"Kernels({self.name})"
+
+def _numpy_sum_squares(signals, start, out):
+    signals = signals[:, start:]
+    out[:] = np.einsum('cs,cs->c', signals, signals, dtype=np.float64)
+
+def _numpy_stereo_sum_squares(signals, start, out):
+    pairs = signals[:, start:].reshape(signals.shape[0] // 2, 2, signals.shape[1] - start)
+    out[:] = np.einsum('pks,pjs->p', pairs, pairs, dtype=np.float64)
+
+def _numpy_merge_stereo(signals, out):
+    pairs = signals.reshape(signals.shape[0] // 2, 2, signals.shape[1])
+    np.add(pairs[:, 0], pairs[:, 1], out=out)
+    out *= 0.5
+
+def _numpy_window_energies(signals, num_windows, window, out):
+    blocks = signals[:, :num_windows * window].reshape(signals.shape[0], num_windows, window)
+    out[:] = np.einsum('cwk,cwk->cw', blocks, blocks, dtype=np.float64)
+    out /= window
+
+NUMPY_KERNELS = Kernels('numpy', _numpy_sum_squares, _numpy_stereo_sum_squares, _numpy_merge_stereo,
+                        _numpy_window_energies)
+
+def _signatures(template):
+    """按输入类型和内存布局展开签名：C连续的版本在前，Numba调用时优先匹配，其余布局使用通用版本"""
+    return [template.format(dtype=dtype, layout=layout)
+            for layout in ('::1', ':') for dtype in ('float32', 'float64')]
+
+def _numba_kernels(cache_dir=None):
+    """
+    编译Numba内核
+    按显式签名在导入时编译，编译结果缓存到磁盘，之后启动直接加载，第一帧不会触发编译。
+    内层循环都在连续的一维切片上进行（循环下标从0开始，便于向量化），平方和在float64中累加；内核不持有GIL，分析线程运行时不阻塞采集和输出线程。
+    """
+    if cache_dir:
+        # Numba在导入时读取缓存目录
+        os.makedirs(cache_dir, exist_ok=True)
+        os.environ.setdefault('NUMBA_CACHE_DIR', os.path.abspath(cache_dir))
+    import numba
+
+    def jit(template):
+        return numba.njit(_signatures(template), cache=True, nogil=True, fastmath=True)
+
+    @jit('void({dtype}[:, {layout}], int64, float64[:])')
+    def sum_squares(signals, start, out):
+        for c in range(signals.shape[0]):
+            row = signals[c, start:]
+            acc = 0.0
+            for s in range(row.shape[0]):
+                value = np.float64(row[s])
+                acc += value * value
+            out[c] = acc
+
+    @jit('void({dtype}[:, {layout}], int64, float64[:])')
+    def stereo_sum_squares(signals, start, out):
+        for p in range(signals.shape[0] // 2):
+            left = signals[2 * p, start:]
+            right = signals[2 * p + 1, start:]
+            acc = 0.0
+            for s in range(left.shape[0]):
+                value = np.float64(left[s]) + np.float64(right[s])
+                acc += value * value
+            out[p] = acc
+
+    @jit('void({dtype}[:, {layout}], {dtype}[:, :])')
+    def merge_stereo(signals, out):
+        for p in range(signals.shape[0] // 2):
+            left = signals[2 * p]
+            right = signals[2 * p + 1]
+            merged = out[p]
+            for s in range(left.shape[0]):
+                merged[s] = (left[s] + right[s]) * 0.5
+
+    @jit('void({dtype}[:, {layout}], int64, int64, float64[:, :])')
+    def window_energies(signals, num_windows, window, out):
+        for c in range(signals.shape[0]):
+            for w in range(num_windows):
+                block = signals[c, w * window:(w + 1) * window]
+                acc = 0.0
+                for s in range(window):
+                    value = np.float64(block[s])
+                    acc += value * value
+                out[c, w] = acc / window
+
+    return Kernels('numba', sum_squares, stereo_sum_squares, merge_stereo, window_energies)
+
+def load_kernels(backend='numpy', cache_dir=None):
+    """
+    选择内核后端
+    backend: numpy；numba（未安装时回退到numpy并警告）；auto（已安装numba时使用numba）
+    """
+    if backend not in KERNEL_BACKENDS:
+        raise ValueError(f"未知的内核后端: {backend}")
+    if backend == 'numpy':
+        return NUMPY_KERNELS
+    try:
+        return _numba_kernels(cache_dir)
+    except ImportError:
+        if backend == 'numba':
+            log.warning("未安装numba，使用NumPy内核")
+        return NUMPY_KERNELS
+
+def create_kernels(config):
+    """根据配置创建内核后端"""
+    kernels_config = config_section(config, 'kernels')
+    return load_kernels(kernels_config.get('backend', 'numpy'), kernels_config.get('cache_dir', '.cache/numba'))
@@ -1,51 +1,203 @@
+import logging
 import numpy as np
+from utils.kernels import NUMPY_KERNELS
 
-# 全局变量用于进球检测的历史记录
-goal_history = {
-    'left_rms_history': [],
-    'right_rms_history': [],
-    'left_goal_cooldown': 0,
-    'right_goal_cooldown': 0
-}
+log = logging.getLogger(__name__)
 
-def merge_stereo_to_mono(signals):
+# 声速（厘米/秒），与麦克风坐标单位一致
+SPEED_OF_SOUND = 34300.0
+
+def merge_stereo_to_mono(signals, out=None, kernels=NUMPY_KERNELS):
     """
     将立体声信号合并为单声道
     signals: np.array, shape (channels, samples)
+    out: 可选的预分配输出数组，shape (channels//2, samples)
+    kernels: 内核后端（utils.kernels），默认NumPy
     返回合并后的信号，shape (channels//2, samples)
     假设每两个连续通道构成一个立体声对
     """
     if signals.shape[0] % 2 != 0:
         raise ValueError("通道数必须是偶数，每个立体声对占用2个通道")
-    
-    num_stereo_pairs = signals.shape[0] // 2
-    mono_signals = np.zeros((num_stereo_pairs, signals.shape[1]))
-    
-    for i in range(num_stereo_pairs):
-        left_channel = signals[i * 2]      # 左声道
-        right_channel = signals[i * 2 + 1] # 右声道
-        # 合并为单声道 (L + R) / 2
-        mono_signals[i] = (left_channel + right_channel) / 2.0
-    
-    return mono_signals
+    if out is None:
+        out = np.empty((signals.shape[0] // 2, signals.shape[1]), dtype=np.result_type(signals.dtype, np.float32))
+    # 合并为单声道 (L + R) / 2
+    kernels.merge_stereo(signals, out)
+    return out
 
-def compute_rms(signals, merge_stereo=True):
+def compute_rms(signals, merge_stereo=True, kernels=NUMPY_KERNELS):
     """
     signals: np.array, shape (channels, samples)
     merge_stereo: 是否将立体声合并为单声道
+    kernels: 内核后端（utils.kernels），默认NumPy
     返回每个通道的RMS值，shape (channels,) 或 (channels//2,)
+    平方和由内核直接归约（float64累加），不产生平方后的临时数组
     """
+    samples = signals.shape[1]
     if merge_stereo and signals.shape[0] % 2 == 0:
-        # 合并立体声为单声道
-        mono_signals = merge_stereo_to_mono(signals)
-        return np.sqrt(np.mean(mono_signals ** 2, axis=1))
+        # 合并立体声为单声道：sum((L + R)^2) / 4，不生成合并后的信号
+        energies = np.empty(signals.shape[0] // 2)
+        kernels.stereo_sum_squares(signals, 0, energies)
+        return np.sqrt(energies / (4.0 * samples))
     else:
         # 直接计算RMS
-        return np.sqrt(np.mean(signals ** 2, axis=1))
+        energies = np.empty(signals.shape[0])
+        kernels.sum_squares(signals, 0, energies)
+        return np.sqrt(energies / samples)
+
+class GoalDetector:
+    """
+    基于音量变化的进球检测器
+    每个球门的RMS历史保存在预分配的NumPy环形缓冲中，并维护最近窗口和之前窗口的滑动和，
+    两个球门在一次向量运算中同时判断，每帧O(1)且不分配列表。
+    每个实例拥有独立状态，多个球桌或回放可以在同一进程中同时运行。
+    """
+
+    def __init__(self, goal_threshold=0.3, history_length=20, volume_increase_threshold=3.0, cooldown_frames=30,
+                 recent_frames=5, previous_frames=10, num_goals=2, frame_duration=0.1):
+        """
+        Args:
+            goal_threshold: 基础进球检测阈值
+            history_length: 历史记录长度
+            volume_increase_threshold: 音量增大倍数阈值
+            cooldown_frames: 进球检测冷却帧数
+            recent_frames: 最近窗口帧数（5）
+            previous_frames: 之前窗口帧数（10，排除最近窗口）
+            num_goals: 球门数量，通道1是左门，通道2是右门
+            frame_duration: 每次update对应的时长（秒，即帧移），用于按秒读写冷却时间（cooldown）
+        各窗口和冷却都以帧计数，默认值按100ms帧整定；帧移不同时用from_durations按秒创建
+        """
+        self.goal_threshold = goal_threshold
+        self.history_length = history_length
+        self.volume_increase_threshold = volume_increase_threshold
+        self.cooldown_frames = cooldown_frames
+        self.recent_frames = recent_frames
+        self.previous_frames = previous_frames
+        self.num_goals = num_goals
+        self.frame_duration = frame_duration
+
+        # 超出 最近窗口+之前窗口 的历史不参与判断，不需要保存
+        self._capacity = max(1, min(history_length, recent_frames + previous_frames))
+        self._history = np.zeros((num_goals, self._capacity))
+        self._recent_sum = np.zeros(num_goals)
+        self._previous_sum = np.zeros(num_goals)
+        self._current = np.zeros(num_goals)
+        self._cooldown = np.zeros(num_goals, dtype=np.int64)
+        self._pos = 0       # 下一个写入位置（也是缓冲满时最旧元素的位置）
+        self._length = 0    # 缓冲中的有效帧数
+
+    @classmethod
+    def from_durations(cls, frame_duration, recent=0.5, previous=1.0, cooldown=3.0, **kwargs):
+        """
+        按秒指定最近窗口、之前窗口和冷却时间，按帧移换算为帧数
+        默认值与100ms帧的 5帧/10帧/30帧 一致
+        """
+        recent_frames = max(1, round(recent / frame_duration))
+        previous_frames = max(1, round(previous / frame_duration))
+        return cls(history_length=recent_frames + previous_frames, cooldown_frames=round(cooldown / frame_duration),
+                   recent_frames=recent_frames, previous_frames=previous_frames, frame_duration=frame_duration,
+                   **kwargs)
+
+    @property
+    def cooldown(self):
+        """冷却时间（秒）"""
+        return self.cooldown_frames * self.frame_duration
+
+    @cooldown.setter
+    def cooldown(self, seconds):
+        self.cooldown_frames = round(seconds / self.frame_duration)
+
+    def reset(self):
+        """清空历史和冷却状态"""
+        self._history.fill(0.0)
+        self._recent_sum.fill(0.0)
+        self._previous_sum.fill(0.0)
+        self._cooldown.fill(0)
+        self._pos = 0
+        self._length = 0
+
+    def _push(self, values):
+        """写入一帧，O(1)更新两个窗口的滑动和"""
+        capacity = self._capacity
+        length = self._length
+        recent = self.recent_frames
+        oldest = (self._pos - length) % capacity
+        if length >= recent:
+            # 最近窗口最早的一帧移入之前窗口
+            moved = self._history[:, (oldest + length - recent) % capacity]
+            self._recent_sum -= moved
+            self._previous_sum += moved
+        if length == capacity:
+            # 缓冲已满，最旧的一帧移出
+            evicted = self._history[:, oldest]
+            if length >= recent:
+                self._previous_sum -= evicted
+            else:
+                self._recent_sum -= evicted
+            length -= 1
+        self._history[:, self._pos] = values
+        self._recent_sum += values
+        self._pos = (self._pos + 1) % capacity
+        self._length = length + 1
+
+        if self._pos == 0:
+            # 每绕一圈按缓冲内容重算一次滑动和，消除浮点累积误差
+            self._resync()
+
+    def _resync(self):
+        length = self._length
+        order = (np.arange(self._pos - length, self._pos)) % self._capacity
+        ordered = self._history[:, order]
+        recent = min(length, self.recent_frames)
+        self._recent_sum[:] = ordered[:, length - recent:].sum(axis=1)
+        self._previous_sum[:] = ordered[:, max(0, length - recent - self.previous_frames):length - recent].sum(axis=1)
+
+    def update(self, rms_values):
+        """
+        rms_values: 包含球门麦克风RMS值的数组
+        返回: [左球门进球(0/127), 右球门进球(0/127)]
+        """
+        # 球门麦克风在前两个通道（通道1-2，对应索引0-1）
+        current = self._current
+        current.fill(0.0)
+        count = min(len(rms_values), self.num_goals)
+        current[:count] = rms_values[:count]
+
+        # 更新历史记录
+        self._push(current)
+
+        # 减少冷却时间
+        np.maximum(self._cooldown - 1, 0, out=self._cooldown)
+
+        goals = [0] * self.num_goals
+        previous_count = min(self._length - self.recent_frames, self.previous_frames)
+        if self._length < self.recent_frames or previous_count <= 0:
+            return goals
+
+        # 最近5帧的平均音量与之前10帧的平均音量（排除最近5帧）
+        recent_avg = self._recent_sum / self.recent_frames
+        previous_avg = self._previous_sum / previous_count
+
+        # 检测音量突然增大
+        detected = ((self._cooldown == 0) &
+                    (recent_avg > self.goal_threshold) &
+                    (recent_avg > previous_avg * self.volume_increase_threshold) &
+                    (current > self.goal_threshold))
+        if detected.any():
+            self._cooldown[detected] = self.cooldown_frames
+            for i in np.flatnonzero(detected):
+                goals[i] = 127
+                side = "左门" if i == 0 else "右门"
+                log.info("%s进球检测! 当前音量: %.3f, 平均音量: %.3f, 之前平均: %.3f",
+                         side, current[i], recent_avg[i], previous_avg[i], extra={'rate_limit': False})
+        return goals
+
+# detect_goals使用的模块级检测器，仅为兼容旧接口保留
+_default_goal_detector = None
 
 def detect_goals(rms_values, goal_threshold=0.3, history_length=20, volume_increase_threshold=3.0, cooldown_frames=30):
     """
-    基于音量变化的进球检测
+    基于音量变化的进球检测（兼容接口，状态保存在模块级GoalDetector中）
+    新代码请为每个球桌创建自己的GoalDetector
     rms_values: 包含球门麦克风RMS值的数组
     goal_threshold: 基础进球检测阈值
     history_length: 历史记录长度
@@ -54,73 +206,14 @@ def detect_goals(rms_values, goal_threshold=0.3, history_length=20, volume_incre
     返回: [左球门进球(0/127), 右球门进球(0/127)]
     新布局: 通道1是左门，通道2是右门
     """
-    global goal_history
-    
-    # 球门麦克风在前两个通道（通道1-2，对应索引0-1）
-    left_rms = rms_values[0] if len(rms_values) > 0 else 0   # 左门（通道1）
-    right_rms = rms_values[1] if len(rms_values) > 1 else 0  # 右门（通道2）
-    
-    # 更新历史记录
-    goal_history['left_rms_history'].append(left_rms)
-    goal_history['right_rms_history'].append(right_rms)
-    
-    # 保持历史记录长度
-    if len(goal_history['left_rms_history']) > history_length:
-        goal_history['left_rms_history'] = goal_history['left_rms_history'][-history_length:]
-    if len(goal_history['right_rms_history']) > history_length:
-        goal_history['right_rms_history'] = goal_history['right_rms_history'][-history_length:]
-    
-    # 减少冷却时间
-    if goal_history['left_goal_cooldown'] > 0:
-        goal_history['left_goal_cooldown'] -= 1
-    if goal_history['right_goal_cooldown'] > 0:
-        goal_history['right_goal_cooldown'] -= 1
-    
-    # 检测进球
-    left_goal = 0
-    right_goal = 0
-    
-    # 左门进球检测
-    if (goal_history['left_goal_cooldown'] == 0 and 
-        len(goal_history['left_rms_history']) >= 5):
-        
-        # 计算最近5帧的平均音量
-        recent_avg = np.mean(goal_history['left_rms_history'][-5:])
-        # 计算之前10帧的平均音量（排除最近5帧）
-        if len(goal_history['left_rms_history']) >= 15:
-            previous_avg = np.mean(goal_history['left_rms_history'][-15:-5])
-        else:
-            previous_avg = np.mean(goal_history['left_rms_history'][:-5])
-        
-        # 检测音量突然增大
-        if (recent_avg > goal_threshold and 
-            recent_avg > previous_avg * volume_increase_threshold and
-            left_rms > goal_threshold):
-            left_goal = 127
-            goal_history['left_goal_cooldown'] = cooldown_frames
-            print(f"左门进球检测! 当前音量: {left_rms:.3f}, 平均音量: {recent_avg:.3f}, 之前平均: {previous_avg:.3f}")
-    
-    # 右门进球检测
-    if (goal_history['right_goal_cooldown'] == 0 and 
-        len(goal_history['right_rms_history']) >= 5):
-        
-        # 计算最近5帧的平均音量
-        recent_avg = np.mean(goal_history['right_rms_history'][-5:])
-        # 计算之前10帧的平均音量（排除最近5帧）
-        if len(goal_history['right_rms_history']) >= 15:
-            previous_avg = np.mean(goal_history['right_rms_history'][-15:-5])
-        else:
-            previous_avg = np.mean(goal_history['right_rms_history'][:-5])
-        
-        # 检测音量突然增大
-        if (recent_avg > goal_threshold and 
-            recent_avg > previous_avg * volume_increase_threshold and
-            right_rms > goal_threshold):
-            right_goal = 127
-            goal_history['right_goal_cooldown'] = cooldown_frames
-            print(f"右门进球检测! 当前音量: {right_rms:.3f}, 平均音量: {recent_avg:.3f}, 之前平均: {previous_avg:.3f}")
-    
-    return [left_goal, right_goal]
+    global _default_goal_detector
+    if _default_goal_detector is None or _default_goal_detector.history_length != history_length:
+        _default_goal_detector = GoalDetector(history_length=history_length)
+    detector = _default_goal_detector
+    detector.goal_threshold = goal_threshold
+    detector.volume_increase_threshold = volume_increase_threshold
+    detector.cooldown_frames = cooldown_frames
+    return detector.update(rms_values)
 
 def estimate_position_enhanced(rms_values, mic_positions, noise_threshold=0.01, max_distance=200):
     """
@@ -219,24 +312,32 @@ def estimate_position(rms_values, mic_positions):
     pos = np.sum(mic_positions * weights[:, None], axis=0)
     return pos
 
-def estimate_position_with_smoothing(rms_values, mic_positions, prev_position=None, smoothing_factor=0.7):
+def estimate_position_with_smoothing(rms_values, mic_positions, prev_position=None, smoothing_factor=0.7, current_pos=None,
+                                     noise_threshold=0.01, frame_ratio=1.0):
     """
     带平滑处理的位置估计算法
     rms_values: np.array, shape (channels,)
     mic_positions: np.array, shape (channels, 2) - XY坐标
     prev_position: 前一个位置估计
-    smoothing_factor: 平滑因子 (0-1)，越大越平滑
+    smoothing_factor: 平滑因子 (0-1)，越大越平滑；按100ms帧整定
+    current_pos: 其他定位后端给出的当前位置，为None时使用增强算法
+    noise_threshold: 增强算法的噪声阈值
+    frame_ratio: 帧移与100ms的比值，平滑因子换算为每帧的 factor ** frame_ratio，平滑时间常数与帧移无关
     
     结合增强算法和平滑处理，确保x值在正负两侧平滑移动
     """
     # 使用增强算法计算当前位置
-    current_pos = estimate_position_enhanced(rms_values, mic_positions)
+    if current_pos is None:
+        current_pos = estimate_position_enhanced(rms_values, mic_positions, noise_threshold=noise_threshold)
     
     # 如果有前一个位置，进行平滑处理
     if prev_position is not None:
         # 对x坐标使用更强的平滑，确保平滑移动
         x_smoothing = min(smoothing_factor + 0.1, 0.9)  # x坐标使用更强的平滑
         y_smoothing = smoothing_factor  # y坐标使用正常平滑
+        if frame_ratio != 1.0:
+            x_smoothing **= frame_ratio
+            y_smoothing **= frame_ratio
         
         smoothed_pos = np.array([
             x_smoothing * prev_position[0] + (1 - x_smoothing) * current_pos[0],
@@ -245,3 +346,116 @@ def estimate_position_with_smoothing(rms_values, mic_positions, prev_position=No
         return smoothed_pos
     else:
         return current_pos
+
+
+class GCCPHATLocalizer:
+    """
+    基于到达时间差（TDOA）的定位后端
+    对所有麦克风对做批量FFT GCC-PHAT互相关，求出各麦克风的相对到达时间，
+    再用线性化最小二乘多点定位求解撞击点。FFT长度、麦克风对和几何矩阵在初始化时一次性计算。
+    """
+
+    def __init__(self, mic_positions, samplerate, frame_samples, speed_of_sound=SPEED_OF_SOUND,
+                 reference=0, noise_threshold=0.01, min_peak=0.1, grid=None):
+        """
+        Args:
+            mic_positions: np.array, shape (channels, 2) - XY坐标（厘米）
+            samplerate: 采样率
+            frame_samples: 每帧样本数
+            speed_of_sound: 声速（厘米/秒）
+            reference: 多点定位的参考麦克风索引
+            noise_threshold: RMS低于此值的通道不足2个时不做时延估计
+            min_peak: GCC-PHAT峰值的平均高度低于此值时认为结果不可信
+            grid: 可选的PositionGrid查找表，提供时用时延查表代替最小二乘求解（参考麦克风需一致）
+        """
+        self.mic_positions = np.asarray(mic_positions, dtype=float)
+        self.samplerate = samplerate
+        self.speed_of_sound = speed_of_sound
+        self.noise_threshold = noise_threshold
+        self.min_peak = min_peak
+        self.grid = grid
+        num_mics = len(self.mic_positions)
+
+        # 所有麦克风对 (i, j), i < j
+        self.pair_i, self.pair_j = np.triu_indices(num_mics, k=1)
+        pair_distances = np.linalg.norm(self.mic_positions[self.pair_i] - self.mic_positions[self.pair_j], axis=1)
+
+        # 物理上可能的最大时延（样本），只在该范围内搜索峰值
+        self.max_lag = int(np.ceil(pair_distances.max() / speed_of_sound * samplerate)) + 1
+        # 线性互相关需要 nfft >= frame_samples + max_lag，取2的幂
+        self.nfft = 1 << int(np.ceil(np.log2(frame_samples + self.max_lag)))
+        self._lag_index = np.arange(-self.max_lag, self.max_lag + 1) % self.nfft
+        self._pair_rows = np.arange(len(self.pair_i))
+
+        # 麦克风对时延 tau_ij = t_i - t_j，参考麦克风 t_ref = 0，用伪逆一次性求出各麦克风的相对到达时间
+        incidence = np.zeros((len(self.pair_i), num_mics))
+        incidence[self._pair_rows, self.pair_i] = 1.0
+        incidence[self._pair_rows, self.pair_j] = -1.0
+        self._others = np.array([i for i in range(num_mics) if i != reference])
+        self._pair_pinv = np.linalg.pinv(incidence[:, self._others])
+
+        # 多点定位线性方程: 2(p_i - p_ref)·p + 2 r_i d_ref = |p_i|^2 - |p_ref|^2 - r_i^2
+        ref_pos = self.mic_positions[reference]
+        self._geometry = 2.0 * (self.mic_positions[self._others] - ref_pos)
+        self._norm_diff = np.sum(self.mic_positions[self._others] ** 2, axis=1) - np.sum(ref_pos ** 2)
+        self._system = np.empty((len(self._others), 3))
+        self._system[:, :2] = self._geometry
+
+    def estimate_delays(self, signals):
+        """
+        批量GCC-PHAT时延估计
+        signals: np.array, shape (channels, samples)
+        返回 (tau, peak): 每个麦克风对的时延（秒）和归一化峰值高度
+        """
+        spectrum = np.fft.rfft(signals, n=self.nfft, axis=1)
+        cross = spectrum[self.pair_i] * np.conj(spectrum[self.pair_j])
+        # PHAT加权：只保留相位信息
+        cross /= np.abs(cross) + 1e-12
+        correlation = np.fft.irfft(cross, n=self.nfft, axis=1)[:, self._lag_index]
+
+        peak_index = np.argmax(correlation, axis=1)
+        peak = correlation[self._pair_rows, peak_index]
+
+        # 抛物线插值得到亚样本精度
+        left = correlation[self._pair_rows, np.maximum(peak_index - 1, 0)]
+        right = correlation[self._pair_rows, np.minimum(peak_index + 1, correlation.shape[1] - 1)]
+        denom = left - 2.0 * peak + right
+        safe_denom = np.where(denom < 0, denom, -1.0)
+        offset = np.where(denom < 0, 0.5 * (left - right) / safe_denom, 0.0)
+        lags = peak_index - self.max_lag + np.clip(offset, -0.5, 0.5)
+        return lags / self.samplerate, peak
+
+    def solve(self, tau):
+        """
+        由麦克风对时延求解声源位置（线性化最小二乘多点定位）
+        tau: np.array, shape (pairs,) - 每个麦克风对的时延（秒）
+        返回位置 np.array, shape (2,)
+        """
+        arrival = self._pair_pinv @ tau
+        if self.grid is not None:
+            return self.grid.lookup_delays(arrival)
+        range_diff = arrival * self.speed_of_sound
+        self._system[:, 2] = 2.0 * range_diff
+        rhs = self._norm_diff - range_diff ** 2
+        solution = np.linalg.lstsq(self._system, rhs, rcond=None)[0]
+        return solution[:2]
+
+    def estimate(self, signals, rms_values=None):
+        """
+        估计声源位置
+        signals: np.array, shape (channels, samples) - 定位麦克风原始信号
+        rms_values: 对应通道的RMS值，用于静音判断
+        返回位置 np.array, shape (2,)；信号太弱或结果不可信时返回None
+        """
+        if rms_values is not None and np.sum(np.asarray(rms_values) > self.noise_threshold) < 2:
+            return None
+        tau, peak = self.estimate_delays(signals)
+        if np.mean(peak) < self.min_peak:
+            return None
+        position = self.solve(tau)
+        if not np.all(np.isfinite(position)):
+            return None
+        # 限制在有效范围内（-10到127, 0-68）
+        position[0] = max(-10, min(127, position[0]))
+        position[1] = max(0, min(68, position[1]))
+        return position
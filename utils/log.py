@@ -0,0 +1,244 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import numpy as np
+from utils.config import config_section
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# 逐帧记录的格式：定长二进制记录，写入时只做字段赋值，不格式化字符串
+FRAME_DTYPE = np.dtype([
+    ('wall_time', '<f8'),           # 写入时的系统时间（秒）
+    ('frame_start_sample', '<i8'),  # 帧第一个样本在采集流中的序号
+    ('main_rms', '<f4', (6,)),      # 定位麦克风RMS（通道3-8）
+    ('goal_rms', '<f4', (2,)),      # 球门麦克风RMS（通道1-2）
+    ('mapped', 'u1', (6,)),         # 映射响度 0-127
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('osc_x', '<f4'),
+    ('osc_y', '<f4'),
+    ('goals', 'u1', (2,)),          # 进球检测 0/127
+    ('bpm', '<f4'),
+])
+FRAME_LOG_MAGIC = b"FOOSBALL-FRAMES 1\n"
+
+class RateLimitFilter(logging.Filter):
+    """
+    按消息限流：同一logger的同一条格式串每interval秒最多输出burst条，ERROR及以上不限流
+    被抑制的条数记在下一条输出的记录上（record.suppressed）
+    进球、射门等事件日志用 extra={'rate_limit': False} 标记，不限流：左右门共用一条格式串，
+    限流会把紧接着的另一个球门的事件抑制掉
+    """
+
+    def __init__(self, interval=1.0, burst=1):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # (logger名, 格式串) -> [窗口开始时间, 窗口内已输出条数, 被抑制条数]
+        self._state = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR or self.interval <= 0 or not getattr(record, 'rate_limit', True):
+            return True
+        key = (record.name, record.msg)
+        state = self._state.get(key)
+        if state is None or record.created - state[0] >= self.interval:
+            if state is not None and state[2]:
+                record.suppressed = state[2]
+            self._state[key] = [record.created, 1, 0]
+            return True
+        if state[1] < self.burst:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+class SuppressedCountFormatter(logging.Formatter):
+    """在消息后附上该消息上一个限流窗口内被抑制的条数"""
+
+    def format(self, record):
+        message = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            message += f" (已抑制{suppressed}条)"
+        return message
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    把日志记录原样放入队列，字符串格式化推迟到后台写线程
+    日志参数应为数值或不再修改的对象（不要传入会被复用的帧缓冲）
+    """
+
+    def prepare(self, record):
+        return record
+
+class LoggingService:
+    """日志后台写线程，close时把队列中剩余的记录写完"""
+
+    def __init__(self, listener, handler):
+        self.listener = listener
+        self.handler = handler
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            logging.getLogger().removeHandler(self.handler)
+
+def setup_logging(config):
+    """
+    根据配置初始化日志：调用线程只创建记录并限流，格式化和写终端/文件都在后台线程中完成
+    返回LoggingService，退出前调用close
+    """
+    log_config = config_section(config, 'logging')
+    level = getattr(logging, str(log_config.get('level', 'INFO')).upper(), logging.INFO)
+
+    formatter = SuppressedCountFormatter(LOG_FORMAT)
+    handlers = []
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+    handlers.append(console)
+    log_file = log_config.get('file')
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(log_config.get('rate_limit_interval', 1.0),
+                                      log_config.get('rate_limit_burst', 1)))
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return LoggingService(listener, handler)
+
+class NullFrameLog:
+    """关闭逐帧记录时使用的空实现，接口与FrameLog一致"""
+
+    def write(self, result):
+        pass
+
+    def close(self):
+        pass
+
+class FrameLog:
+    """
+    逐帧记录位置、RMS、进球和BPM
+    分析结果直接写入预分配的记录块（FRAME_DTYPE），块写满后交给后台线程写文件，
+    调用线程不格式化字符串、不做文件I/O。
+    binary格式为文件头 + 定长记录，用read_frame_log读取；csv格式每帧一行，便于直接查看。
+    """
+
+    def __init__(self, path, fmt=None, block_frames=256):
+        """
+        Args:
+            path: 输出文件
+            fmt: "binary" 或 "csv"，默认按扩展名判断（.csv为csv，其他为binary）
+            block_frames: 每个记录块的帧数
+        """
+        if fmt is None:
+            fmt = 'csv' if path.lower().endswith('.csv') else 'binary'
+        if fmt not in ('binary', 'csv'):
+            raise ValueError(f"未知的逐帧记录格式: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.block_frames = block_frames
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, 'wb')
+        if fmt == 'binary':
+            self._file.write(FRAME_LOG_MAGIC)
+            self._file.write(json.dumps(FRAME_DTYPE.descr).encode() + b"\n")
+        else:
+            columns = _csv_columns()
+            self._file.write((",".join(columns) + "\n").encode())
+            # 时间保留微秒，样本序号为整数，其余6位有效数字
+            self._csv_formats = ['%.6f', '%d'] + ['%.6g'] * (len(columns) - 2)
+        # 第i条记录在binary文件中的偏移为 header_bytes + i * FRAME_DTYPE.itemsize
+        self.header_bytes = self._file.tell()
+
+        self._free_blocks = queue.SimpleQueue()
+        self._full_blocks = queue.SimpleQueue()
+        self._block = np.zeros(block_frames, dtype=FRAME_DTYPE)
+        self._index = 0
+        self._writer = threading.Thread(target=self._write_loop, name="frame-log", daemon=True)
+        self._writer.start()
+
+    def write(self, result):
+        """记录一帧分析结果（整条记录一次赋值，字段顺序与FRAME_DTYPE一致）"""
+        raw_pos = result['raw_pos']
+        osc_x, osc_y = result['osc_pos']
+        i = self._index
+        self._block[i] = (time.time(), result.get('frame_start_sample', -1), result['main_rms'][:6],
+                          result['goal_rms'][:2], result['mapped_channels'][:6], raw_pos[0], raw_pos[1],
+                          osc_x, osc_y, result['goal_detection'][:2], result['bpm'])
+        self._index = i + 1
+        if self._index == self.block_frames:
+            self._swap_block()
+
+    def _swap_block(self):
+        self._full_blocks.put((self._block, self._index))
+        try:
+            self._block = self._free_blocks.get_nowait()
+        except queue.Empty:
+            self._block = np.zeros(self.block_frames, dtype=FRAME_DTYPE)
+        self._index = 0
+
+    def _write_loop(self):
+        from numpy.lib import recfunctions
+        while True:
+            item = self._full_blocks.get()
+            if item is None:
+                break
+            block, count = item
+            if self.fmt == 'binary':
+                block[:count].tofile(self._file)
+            else:
+                np.savetxt(self._file, recfunctions.structured_to_unstructured(block[:count], dtype=np.float64),
+                           fmt=self._csv_formats, delimiter=',')
+            self._free_blocks.put(block)
+
+    def close(self):
+        """写出未满的记录块并关闭文件"""
+        if self._file is None:
+            return
+        if self._index:
+            self._full_blocks.put((self._block, self._index))
+        self._full_blocks.put(None)
+        self._writer.join()
+        self._file.close()
+        self._file = None
+
+def _csv_columns():
+    columns = []
+    for name in FRAME_DTYPE.names:
+        shape = FRAME_DTYPE[name].shape
+        if shape:
+            columns += [f"{name}_{i + 1}" for i in range(shape[0])]
+        else:
+            columns.append(name)
+    return columns
+
+def read_frame_log(path):
+    """读取binary格式的逐帧记录，返回FRAME_DTYPE结构化数组"""
+    with open(path, 'rb') as f:
+        if f.readline() != FRAME_LOG_MAGIC:
+            raise ValueError(f"不是逐帧记录文件: {path}")
+        descr = json.loads(f.readline())
+        dtype = np.dtype([tuple(tuple(v) if isinstance(v, list) else v for v in field) for field in descr])
+        return np.fromfile(f, dtype=dtype)
+
+def create_frame_log(config):
+    """根据配置创建逐帧记录，未配置时返回NullFrameLog"""
+    log_config = config_section(config, 'logging')
+    path = log_config.get('frame_log')
+    if not path:
+        return NullFrameLog()
+    return FrameLog(path, fmt=log_config.get('frame_log_format'))
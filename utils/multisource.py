@@ -0,0 +1,222 @@
+import numpy as np
+from utils.position_grid import TABLE_HEIGHT, TABLE_WIDTH
+
+def _fit(atoms, target):
+    """最小二乘幅度：atoms为 (麦克风数, 声源数)，声源数很小，直接解正规方程"""
+    return np.linalg.solve(atoms.T @ atoms, atoms.T @ target)
+
+class MultiSourceLocalizer:
+    """
+    多声源定位
+    不相干声源的能量在每个麦克风上线性叠加：能量 e_m = Σ_k a_k / (d_mk + distance_offset)^2。
+    在桌面上预先计算粗、细两级网格上每个格点的各麦克风能量分布（字典），每帧把6个定位麦克风的能量
+    分解为最多max_sources个格点声源（稀疏非负分解）：
+      1. 粗网格上穷举所有单个格点和相距至少min_separation的格点对，每对的幅度由2x2最小二乘闭式求解，
+         全部候选一次向量化计算；max_sources大于2时在最优格点对的基础上逐个贪心加入格点
+      2. 每个声源固定其他声源，在所在粗格点周围的细网格邻域内重新定位
+    拟合按各麦克风的相对误差加权，避免离声源最近的麦克风主导结果。多一个声源至少要把相对残差降低
+    min_improvement才被接受。每帧的计算量只由网格大小和max_sources决定，与信号内容无关。
+    """
+
+    def __init__(self, mic_positions, max_sources=2, resolution=10.0, refine_resolution=2.0,
+                 distance_offset=10.0, min_improvement=0.05, min_separation=30.0, noise_threshold=0.01):
+        """
+        Args:
+            mic_positions: np.array, shape (channels, 2) - XY坐标（厘米）
+            max_sources: 每帧最多分解出的声源数
+            resolution: 粗网格分辨率（厘米），决定每帧的计算量
+            refine_resolution: 细网格分辨率（厘米）
+            distance_offset: 响度模型中的距离偏置，与PositionGrid一致
+            min_improvement: 多一个声源至少要降低的相对残差（0-1）
+            min_separation: 声源之间的最小距离（厘米），避免一个声源被拆成相邻的两个格点
+            noise_threshold: 各麦克风的噪声RMS，其能量从观测中扣除
+        """
+        if max_sources < 1:
+            raise ValueError("max_sources必须至少为1")
+        self.mic_positions = np.asarray(mic_positions, dtype=float)
+        self.max_sources = int(max_sources)
+        self.resolution = resolution
+        self.distance_offset = distance_offset
+        self.min_improvement = min_improvement
+        self.min_separation = min_separation
+        self.noise_threshold = noise_threshold
+
+        # 粗网格字典：每个格点单位幅度声源在各麦克风上的能量
+        self.positions, self.atoms, _ = self._grid(resolution)
+        # 细网格字典和格点索引，用于粗格点周围的局部搜索
+        self.fine_positions, self.fine_atoms, self._fine_index = self._grid(refine_resolution)
+        self._fine_span = max(1, int(np.ceil(resolution / refine_resolution)))
+        self._fine_resolution = refine_resolution
+
+        # 相距至少min_separation的粗格点对
+        first, second = np.triu_indices(len(self.positions), k=1)
+        separation = np.linalg.norm(self.positions[first] - self.positions[second], axis=1)
+        keep = separation >= min_separation
+        self._pair_first = first[keep]
+        self._pair_second = second[keep]
+        # 格点对在Gram矩阵中的展平下标，每帧用一次take取出交叉项
+        self._pair_flat = self._pair_first * len(self.positions) + self._pair_second
+
+    def _grid(self, resolution):
+        xs = np.arange(0.0, TABLE_WIDTH + 1e-9, resolution)
+        ys = np.arange(0.0, TABLE_HEIGHT + 1e-9, resolution)
+        gx, gy = np.meshgrid(xs, ys, indexing='ij')
+        positions = np.stack([gx.ravel(), gy.ravel()], axis=1)
+        distances = np.linalg.norm(positions[:, None, :] - self.mic_positions[None, :, :], axis=2)
+        atoms = 1.0 / (distances + self.distance_offset) ** 2
+        return positions, atoms, np.arange(len(positions)).reshape(len(xs), len(ys))
+
+    def _fine_window(self, position):
+        """细网格上以position为中心、半径为一个粗格的邻域索引"""
+        ix = int(round(position[0] / self._fine_resolution))
+        iy = int(round(position[1] / self._fine_resolution))
+        span = self._fine_span
+        return self._fine_index[max(0, ix - span):ix + span + 1, max(0, iy - span):iy + span + 1].ravel()
+
+    def decompose(self, rms_values):
+        """
+        把一帧的定位麦克风RMS分解为多个声源
+        rms_values: np.array, shape (channels,)
+        返回 np.array, shape (k, 3)，每行为 [x, y, 能量占比]，按能量从大到小排列；有效信号不足2个时k为0
+        """
+        energy = np.square(np.asarray(rms_values, dtype=float)) - self.noise_threshold ** 2
+        np.maximum(energy, 0.0, out=energy)
+        if np.count_nonzero(energy) < 2:
+            return np.empty((0, 3))
+        # 按相对误差加权：加权后的观测为全1（低于噪声的麦克风按峰值的千分之一计）
+        weights = 1.0 / np.maximum(energy, 1e-3 * energy.max())
+        target = energy * weights
+        total = float(target @ target)
+
+        weighted = self.atoms * weights
+        projections = weighted @ target
+        diagonal = np.einsum('ij,ij->i', weighted, weighted)
+
+        # 单个声源：解释的能量为 b_i^2 / G_ii
+        single_gain = projections * projections / diagonal
+        best = int(np.argmax(single_gain))
+        selected = [best]
+        explained = single_gain[best]
+
+        if self.max_sources >= 2 and len(self._pair_first) > 0:
+            # 格点对：2x2正规方程闭式求解（格点相距足够远，行列式为正），两个幅度都为正的才有效
+            i, j = self._pair_first, self._pair_second
+            gram = weighted @ weighted.T
+            gii, gjj, gij = diagonal.take(i), diagonal.take(j), gram.take(self._pair_flat)
+            bi, bj = projections.take(i), projections.take(j)
+            det = gii * gjj - gij * gij
+            ai = gjj * bi - gij * bj
+            aj = gii * bj - gij * bi
+            pair_gain = (ai * bi + aj * bj) / det
+            pair_gain[(ai <= 0.0) | (aj <= 0.0)] = 0.0
+            best_pair = int(np.argmax(pair_gain))
+            if pair_gain[best_pair] - explained >= self.min_improvement * total:
+                selected = [int(i[best_pair]), int(j[best_pair])]
+                explained = pair_gain[best_pair]
+
+        # 更多声源：逐个加入对剩余误差贡献最大的格点
+        while 2 <= len(selected) < self.max_sources:
+            chosen = weighted[selected].T
+            residual = target - chosen @ _fit(chosen, target)
+            basis, _ = np.linalg.qr(chosen)
+            candidates = weighted - (weighted @ basis) @ basis.T
+            norms = np.einsum('ij,ij->i', candidates, candidates)
+            correlation = candidates @ residual
+            separation = np.min(np.linalg.norm(
+                self.positions[:, None, :] - self.positions[selected][None, :, :], axis=2), axis=1)
+            gain = np.where((correlation > 0.0) & (norms > 1e-12) & (separation >= self.min_separation),
+                            correlation * correlation / np.maximum(norms, 1e-12), 0.0)
+            candidate = int(np.argmax(gain))
+            if gain[candidate] < self.min_improvement * total:
+                break
+            trial = selected + [candidate]
+            if np.any(_fit(weighted[trial].T, target) <= 0.0):
+                break
+            selected = trial
+
+        # 细网格局部搜索：固定其他声源，每个声源在粗格点邻域内重新定位
+        positions = self.positions[selected].copy()
+        atoms = self.atoms[selected] * weights
+        fit = _fit(atoms.T, target)
+        fitted = atoms.T @ fit
+        for k in range(len(selected)):
+            # 其他声源解释之后剩下的观测
+            others = target - fitted + atoms[k] * fit[k]
+            window = self._fine_window(positions[k])
+            candidates = self.fine_atoms[window] * weights
+            correlation = candidates @ others
+            gain = np.where(correlation > 0.0,
+                            correlation * correlation / np.einsum('ij,ij->i', candidates, candidates), 0.0)
+            best = int(np.argmax(gain))
+            positions[k] = self.fine_positions[window[best]]
+            atoms[k] = candidates[best]
+        refined = _fit(atoms.T, target)
+        if np.all(refined > 0.0):
+            fit = refined
+        fit = np.maximum(fit, 0.0)
+
+        # 能量占比：各声源在所有麦克风上贡献的（未加权）能量之比
+        shares = fit * (atoms / weights).sum(axis=1)
+        if shares.sum() <= 0.0:
+            return np.empty((0, 3))
+        shares /= shares.sum()
+        order = np.argsort(-shares)
+        sources = np.empty((len(selected), 3))
+        sources[:, :2] = positions[order]
+        sources[:, 2] = shares[order]
+        return sources
+
+class SourceSlots:
+    """
+    为分解出的声源分配稳定的编号
+    每帧把声源按最近距离分配给上一帧的编号，使同一个声源在连续帧中使用同一个OSC source，
+    不会因为能量排序变化而在两个source之间来回跳动。
+    """
+
+    def __init__(self, count, first_id=2, max_distance=40.0):
+        """
+        Args:
+            count: 编号数（等于max_sources）
+            first_id: 第一个编号对应的OSC source序号（/source/1 默认保留给主位置）
+            max_distance: 与上一帧位置相距超过该距离（厘米）的声源视为新声源
+        """
+        self.count = count
+        self.first_id = first_id
+        self.max_distance = max_distance
+        self.positions = [None] * count
+
+    def assign(self, sources):
+        """
+        sources: decompose的返回值
+        返回本帧各声源的 (source序号, x, y, 能量占比) 列表，按source序号排列
+        """
+        slots = [None] * self.count
+        free = list(range(self.count))
+        pending = []
+        # 先按能量顺序匹配上一帧附近的编号
+        for source in sources:
+            best, best_distance = None, self.max_distance
+            for slot in free:
+                previous = self.positions[slot]
+                if previous is None:
+                    continue
+                distance = np.hypot(source[0] - previous[0], source[1] - previous[1])
+                if distance <= best_distance:
+                    best, best_distance = slot, distance
+            if best is None:
+                pending.append(source)
+            else:
+                slots[best] = source
+                free.remove(best)
+        # 新声源使用空闲的编号，优先使用上一帧没有声源的编号
+        free.sort(key=lambda slot: self.positions[slot] is not None)
+        for source, slot in zip(pending, free):
+            slots[slot] = source
+        assigned = []
+        for slot, source in enumerate(slots):
+            if source is None:
+                self.positions[slot] = None
+            else:
+                self.positions[slot] = source[:2].copy()
+                assigned.append((self.first_id + slot, float(source[0]), float(source[1]), float(source[2])))
+        return assigned
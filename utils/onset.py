@@ -0,0 +1,119 @@
+import logging
+import numpy as np
+from utils.kernels import NUMPY_KERNELS
+
+log = logging.getLogger(__name__)
+
+class TransientGoalDetector:
+    """
+    基于原始样本的流式起音进球检测
+    对球门麦克风的新样本计算短窗能量（按窗长抽取的能量包络），与缓慢跟踪的背景能量比较，
+    超过阈值时在该窗内找到第一个超过幅度阈值的样本，给出撞击的精确样本序号。
+    不足一个窗的尾部样本保留到下一块，块边界不会漏检。
+    """
+
+    def __init__(self, samplerate, window_duration=0.001, onset_ratio=8.0, min_level=0.3,
+                 background_duration=0.5, cooldown_duration=3.0, num_goals=2, kernels=None):
+        """
+        Args:
+            samplerate: 采样率
+            window_duration: 能量包络的短窗长度（秒），也是包络的抽取间隔
+            onset_ratio: 短窗能量超过背景能量的倍数阈值
+            min_level: 最小触发幅度（RMS），与GoalDetector的goal_threshold含义一致
+            background_duration: 背景能量跟踪的时间常数（秒）
+            cooldown_duration: 同一球门两次进球之间的冷却时间（秒）
+            num_goals: 球门数量，通道1是左门，通道2是右门
+            kernels: 计算短窗能量包络的内核后端（utils.kernels），默认NumPy
+        """
+        self.samplerate = samplerate
+        self.window = max(1, int(samplerate * window_duration))
+        self.onset_ratio = onset_ratio
+        self.min_level = min_level
+        self.background_duration = background_duration
+        self.cooldown_samples = int(samplerate * cooldown_duration)
+        self.num_goals = num_goals
+        self.kernels = kernels if kernels is not None else NUMPY_KERNELS
+
+        # 上一块不足一个窗的尾部样本
+        self._carry = np.zeros((num_goals, self.window), dtype=np.float32)
+        self._carry_length = 0
+        # 下一块第一个样本应有的序号，不连续时（采集overrun、流水线丢帧）丢弃尾部样本
+        self._next_sample = None
+        # 工作缓冲：尾部样本 + 新样本，按需扩容
+        self._work = np.zeros((num_goals, 0), dtype=np.float32)
+        self._background = None
+        # 每个球门冷却结束的样本序号
+        self._cooldown_until = np.zeros(num_goals, dtype=np.int64)
+        # 最近一次update检测到的事件: [(球门索引, 样本序号, 流时间秒)]
+        self.last_events = []
+
+    def reset(self):
+        self._carry_length = 0
+        self._next_sample = None
+        self._background = None
+        self._cooldown_until.fill(0)
+        self.last_events = []
+
+    def update(self, samples, start_sample):
+        """
+        处理新到达的样本
+        samples: np.array, shape (num_goals, n) - 只包含新样本（重叠帧时为最后hop个样本）
+        start_sample: samples第一个样本在采集流中的序号
+        返回: [左球门进球(0/127), 右球门进球(0/127)]，事件详情见last_events
+        """
+        goals = [0] * self.num_goals
+        self.last_events = []
+        carry_length = self._carry_length
+        if carry_length and start_sample != self._next_sample:
+            # 与上一块不相邻：尾部样本不能与新样本拼成一个窗，从新样本开始重新分窗
+            log.debug("起音检测输入不连续: 期望样本 %d, 实际 %d", self._next_sample, start_sample)
+            carry_length = 0
+        self._next_sample = start_sample + samples.shape[1]
+        total = carry_length + samples.shape[1]
+        if self._work.shape[1] < total:
+            self._work = np.zeros((self.num_goals, total), dtype=np.float32)
+        work = self._work
+        work[:, :carry_length] = self._carry[:, :carry_length]
+        work[:, carry_length:total] = samples[:self.num_goals]
+        base_sample = start_sample - carry_length
+
+        num_windows = total // self.window
+        used = num_windows * self.window
+        # 剩余不足一个窗的样本留到下一块
+        self._carry_length = total - used
+        self._carry[:, :self._carry_length] = work[:, used:total]
+        if num_windows == 0:
+            return goals
+
+        # 短窗能量包络 (num_goals, num_windows)
+        blocks = work[:, :used].reshape(self.num_goals, num_windows, self.window)
+        energy = np.empty((self.num_goals, num_windows))
+        self.kernels.window_energies(work, num_windows, self.window, energy)
+
+        if self._background is None:
+            self._background = np.median(energy, axis=1).astype(np.float64)
+        threshold = np.maximum(self._background * self.onset_ratio, self.min_level ** 2)
+
+        # 冷却期内的窗不参与检测
+        window_starts = base_sample + np.arange(num_windows) * self.window
+        exceeded = (energy > threshold[:, None]) & (window_starts[None, :] >= self._cooldown_until[:, None])
+
+        for goal in np.flatnonzero(exceeded.any(axis=1)):
+            first_window = int(np.argmax(exceeded[goal]))
+            segment = np.abs(blocks[goal, first_window])
+            above = segment > np.sqrt(threshold[goal])
+            offset = int(np.argmax(above)) if above.any() else int(np.argmax(segment))
+            impact_sample = int(window_starts[first_window]) + offset
+            self._cooldown_until[goal] = impact_sample + self.cooldown_samples
+            goals[goal] = 127
+            self.last_events.append((int(goal), impact_sample, impact_sample / self.samplerate))
+            side = "左门" if goal == 0 else "右门"
+            log.info("%s进球检测! 撞击样本: %d, 时间: %.4fs, 短窗能量: %.4f, 背景能量: %.5f",
+                     side, impact_sample, impact_sample / self.samplerate, energy[goal, first_window],
+                     self._background[goal], extra={'rate_limit': False})
+
+        # 用未触发的窗更新背景能量（指数平滑，时间常数background_duration）
+        alpha = min(1.0, used / (self.samplerate * self.background_duration))
+        quiet_energy = np.where(exceeded, self._background[:, None], energy).mean(axis=1)
+        self._background += alpha * (quiet_energy - self._background)
+        return goals
@@ -1,14 +1,46 @@
-from pythonosc.udp_client import SimpleUDPClient
+import collections
+import logging
+import queue
+import socket
+import struct
+import threading
+import time
+from utils.config import as_runtime_config
+
+log = logging.getLogger(__name__)
 
 class OSCSender:
     def __init__(self, ip="127.0.0.1", port=11111, position_ip="127.0.0.1", position_port=11115):
+        # bundle模式不需要python-osc，只在使用simple模式时导入
+        from pythonosc.udp_client import SimpleUDPClient
+        from pythonosc.osc_message_builder import OscMessageBuilder
+        self._message_builder = OscMessageBuilder
         self.client = SimpleUDPClient(ip, port)
         self.position_client = SimpleUDPClient(position_ip, position_port)
+        # 上一次send_sources发送过位置的多声源序号
+        self._active_sources = set()
 
-    def send_position(self, x, y):
-        """发送位置估计到独立端口 - Spat Revolution格式"""
+    def send_position(self, x, y, source_id=1):
+        """发送位置估计到独立端口 - Spat Revolution格式，多声源时每个声源使用自己的source序号"""
         # 直接使用传入的坐标值，假设已经是-1到1范围
-        self.position_client.send_message(f"/source/{1}/xyz", [float(x), float(y), 0.0])
+        self.position_client.send_message(f"/source/{source_id}/xyz", [float(x), float(y), 0.0])
+
+    def send_sources(self, sources):
+        """
+        发送多声源位置，每个声源发送到自己的 /source/N/xyz
+        Spat Revolution在收不到新位置时保持最后的位置，因此上一次发送过、本次消失的声源发送 /source/N/mute 1，
+        重新出现时先发送 /source/N/mute 0
+        :param sources: [(source序号, x, y), ...]
+        """
+        active = set()
+        for source_id, x, y in sources:
+            if source_id not in self._active_sources:
+                self.position_client.send_message(f"/source/{source_id}/mute", 0)
+            self.send_position(x, y, source_id)
+            active.add(source_id)
+        for source_id in sorted(self._active_sources - active):
+            self.position_client.send_message(f"/source/{source_id}/mute", 1)
+        self._active_sources = active
 
     def send_full_status(self, rms_values, x, y, goal_detection, bpm):
         """
@@ -21,3 +53,276 @@ class OSCSender:
         """
         msg = list(map(float, rms_values)) + [float(x), float(y)] + list(map(float, goal_detection)) + [float(bpm)]
         self.client.send_message("/foosball_status", msg)
+
+    def send_goal_event(self, goal_index, stream_time, sample_index, address="/foosball_goal"):
+        """
+        发送带时间戳的进球事件到主状态端口
+        :param goal_index: 0为左门（蓝方球门），1为右门（红方球门）
+        :param stream_time: 撞击时刻，相对采集开始的秒数（样本精度）
+        :param sample_index: 撞击样本在采集流中的序号
+        """
+        # 时间以float64、样本序号以int64发送：float32在运行一小时后精度已低于0.2毫秒
+        builder = self._message_builder(address)
+        builder.add_arg(int(goal_index), builder.ARG_TYPE_INT)
+        builder.add_arg(float(stream_time), builder.ARG_TYPE_DOUBLE)
+        builder.add_arg(int(sample_index), builder.ARG_TYPE_INT64)
+        self.client.send(builder.build())
+
+    def send_ball(self, speed, direction, address="/foosball_ball"):
+        """
+        发送球速和运动方向到主状态端口
+        :param speed: 球速（厘米/秒）
+        :param direction: 运动方向（度，0为朝右门，90为朝上边）
+        """
+        self.client.send_message(address, [float(speed), float(direction)])
+
+    def send_shot_event(self, event, goal_index, speed, stream_time, address="/foosball_shot"):
+        """
+        发送射门事件到主状态端口
+        :param event: 0为射门，1为射门后检测到进球
+        :param goal_index: 射向的球门，0为左门，1为右门
+        :param speed: 射门速度（厘米/秒）
+        :param stream_time: 事件时刻，相对采集开始的秒数（float64，与进球事件相同）
+        """
+        builder = self._message_builder(address)
+        builder.add_arg(int(event), builder.ARG_TYPE_INT)
+        builder.add_arg(int(goal_index), builder.ARG_TYPE_INT)
+        builder.add_arg(float(speed), builder.ARG_TYPE_FLOAT)
+        builder.add_arg(float(stream_time), builder.ARG_TYPE_DOUBLE)
+        self.client.send(builder.build())
+
+    def send_stats(self, summary, address="/foosball_stats"):
+        """
+        发送热路径耗时统计到主状态端口
+        每个阶段发送 {address}/{阶段名} [p50, p95, p99, max]（毫秒），
+        以及 {address}/frames [总帧数, overrun次数, 帧率]
+        """
+        for stage, values in summary['stages'].items():
+            self.client.send_message(f"{address}/{stage}",
+                                     [values['p50'], values['p95'], values['p99'], values['max']])
+        self.client.send_message(f"{address}/frames",
+                                 [float(summary['frames']), float(summary['overruns']), float(summary['fps'])])
+
+    def flush(self):
+        """逐条发送模式下消息已立即发出，无需刷新"""
+        pass
+
+    def close(self):
+        pass
+
+# OSC类型标签对应的struct格式：f为float32，i为int32，h为int64，d为float64
+OSC_STRUCT_TYPES = {'f': 'f', 'i': 'i', 'h': 'q', 'd': 'd'}
+
+# NTP时间（1900年起）与Unix时间（1970年起）之差（秒）
+NTP_EPOCH_OFFSET = 2208988800
+
+def _osc_string(text):
+    """编码OSC字符串：以0结尾并补齐到4字节"""
+    data = text.encode() + b"\0"
+    return data + b"\0" * (-len(data) % 4)
+
+def ntp_timetag(unix_time):
+    """Unix时间转换为64位OSC时间标签"""
+    seconds = unix_time + NTP_EPOCH_OFFSET
+    whole = int(seconds)
+    return (whole << 32) | int((seconds - whole) * 4294967296.0)
+
+class OSCMessageTemplate:
+    """
+    预编码的OSC消息：地址和类型标签只编码一次，参数通过预编译的struct直接写入缓冲
+    """
+
+    def __init__(self, address, typetags):
+        """
+        Args:
+            address: OSC地址
+            typetags: 参数类型，例如 "fff"（支持f/i/h/d）
+        """
+        self.address = address
+        self.header = _osc_string(address) + _osc_string("," + typetags)
+        self._args = struct.Struct(">" + "".join(OSC_STRUCT_TYPES[tag] for tag in typetags))
+        self.size = len(self.header) + self._args.size
+
+    def pack_into(self, buffer, offset, *values):
+        """把消息写入buffer的offset处，返回写入后的偏移；参数超出类型范围时抛出struct.error"""
+        end = offset + len(self.header)
+        self._args.pack_into(buffer, end, *values)
+        buffer[offset:end] = self.header
+        return end + self._args.size
+
+class _BundleBuilder:
+    """单个目标地址的OSC bundle，在复用的bytearray中逐条追加消息"""
+
+    _BUNDLE_HEADER = _osc_string("#bundle")
+    _TIMETAG = struct.Struct(">Q")
+    _SIZE = struct.Struct(">i")
+
+    def __init__(self, sender, destination):
+        self.sender = sender
+        self.destination = destination
+        self.buffer = None
+        self.offset = 0
+        self.count = 0
+
+    def add(self, template, *values):
+        needed = self._SIZE.size + template.size
+        if self.buffer is not None and self.offset + needed > len(self.buffer):
+            self.flush()
+        if self.buffer is None:
+            self.buffer = self.sender._acquire_buffer()
+            if self.buffer is None:
+                # 发送线程积压、缓冲池耗尽时直接丢弃，不阻塞分析
+                self.sender.dropped += 1
+                return
+            self.buffer[:len(self._BUNDLE_HEADER)] = self._BUNDLE_HEADER
+            self.offset = len(self._BUNDLE_HEADER) + self._TIMETAG.size
+            self.count = 0
+        try:
+            end = template.pack_into(self.buffer, self.offset + self._SIZE.size, *values)
+        except struct.error as e:
+            # 参数无法编码时只丢弃这一条消息：偏移不前移，bundle中已有的消息不受影响
+            self.sender.dropped += 1
+            log.warning("OSC消息 %s 编码失败，已丢弃: %s", template.address, e)
+            return
+        self._SIZE.pack_into(self.buffer, self.offset, template.size)
+        self.offset = end
+        self.count += 1
+
+    def flush(self, timetag=None):
+        if self.buffer is None:
+            return
+        self._TIMETAG.pack_into(self.buffer, len(self._BUNDLE_HEADER),
+                                ntp_timetag(time.time()) if timetag is None else timetag)
+        self.sender._enqueue(self.buffer, self.offset, self.destination)
+        self.buffer = None
+        self.offset = 0
+        self.count = 0
+
+class BundledOSCSender:
+    """
+    批量、非阻塞的OSC发送器，接口与OSCSender一致
+    地址和类型标签预先编码，参数写入缓冲池中复用的bytearray；同一帧发往同一端口的消息
+    合并为一个带时间标签的OSC bundle，调用flush后交给后台线程发送，分析线程不做socket调用。
+    """
+
+    def __init__(self, ip="127.0.0.1", port=11111, position_ip="127.0.0.1", position_port=11115,
+                 pool_size=32, buffer_size=1472):
+        """
+        Args:
+            ip, port: 主状态端口
+            position_ip, position_port: 位置估计端口
+            pool_size: 发送缓冲池大小，耗尽时丢弃新消息
+            buffer_size: 单个bundle的最大字节数（默认不超过以太网MTU下的UDP负载）
+        """
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._free_buffers = collections.deque(bytearray(buffer_size) for _ in range(pool_size))
+        self._send_queue = queue.SimpleQueue()
+        self._templates = {}
+        # 缓冲池耗尽而丢弃的消息数
+        self.dropped = 0
+
+        self._status = self._template("/foosball_status", "f" * 11)
+        self._position = self._template("/source/1/xyz", "fff")
+        self._main_bundle = _BundleBuilder(self, (ip, port))
+        # 上一次send_sources发送过位置的多声源序号
+        self._active_sources = set()
+        self._position_bundle = _BundleBuilder(self, (position_ip, position_port))
+
+        self._thread = threading.Thread(target=self._send_loop, name="osc-sender", daemon=True)
+        self._thread.start()
+
+    def _template(self, address, typetags):
+        key = (address, typetags)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = OSCMessageTemplate(address, typetags)
+        return template
+
+    def _acquire_buffer(self):
+        try:
+            return self._free_buffers.popleft()
+        except IndexError:
+            return None
+
+    def _enqueue(self, buffer, length, destination):
+        self._send_queue.put((buffer, length, destination))
+
+    def _send_loop(self):
+        while True:
+            item = self._send_queue.get()
+            if item is None:
+                break
+            buffer, length, destination = item
+            try:
+                self._socket.sendto(memoryview(buffer)[:length], destination)
+            except OSError:
+                # 接收端未启动等错误不影响后续发送
+                pass
+            self._free_buffers.append(buffer)
+
+    def send_position(self, x, y, source_id=1):
+        """发送位置估计到独立端口 - Spat Revolution格式"""
+        template = self._position if source_id == 1 else self._template(f"/source/{source_id}/xyz", "fff")
+        self._position_bundle.add(template, x, y, 0.0)
+
+    def send_sources(self, sources):
+        """发送多声源位置 [(source序号, x, y), ...]；消失的声源发送 /source/N/mute 1，重新出现时发送 /source/N/mute 0"""
+        active = set()
+        for source_id, x, y in sources:
+            if source_id not in self._active_sources:
+                self._position_bundle.add(self._template(f"/source/{source_id}/mute", "i"), 0)
+            self.send_position(x, y, source_id)
+            active.add(source_id)
+        for source_id in sorted(self._active_sources - active):
+            self._position_bundle.add(self._template(f"/source/{source_id}/mute", "i"), 1)
+        self._active_sources = active
+
+    def send_full_status(self, rms_values, x, y, goal_detection, bpm):
+        """发送6个通道响度、定位x, y值、进球检测和BPM，OSC地址为/foosball_status"""
+        self._main_bundle.add(self._status, *rms_values[:6], x, y, *goal_detection[:2], bpm)
+
+    def send_goal_event(self, goal_index, stream_time, sample_index, address="/foosball_goal"):
+        """发送带时间戳的进球事件到主状态端口：时间为float64，样本序号为int64，长时间运行也不溢出或丢失精度"""
+        self._main_bundle.add(self._template(address, "idh"), int(goal_index), stream_time, int(sample_index))
+
+    def send_ball(self, speed, direction, address="/foosball_ball"):
+        """发送球速和运动方向到主状态端口"""
+        self._main_bundle.add(self._template(address, "ff"), speed, direction)
+
+    def send_shot_event(self, event, goal_index, speed, stream_time, address="/foosball_shot"):
+        """发送射门事件到主状态端口：事件时间为float64，与进球事件相同"""
+        self._main_bundle.add(self._template(address, "iifd"), int(event), int(goal_index), speed, stream_time)
+
+    def send_stats(self, summary, address="/foosball_stats"):
+        """发送热路径耗时统计到主状态端口，格式与OSCSender.send_stats相同"""
+        for stage, values in summary['stages'].items():
+            self._main_bundle.add(self._template(f"{address}/{stage}", "ffff"),
+                                  values['p50'], values['p95'], values['p99'], values['max'])
+        self._main_bundle.add(self._template(f"{address}/frames", "fff"),
+                              summary['frames'], summary['overruns'], summary['fps'])
+
+    def flush(self, timetag=None):
+        """
+        把本帧累积的消息按目标端口打包成bundle交给发送线程
+        timetag: OSC时间标签，默认使用当前时间
+        """
+        self._main_bundle.flush(timetag)
+        self._position_bundle.flush(timetag)
+
+    def close(self):
+        self.flush()
+        self._send_queue.put(None)
+        self._thread.join(1.0)
+        self._socket.close()
+
+def create_osc_sender(config):
+    """根据配置创建OSC发送器：simple为逐条发送，bundle为批量非阻塞发送"""
+    runtime = as_runtime_config(config)
+    mode = runtime.osc_mode
+    kwargs = dict(ip=runtime.osc_target.ip, port=runtime.osc_target.port,
+                  position_ip=runtime.position_target.ip, position_port=runtime.position_target.port)
+    if mode == 'bundle':
+        return BundledOSCSender(**kwargs)
+    if mode != 'simple':
+        raise ValueError(f"未知的OSC输出模式: {mode}")
+    return OSCSender(**kwargs)
@@ -0,0 +1,162 @@
+import collections
+import threading
+import time
+import numpy as np
+
+class DropOldestQueue:
+    """
+    有界队列：队列满时丢弃最旧的元素，保证端到端延迟有上限
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        # 因队列已满而被丢弃的元素数
+        self.dropped = 0
+
+    def put(self, item):
+        """放入元素，返回被丢弃的最旧元素（没有丢弃时返回None）"""
+        dropped_item = None
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                dropped_item = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        return dropped_item
+
+    def get(self, timeout=None):
+        """取出最旧的元素，超时返回None"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+                if not self._items:
+                    return None
+            return self._items.popleft()
+
+    def qsize(self):
+        return len(self._items)
+
+class Pipeline:
+    """
+    多线程流水线运行时：采集 -> 分析 -> 输出
+    三个阶段各自运行在独立线程中，阶段之间用有界的DropOldestQueue连接，
+    分析跟不上时丢弃最旧的帧，慢速阶段不会阻塞音频采集。
+    """
+
+    def __init__(self, audio_stream, processor, output, capture_queue_size=4, output_queue_size=8):
+        """
+        Args:
+            audio_stream: AudioStream实例
+            processor: FrameProcessor实例
+            output: 输出回调 output(result)，在输出线程中调用
+            capture_queue_size: 采集->分析队列长度
+            output_queue_size: 分析->输出队列长度
+        """
+        self.audio_stream = audio_stream
+        self.processor = processor
+        self.output = output
+        self.capture_queue = DropOldestQueue(capture_queue_size)
+        self.output_queue = DropOldestQueue(output_queue_size)
+
+        # stream模式下get_audio_chunk返回复用缓冲，采集线程需要拷贝到独立的帧缓冲中
+        # 帧缓冲池大小 = 队列长度 + 采集线程1个 + 分析线程1个，正常运行时不会耗尽
+        self._free_frames = collections.deque()
+        self._pool_size = capture_queue_size + 2
+
+        self._stop_event = threading.Event()
+        self._threads = []
+        # 各阶段线程中出现的异常
+        self.error = None
+
+    def queue_depths(self):
+        """各阶段队列当前深度"""
+        return {'capture': self.capture_queue.qsize(), 'output': self.output_queue.qsize()}
+
+    def dropped_counts(self):
+        """各阶段队列因过载丢弃的元素数"""
+        return {'capture': self.capture_queue.dropped, 'output': self.output_queue.dropped}
+
+    def _acquire_frame(self, chunk):
+        if self._free_frames:
+            frame = self._free_frames.popleft()
+            if frame.shape == chunk.shape:
+                return frame
+        return np.empty(chunk.shape, dtype=np.float32)
+
+    def _capture_loop(self):
+        stats = self.processor.stats
+        while not self._stop_event.is_set():
+            t_capture = time.perf_counter()
+            chunk = self.audio_stream.get_audio_chunk()
+            stats.record('capture', time.perf_counter() - t_capture)
+            frame = self._acquire_frame(chunk)
+            frame[:] = chunk
+            item = (frame, self.audio_stream.frame_start_sample, time.monotonic())
+            dropped = self.capture_queue.put(item)
+            if dropped is not None:
+                self._free_frames.append(dropped[0])
+
+    def _analysis_loop(self):
+        while not self._stop_event.is_set():
+            item = self.capture_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            frame, frame_start_sample, capture_time = item
+            t_analysis = time.perf_counter()
+            result = self.processor.process(frame, frame_start_sample)
+            self.processor.stats.end_frame(time.perf_counter() - t_analysis)
+            self._free_frames.append(frame)
+            result['frame_start_sample'] = frame_start_sample
+            result['capture_time'] = capture_time
+            result['queue_depths'] = self.queue_depths()
+            self.output_queue.put(result)
+
+    def _output_loop(self):
+        stats = self.processor.stats
+        while not self._stop_event.is_set():
+            result = self.output_queue.get(timeout=0.1)
+            if result is None:
+                continue
+            self.output(result)
+            # 端到端延迟：从采集完成到输出完成
+            latency = time.monotonic() - result['capture_time']
+            stats.record('latency', latency)
+            self.processor.report_latency(latency)
+
+    def _run_stage(self, target):
+        try:
+            target()
+        except Exception as e:
+            self.error = e
+            self._stop_event.set()
+
+    def start(self):
+        for _ in range(self._pool_size):
+            self._free_frames.append(np.empty((self.audio_stream.channels, self.audio_stream.chunk_samples),
+                                              dtype=np.float32))
+        self.audio_stream.start()
+        for name, target in (('capture', self._capture_loop),
+                             ('analysis', self._analysis_loop),
+                             ('output', self._output_loop)):
+            thread = threading.Thread(target=self._run_stage, args=(target,), name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run(self):
+        """启动流水线并阻塞，直到某个阶段出错或收到KeyboardInterrupt"""
+        self.start()
+        try:
+            while not self._stop_event.wait(0.5):
+                pass
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import numpy as np
+from utils.localization import SPEED_OF_SOUND
+
+# 桌面范围（厘米）：左下(0,0)，右上(117,68)
+TABLE_WIDTH = 117.0
+TABLE_HEIGHT = 68.0
+
+# 查找表格式版本，修改表内容的计算方式时递增，使旧缓存失效
+GRID_VERSION = 1
+
+
+def mic_layout_hash(mic_positions, *params):
+    """根据麦克风坐标和建表参数生成缓存键"""
+    digest = hashlib.sha1()
+    digest.update(np.asarray(mic_positions, dtype=np.float64).tobytes())
+    digest.update(repr((GRID_VERSION,) + tuple(params)).encode())
+    return digest.hexdigest()[:16]
+
+
+class PositionGrid:
+    """
+    预计算的空间查找表
+    在桌面区域上按固定分辨率建立网格，每个格点保存各麦克风的期望相对响度（对数、去均值）
+    和相对参考麦克风的期望到达时间差。每帧只需一次矩阵乘法做最近邻匹配，无需迭代求解。
+    查找表按麦克风布局的哈希缓存为.npy文件，重启时以内存映射方式加载。
+    """
+
+    def __init__(self, mic_positions, resolution=1.0, refine=True, coarse_factor=4,
+                 cache_dir=".cache", speed_of_sound=SPEED_OF_SOUND, reference=0, distance_offset=10.0):
+        """
+        Args:
+            mic_positions: np.array, shape (channels, 2) - XY坐标（厘米）
+            resolution: 网格分辨率（厘米）
+            refine: 是否使用由粗到精的两级搜索
+            coarse_factor: 粗网格相对细网格的步长倍数
+            cache_dir: 查找表缓存目录，为None时不缓存
+            speed_of_sound: 声速（厘米/秒）
+            reference: 时延特征的参考麦克风索引
+            distance_offset: 响度模型 rms ∝ 1/(距离 + distance_offset) 中的距离偏置，避免麦克风处奇异
+        """
+        self.mic_positions = np.asarray(mic_positions, dtype=float)
+        self.resolution = resolution
+        self.refine = refine
+        self.coarse_factor = max(1, int(coarse_factor))
+        self.speed_of_sound = speed_of_sound
+        self.reference = reference
+        self.distance_offset = distance_offset
+        self.num_mics = len(self.mic_positions)
+
+        self.xs = np.arange(0.0, TABLE_WIDTH + 1e-9, resolution)
+        self.ys = np.arange(0.0, TABLE_HEIGHT + 1e-9, resolution)
+        self.cache_key = mic_layout_hash(self.mic_positions, resolution, speed_of_sound, reference, distance_offset)
+        self.cache_path = None
+        if cache_dir is not None:
+            self.cache_path = os.path.join(cache_dir, f"position_grid_{self.cache_key}.npy")
+
+        table = self._load_or_build()
+        # 列布局: [x, y, 响度特征(num_mics), 时延特征(num_mics-1)]
+        self.positions = table[:, :2]
+        self.level_table = table[:, 2:2 + self.num_mics]
+        self.delay_table = table[:, 2 + self.num_mics:]
+        self.level_norms = np.einsum('ij,ij->i', self.level_table, self.level_table)
+        self.delay_norms = np.einsum('ij,ij->i', self.delay_table, self.delay_table)
+
+        # 粗网格索引以及每个粗格点周围的细网格邻域
+        nx, ny = len(self.xs), len(self.ys)
+        grid_index = np.arange(nx * ny).reshape(nx, ny)
+        self._coarse_index = grid_index[::self.coarse_factor, ::self.coarse_factor].ravel()
+        self._grid_index = grid_index
+
+    def _build_table(self):
+        """计算每个格点的期望响度和时延特征"""
+        gx, gy = np.meshgrid(self.xs, self.ys, indexing='ij')
+        points = np.stack([gx.ravel(), gy.ravel()], axis=1)
+        distances = np.linalg.norm(points[:, None, :] - self.mic_positions[None, :, :], axis=2)
+
+        log_levels = -np.log(distances + self.distance_offset)
+        log_levels -= log_levels.mean(axis=1, keepdims=True)
+
+        others = [i for i in range(self.num_mics) if i != self.reference]
+        delays = (distances[:, others] - distances[:, [self.reference]]) / self.speed_of_sound
+
+        return np.hstack([points, log_levels, delays])
+
+    def _load_or_build(self):
+        if self.cache_path is not None and os.path.exists(self.cache_path):
+            return np.load(self.cache_path, mmap_mode='r')
+        table = self._build_table()
+        if self.cache_path is not None:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            # 先写临时文件再替换，避免并发启动时读到不完整的缓存
+            tmp_path = self.cache_path + f".{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, table)
+            os.replace(tmp_path, self.cache_path)
+            return np.load(self.cache_path, mmap_mode='r')
+        return table
+
+    def _nearest(self, table, norms, feature):
+        """
+        最近邻匹配：argmin |F - f|^2 = argmin (|F|^2 - 2 F·f)
+        启用refine时先在粗网格上搜索，再在粗格点周围的细网格邻域内搜索
+        """
+        if not self.refine or self.coarse_factor == 1:
+            best = np.argmin(norms - 2.0 * (table @ feature))
+            return np.array(self.positions[best])
+
+        coarse = self._coarse_index
+        best_coarse = coarse[np.argmin(norms[coarse] - 2.0 * (table[coarse] @ feature))]
+        ix, iy = divmod(int(best_coarse), len(self.ys))
+        span = self.coarse_factor
+        window = self._grid_index[max(0, ix - span):ix + span + 1, max(0, iy - span):iy + span + 1].ravel()
+        best = window[np.argmin(norms[window] - 2.0 * (table[window] @ feature))]
+        return np.array(self.positions[best])
+
+    def lookup_levels(self, rms_values, noise_threshold=0.01):
+        """
+        由各定位麦克风的RMS值查表得到位置
+        rms_values: np.array, shape (channels,)
+        返回位置 np.array, shape (2,)；有效信号不足2个时返回None
+        """
+        rms_values = np.asarray(rms_values, dtype=float)
+        if np.sum(rms_values > noise_threshold) < 2:
+            return None
+        feature = np.log(rms_values + 1e-9)
+        feature -= feature.mean()
+        return self._nearest(self.level_table, self.level_norms, feature)
+
+    def lookup_delays(self, arrival_times):
+        """
+        由各麦克风相对参考麦克风的到达时间差查表得到位置
+        arrival_times: np.array, shape (channels-1,) - 秒
+        返回位置 np.array, shape (2,)
+        """
+        return self._nearest(self.delay_table, self.delay_norms, np.asarray(arrival_times, dtype=float))
@@ -0,0 +1,510 @@
+import time
+import numpy as np
+from utils.localization import (estimate_position_enhanced, estimate_position_with_smoothing, GoalDetector,
+                                GCCPHATLocalizer)
+from utils.config import as_runtime_config
+from utils.kernels import NUMPY_KERNELS, create_kernels
+from utils.stats import NullStats
+from utils.tempo_mapper import REFERENCE_FRAME_DURATION, TempoMapper
+
+def map_coordinates_to_osc_range(x, y):
+    """
+    将原始坐标映射到OSC范围（-1到1）
+    新坐标系: x: -10到127 -> -1到1, y: 0-68 -> -1到1
+    """
+    # x坐标范围：-10到127，总范围137
+    x_mapped = 2.0 * (float(x) + 10.0) / 137.0 - 1.0
+    y_mapped = 2.0 * float(y) / 68.0 - 1.0
+    return x_mapped, y_mapped
+
+# 运行中可调的参数: 名称 -> (所属模块, 类型, 最小值, 最大值)
+# 模块: processor为FrameProcessor本身，tempo为TempoMapper，goal为GoalDetector
+PARAMETERS = {
+    'smoothing_factor': ('processor', float, 0.0, 0.95),
+    'attack_rate': ('tempo', float, 0.0, 1.0),
+    'decay_rate': ('tempo', float, 0.0, 1.0),
+    'silence_decay_rate': ('tempo', float, 0.0, 1.0),
+    'silence_threshold': ('tempo', float, 0.0, 1.0),
+    'base_bpm': ('tempo', float, 20.0, 300.0),
+    'min_bpm': ('tempo', float, 20.0, 300.0),
+    'max_bpm': ('tempo', float, 20.0, 300.0),
+    'goal_threshold': ('goal', float, 0.0, 10.0),
+    'volume_increase_threshold': ('goal', float, 1.0, 100.0),
+    'cooldown_frames': ('goal', int, 0, 10000),
+    'cooldown': ('goal', float, 0.0, 600.0),
+}
+
+class FrameProcessor:
+    """
+    单帧分析：定位、进球检测和BPM映射
+    持有跨帧状态（上一帧位置、进球检测器、BPM映射器），与采集和输出解耦，可在任意线程中调用
+    """
+
+    def __init__(self, mic_positions, tempo_mapper, smoothing_factor=0.6, localizer=None, position_grid=None,
+                 stats=None, goal_detector=None, transient_detector=None, hop_samples=None,
+                 filterbank=None, impact_band=None, tracker=None, samplerate=None, thresholds=None,
+                 main_window=None, goal_window=None, kernels=None, recorder=None, multi_source=None,
+                 first_source_id=2, analytics=None, frame_duration=None):
+        """
+        Args:
+            mic_positions: 定位麦克风坐标 np.array, shape (6, 2)
+            tempo_mapper: TempoMapper实例
+            smoothing_factor: 位置平滑因子（按100ms帧整定，按frame_duration换算为每帧的因子）
+            localizer: 可选的GCCPHATLocalizer
+            position_grid: 可选的PositionGrid查找表（无localizer时用于响度查表定位）
+            stats: 可选的PerformanceStats，记录各阶段耗时
+            goal_detector: GoalDetector实例，默认创建一个独立的检测器
+            transient_detector: 可选的TransientGoalDetector，提供时用原始样本起音检测代替RMS进球检测
+            hop_samples: 帧移样本数，重叠帧时起音检测只处理每帧最后hop_samples个新样本，None表示整帧
+            filterbank: 可选的FilterBank（通道1-8），提供时定位、进球检测和BPM只使用impact_band频带
+            impact_band: 球撞击声所在的频带名
+            tracker: 可选的BallTracker，提供时用卡尔曼跟踪代替固定系数平滑，并向前外推流水线延迟
+            samplerate: 采样率，tracker按流时间计算时间步长时需要
+            thresholds: 可选的AutoThresholds，按自适应噪声底设置各阈值并校正定位麦克风增益
+            main_window: 可选的SlidingRMS（6通道），提供时定位和BPM使用滑动窗口RMS，窗口长度与帧长无关
+            goal_window: 可选的SlidingRMS（2通道），提供时进球检测使用滑动窗口RMS
+            kernels: 逐样本内核后端（utils.kernels），默认NumPy
+            recorder: 可选的MatchRecorder，记录每帧的新样本和分析结果
+            multi_source: 可选的MultiSourceLocalizer，提供时把每帧分解为多个声源，
+                          未使用GCC-PHAT和查找表时主位置取最强的声源而不是所有麦克风的重心
+            first_source_id: 多声源输出的第一个OSC source序号
+            analytics: 可选的ShotAnalyzer，由位置轨迹计算球速、方向和射门事件（需要samplerate）
+            frame_duration: 每帧对应的时长（帧移，秒），None表示100ms
+        """
+        self.mic_positions = mic_positions
+        self.tempo_mapper = tempo_mapper
+        self.smoothing_factor = smoothing_factor
+        self._frame_ratio = frame_duration / REFERENCE_FRAME_DURATION if frame_duration else 1.0
+        self.localizer = localizer
+        self.position_grid = position_grid
+        self.prev_position = None
+        self.stats = stats if stats is not None else NullStats()
+        self.goal_detector = goal_detector if goal_detector is not None else GoalDetector()
+        self.transient_detector = transient_detector
+        self.hop_samples = hop_samples
+        self.filterbank = filterbank
+        self.impact_band = filterbank.band_index(impact_band) if filterbank is not None else None
+        self.tracker = tracker
+        self.samplerate = samplerate
+        if tracker is not None:
+            from utils.tracker import rms_confidence
+            self._rms_confidence = rms_confidence
+        # 定位噪声阈值，启用自动校准时随噪声底更新
+        self.noise_threshold = 0.01
+        self.thresholds = thresholds
+        # 通过控制端口手动设置过的参数，自动校准不再覆盖
+        self._overridden = set()
+        self._calibration_levels = np.zeros(8)
+        self.main_window = main_window
+        self.goal_window = goal_window
+        self.kernels = kernels if kernels is not None else NUMPY_KERNELS
+        # 通道1-8的平方和
+        self._energies = np.zeros(8)
+        self.recorder = recorder
+        self.multi_source = multi_source
+        self.analytics = analytics
+        self.source_slots = None
+        if multi_source is not None:
+            from utils.multisource import SourceSlots
+            self.source_slots = SourceSlots(multi_source.max_sources, first_id=first_source_id)
+        if thresholds is not None and thresholds.noise_threshold is not None:
+            self._apply_thresholds()
+        # 调用方未提供帧起始样本序号时，按连续帧自行计数
+        self._next_frame_start = 0
+
+    def _apply_thresholds(self):
+        """把自动校准得到的阈值写入各检测模块（在分析线程中帧与帧之间调用）"""
+        thresholds = self.thresholds
+        self.noise_threshold = thresholds.noise_threshold
+        if self.localizer is not None:
+            self.localizer.noise_threshold = thresholds.noise_threshold
+        if self.multi_source is not None:
+            self.multi_source.noise_threshold = thresholds.noise_threshold
+        if 'goal_threshold' not in self._overridden:
+            self.goal_detector.goal_threshold = thresholds.goal_threshold
+            if self.transient_detector is not None:
+                self.transient_detector.min_level = thresholds.goal_threshold
+        if 'silence_threshold' not in self._overridden:
+            self.tempo_mapper.silence_threshold = thresholds.silence_threshold
+
+    def _parameter_owner(self, name):
+        owner = PARAMETERS[name][0]
+        if owner == 'tempo':
+            return self.tempo_mapper
+        if owner == 'goal':
+            return self.goal_detector
+        return self
+
+    def validate_parameter(self, name, value):
+        """检查参数名和取值范围，返回转换类型后的值；无效时抛出ValueError"""
+        if name not in PARAMETERS:
+            raise ValueError(f"未知的参数: {name}")
+        _, kind, low, high = PARAMETERS[name]
+        try:
+            value = kind(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"参数 {name} 的值无效: {value!r}")
+        if not low <= value <= high:
+            raise ValueError(f"参数 {name} 超出范围 [{low}, {high}]: {value}")
+        if PARAMETERS[name][0] == 'goal' and self.transient_detector is not None:
+            # transient模式不使用RMS进球检测器，修改这些参数不会有任何效果
+            raise ValueError(f"参数 {name} 只用于rms进球检测，当前为transient模式")
+        return value
+
+    def check_parameters(self, updates):
+        """
+        检查一组已校验的参数与其余当前参数的组合，无效时抛出ValueError
+        BPM范围必须满足 min_bpm <= base_bpm <= max_bpm
+        """
+        bpm = {name: updates.get(name, getattr(self.tempo_mapper, name)) for name in ('min_bpm', 'base_bpm', 'max_bpm')}
+        if not bpm['min_bpm'] <= bpm['base_bpm'] <= bpm['max_bpm']:
+            raise ValueError(f"BPM范围无效，必须满足 min_bpm <= base_bpm <= max_bpm: "
+                             f"{bpm['min_bpm']} / {bpm['base_bpm']} / {bpm['max_bpm']}")
+
+    def apply_parameters(self, updates):
+        """
+        应用一组已校验的参数，必须在两帧之间调用（与process在同一线程）
+        updates: {参数名: 值}
+        """
+        for name, value in updates.items():
+            setattr(self._parameter_owner(name), name, value)
+            self._overridden.add(name)
+
+    def get_parameters(self):
+        """当前所有可调参数的值"""
+        return {name: getattr(self._parameter_owner(name), name) for name in PARAMETERS}
+
+    def close(self):
+        """保存校准状态，写完录音"""
+        if self.thresholds is not None:
+            self.thresholds.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def report_latency(self, latency):
+        """记录测量到的端到端延迟（秒），跟踪器据此向前外推位置"""
+        if self.tracker is not None:
+            self.tracker.report_latency(latency)
+
+    def process(self, audio_chunk, frame_start_sample=None):
+        """
+        处理一帧音频
+        audio_chunk: np.array, shape (channels, samples)
+        frame_start_sample: 本帧第一个样本在采集流中的序号，None时按连续帧计数
+        返回包含本帧分析结果的字典
+        """
+        # 通道主序、C连续的float32帧不拷贝；其他布局（例如转置视图）转换一次
+        audio_chunk = np.ascontiguousarray(audio_chunk, dtype=np.float32)
+        hop_samples = self.hop_samples or audio_chunk.shape[1]
+        if frame_start_sample is None:
+            frame_start_sample = self._next_frame_start
+        self._next_frame_start = frame_start_sample + hop_samples
+
+        # 提取球门麦克风通道（1-2通道，对应索引0-1）
+        goal_channels = audio_chunk[:2]  # 通道1-2用于进球检测
+        # 提取定位麦克风通道（3-8通道，对应索引2-7）
+        main_channels = audio_chunk[2:8]  # 通道3-8用于定位
+
+        stats = self.stats
+        t_rms = time.perf_counter()
+        new_start = audio_chunk.shape[1] - hop_samples
+        band_energies = None
+        goal_samples = goal_channels[:, new_start:]
+        goal_start_sample = frame_start_sample + new_start
+        if self.filterbank is not None:
+            # 分频滤波只处理本帧的新样本，滤波状态跨帧保持；之后只使用撞击频带
+            filtered = self.filterbank.process(audio_chunk[:, new_start:])
+            band_energies = self.filterbank.band_energies()
+            impact = self.impact_band
+            main_channels = self.filterbank.output[impact, 2:8]
+            main_rms = np.sqrt(band_energies[impact, 2:8])
+            goal_rms = np.sqrt(band_energies[impact, :2])
+            # 起音检测使用撞击频带的新样本，样本序号扣除FIR滤波器的延迟
+            goal_samples = filtered[impact, :2]
+            goal_start_sample -= self.filterbank.delay
+            new_main, new_goal, window_start = filtered[impact, 2:8], goal_samples, 0
+        else:
+            # 球门和定位麦克风（通道1-8，都是单声道）的平方和在一次遍历中完成
+            new_main, new_goal, window_start = main_channels, goal_channels, new_start
+            if self.main_window is None or self.goal_window is None:
+                self.kernels.sum_squares(audio_chunk[:8], 0, self._energies)
+                levels = np.sqrt(self._energies / audio_chunk.shape[1])
+                goal_rms = levels[:2]
+                main_rms = levels[2:8]
+        # 滑动窗口模式：只加入本帧的新样本，按各自的窗口长度增量更新RMS
+        if self.main_window is not None:
+            main_rms = self.main_window.update(new_main, window_start)
+        if self.goal_window is not None:
+            goal_rms = self.goal_window.update(new_goal, window_start)
+        if self.thresholds is not None:
+            # 更新噪声底统计，刷新阈值，并校正定位麦克风的增益差异
+            levels = self._calibration_levels
+            levels[:2] = goal_rms
+            levels[2:8] = main_rms
+            if self.thresholds.update(levels):
+                self._apply_thresholds()
+            main_rms = main_rms * self.thresholds.gains
+        t_position = time.perf_counter()
+        stats.record('rms', t_position - t_rms)
+
+        # 使用增强的定位算法和平滑处理（查表或GCC-PHAT无可信结果时回退到RMS重心）
+        current_pos = None
+        sources = None
+        if self.multi_source is not None:
+            # 多声源分解，按上一帧位置分配稳定的编号
+            decomposed = self.multi_source.decompose(main_rms)
+            sources = self.source_slots.assign(decomposed)
+            if len(decomposed) > 0:
+                current_pos = decomposed[0, :2].copy()
+        if self.localizer is not None:
+            current_pos = self.localizer.estimate(main_channels, main_rms)
+        elif self.position_grid is not None:
+            current_pos = self.position_grid.lookup_levels(main_rms, self.noise_threshold)
+        velocity = None
+        if self.tracker is not None:
+            if current_pos is None:
+                current_pos = estimate_position_enhanced(main_rms, self.mic_positions, self.noise_threshold)
+            # 估计值对应RMS窗口的中点（默认即帧的中点），输出时外推到帧末尾再加上流水线延迟
+            window_samples = self.main_window.window_samples if self.main_window is not None else audio_chunk.shape[1]
+            half_window = window_samples / 2.0 / self.samplerate
+            frame_time = (frame_start_sample + audio_chunk.shape[1]) / self.samplerate - half_window
+            confidence = self._rms_confidence(main_rms, self.noise_threshold)
+            _, velocity = self.tracker.update(current_pos, confidence, frame_time)
+            raw_pos = self.tracker.predict(self.tracker.latency + half_window)
+        else:
+            raw_pos = estimate_position_with_smoothing(main_rms, self.mic_positions, self.prev_position,
+                                                       self.smoothing_factor, current_pos=current_pos,
+                                                       noise_threshold=self.noise_threshold,
+                                                       frame_ratio=self._frame_ratio)
+        self.prev_position = raw_pos.copy()  # 保存当前位置用于下次平滑
+        t_goals = time.perf_counter()
+        stats.record('position', t_goals - t_position)
+
+        # 映射到OSC坐标范围
+        osc_x, osc_y = map_coordinates_to_osc_range(raw_pos[0], raw_pos[1])
+        osc_sources = None
+        if sources is not None:
+            osc_sources = [(source_id,) + map_coordinates_to_osc_range(x, y) for source_id, x, y, _ in sources]
+
+        # 处理球门麦克风
+        goal_events = []
+        if self.transient_detector is not None:
+            # 只处理本帧的新样本，给出撞击的精确样本序号
+            goal_detection = self.transient_detector.update(goal_samples, goal_start_sample)
+            goal_events = self.transient_detector.last_events
+        else:
+            goal_detection = self.goal_detector.update(goal_rms)  # [左球门进球(0/127), 右球门进球(0/127)]
+        t_tempo = time.perf_counter()
+        stats.record('goals', t_tempo - t_goals)
+
+        # 射门分析：球速、方向和射门事件，射门时直接给BPM映射器加入增量（计入tempo阶段）
+        ball = None
+        shot_events = []
+        if self.analytics is not None:
+            valid = np.count_nonzero(main_rms > self.noise_threshold) >= 2
+            frame_end = (frame_start_sample + audio_chunk.shape[1]) / self.samplerate
+            shot_events = self.analytics.update(raw_pos, frame_end, goal_detection, valid, velocity)
+            ball = (self.analytics.speed, self.analytics.direction)
+
+        # 计算BPM和映射响度
+        bpm, mapped_intensity = self.tempo_mapper.update_bpm(main_rms)
+
+        # 计算每个通道的映射响度（6个定位麦克风通道一次完成）
+        channel_intensity = self.tempo_mapper.calculate_intensity_batch(main_rms[:6])
+        mapped_channels = self.tempo_mapper.map_intensity_to_0_127_batch(channel_intensity)
+        stats.record('tempo', time.perf_counter() - t_tempo)
+
+        result = {
+            'frame_start_sample': frame_start_sample,
+            'main_rms': main_rms,
+            'goal_rms': goal_rms,
+            'raw_pos': raw_pos,
+            'osc_pos': (osc_x, osc_y),
+            'goal_detection': goal_detection,
+            'goal_events': goal_events,
+            'bpm': bpm,
+            'mapped_intensity': mapped_intensity,
+            'mapped_channels': mapped_channels,
+            'band_energies': band_energies,
+            'velocity': velocity,
+            'sources': sources,
+            'osc_sources': osc_sources,
+            'ball': ball,
+            'shot_events': shot_events,
+        }
+        if self.recorder is not None:
+            self.recorder.record(audio_chunk, new_start, frame_start_sample, result)
+        return result
+
+def create_processor(config, chunk_samples, stats=None, hop_samples=None, live=True):
+    """
+    根据配置创建FrameProcessor（定位后端、查找表、进球检测、BPM映射器）
+    config: RuntimeConfig（load_runtime_config的编译结果），也接受原始配置字典
+    chunk_samples: 每帧样本数，用于预计算GCC-PHAT的FFT长度
+    stats: 可选的PerformanceStats
+    hop_samples: 帧移样本数，None表示等于chunk_samples
+    live: 是否实时采集；离线回放时为False，录音等待后台写线程而不丢段
+    可选子系统（查找表、多声源、起音检测、分频滤波、跟踪、校准、滑动窗口、录音、射门分析）只在配置启用时才导入
+    """
+    runtime = as_runtime_config(config)
+    sample_rate = runtime.sample_rate
+    # 每帧对应的时长（帧移）：按秒配置的窗口、冷却和平滑速率据此换算为帧
+    frame_duration = (hop_samples or chunk_samples) / sample_rate
+    # 逐样本内核：numpy，或启用时使用磁盘缓存的Numba编译内核
+    kernels = create_kernels(runtime)
+
+    # 使用通道3-8进行定位（对应索引2-7）
+    mic_positions = runtime.main_mic_positions
+    localization_config = runtime.section('localization')
+    localization_method = runtime.localization_method
+
+    # 预计算查找表（按麦克风布局哈希缓存到磁盘，重启时直接内存映射加载）
+    position_grid = None
+    if localization_method == 'grid' or localization_config.get('use_grid', False):
+        from utils.position_grid import PositionGrid
+        position_grid = PositionGrid(mic_positions,
+                                     resolution=localization_config.get('grid_resolution', 1.0),
+                                     refine=localization_config.get('grid_refine', True),
+                                     cache_dir=localization_config.get('cache_dir', '.cache'))
+
+    # 时延差定位后端（FFT长度和麦克风对几何在启动时预先计算）
+    localizer = None
+    if localization_method == 'gcc_phat':
+        localizer = GCCPHATLocalizer(mic_positions, sample_rate, chunk_samples, grid=position_grid)
+    elif localization_method not in ('rms', 'grid'):
+        raise ValueError(f"未知的定位算法: {localization_method}")
+
+    # 多声源定位：粗、细两级网格字典在启动时计算，每帧的计算量固定
+    multi_source_config = localization_config.get('multi_source', {})
+    multi_source = None
+    if multi_source_config.get('enabled', False):
+        from utils.multisource import MultiSourceLocalizer
+        multi_source = MultiSourceLocalizer(mic_positions,
+                                            max_sources=multi_source_config.get('max_sources', 2),
+                                            resolution=multi_source_config.get('resolution', 10.0),
+                                            refine_resolution=multi_source_config.get('refine_resolution', 2.0),
+                                            min_improvement=multi_source_config.get('min_improvement', 0.05),
+                                            min_separation=multi_source_config.get('min_separation', 30.0))
+
+    # 进球检测：rms为逐帧音量变化，transient为原始样本短窗能量起音检测
+    goal_config = runtime.section('goal_detection')
+    goal_mode = runtime.goal_mode
+    goal_detector = None
+    transient_detector = None
+    if goal_mode == 'rms':
+        goal_detector = GoalDetector.from_durations(frame_duration,
+                                                    recent=goal_config.get('recent_window', 0.5),
+                                                    previous=goal_config.get('previous_window', 1.0),
+                                                    cooldown=goal_config.get('cooldown', 3.0))
+    elif goal_mode == 'transient':
+        from utils.onset import TransientGoalDetector
+        transient_detector = TransientGoalDetector(sample_rate,
+                                                   window_duration=goal_config.get('window_ms', 1.0) / 1000.0,
+                                                   onset_ratio=goal_config.get('onset_ratio', 8.0),
+                                                   min_level=goal_config.get('min_level', 0.3),
+                                                   cooldown_duration=goal_config.get('cooldown', 3.0),
+                                                   kernels=kernels)
+    else:
+        raise ValueError(f"未知的进球检测模式: {goal_mode}")
+
+    # 分频滤波前端：通道1-8，系数在启动时设计一次
+    filterbank_config = runtime.section('filterbank')
+    filterbank = None
+    impact_band = None
+    if filterbank_config.get('enabled', False):
+        from utils.filterbank import DEFAULT_BANDS, FilterBank
+        bands = filterbank_config.get('bands', DEFAULT_BANDS)
+        impact_band = filterbank_config.get('impact_band', 'impact')
+        if impact_band not in bands:
+            raise ValueError(f"未知的撞击频带: {impact_band}")
+        filterbank = FilterBank(sample_rate, bands, channels=8, frame_samples=chunk_samples,
+                                taps=filterbank_config.get('taps', 255))
+
+    # 位置跟踪：卡尔曼滤波代替固定系数平滑
+    tracking_config = runtime.section('tracking')
+    tracker = None
+    if tracking_config.get('enabled', False):
+        from utils.tracker import BallTracker
+        tracker = BallTracker(process_noise=tracking_config.get('process_noise', 1000.0),
+                              measurement_noise=tracking_config.get('measurement_noise', 4.0),
+                              min_confidence=tracking_config.get('min_confidence', 0.05),
+                              reset_distance=tracking_config.get('reset_distance', 50.0))
+
+    # 自适应噪声底和增益校准（通道1-8），状态保存到磁盘，重启后直接生效
+    calibration_config = runtime.section('calibration')
+    thresholds = None
+    if calibration_config.get('enabled', False):
+        from utils.calibration import AutoThresholds, NoiseCalibrator
+        calibrator = NoiseCalibrator(8, frame_duration,
+                                     half_life=calibration_config.get('half_life', 120.0),
+                                     noise_percentile=calibration_config.get('noise_percentile', 20.0),
+                                     warmup=calibration_config.get('warmup', 10.0),
+                                     path=calibration_config.get('path'))
+        thresholds = AutoThresholds(calibrator,
+                                    noise_margin=calibration_config.get('noise_margin', 2.0),
+                                    goal_margin=calibration_config.get('goal_margin', 10.0),
+                                    min_goal_threshold=calibration_config.get('min_goal_threshold', 0.05),
+                                    silence_margin=calibration_config.get('silence_margin', 3.0),
+                                    gain_correction=calibration_config.get('gain_correction', True),
+                                    refresh_interval=calibration_config.get('refresh_interval', 1.0),
+                                    save_interval=calibration_config.get('save_interval', 60.0))
+
+    # 滑动窗口分析：定位/BPM和进球检测的RMS窗口与帧长无关，更新率由帧移决定
+    windows_config = runtime.section('windows')
+    main_window = None
+    goal_window = None
+    if windows_config.get('enabled', False):
+        from utils.sliding import SlidingRMS
+        hop = hop_samples or chunk_samples
+        main_window = SlidingRMS(6, int(sample_rate * windows_config.get('rms', 0.05)), hop,
+                                 kernels=kernels)
+        if goal_mode == 'rms':
+            goal_window = SlidingRMS(2, int(sample_rate * windows_config.get('goal', 0.05)), hop,
+                                     kernels=kernels)
+
+    # 比赛录音：最近几分钟的原始音频在内存中，分段压缩落盘，进球事件建立索引
+    recorder = None
+    if runtime.section('recorder').get('enabled', False):
+        from utils.recorder import create_recorder
+        recorder = create_recorder(runtime, live=live)
+
+    # 初始化BPM映射器（速率按100ms帧整定，按帧移换算；历史记录5秒）
+    analytics_config = runtime.section('analytics')
+    tempo_mapper = TempoMapper(
+        base_bpm=120,
+        max_bpm=180,
+        min_bpm=60,
+        attack_rate=0.1,
+        decay_rate=0.05,
+        silence_decay_rate=0.3,
+        silence_threshold=0.05,
+        history_length=max(1, round(5.0 / frame_duration)),
+        boost_half_life=analytics_config.get('bpm_boost_half_life', 0.65),
+        frame_duration=frame_duration
+    )
+
+    # 射门分析：球门坐标取通道1-2（球门麦克风）的位置，射门时给BPM映射器加入增量
+    analytics = None
+    if analytics_config.get('enabled', False):
+        from utils.analytics import ShotAnalyzer
+        analytics = ShotAnalyzer(runtime.goal_mic_positions,
+                                 span=analytics_config.get('span', 0.1),
+                                 history_frames=analytics_config.get('history_frames', 64),
+                                 shot_speed=analytics_config.get('shot_speed', 300.0),
+                                 shot_angle=analytics_config.get('shot_angle', 30.0),
+                                 max_speed=analytics_config.get('max_speed', 2000.0),
+                                 cooldown=analytics_config.get('cooldown', 0.5),
+                                 goal_window=analytics_config.get('goal_window', 2.0),
+                                 tempo_mapper=tempo_mapper,
+                                 bpm_boost=analytics_config.get('bpm_boost', 15.0))
+
+    # 平滑因子（按100ms帧整定），可以调整
+    return FrameProcessor(mic_positions, tempo_mapper, smoothing_factor=0.6, frame_duration=frame_duration,
+                          localizer=localizer, position_grid=position_grid, stats=stats,
+                          goal_detector=goal_detector, transient_detector=transient_detector, hop_samples=hop_samples,
+                          filterbank=filterbank, impact_band=impact_band,
+                          tracker=tracker, samplerate=sample_rate, thresholds=thresholds,
+                          main_window=main_window, goal_window=goal_window, kernels=kernels,
+                          recorder=recorder, multi_source=multi_source,
+                          first_source_id=multi_source_config.get('first_source_id', 2),
+                          analytics=analytics)
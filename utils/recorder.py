@@ -0,0 +1,355 @@
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from utils.log import FRAME_DTYPE, FrameLog
+from utils.config import as_runtime_config
+
+AUDIO_MAGIC = b"FOOSBALL-AUDIO 1\n"
+# 段头：标记、段起始样本序号、样本数、通道数、压缩数据长度
+SEGMENT_HEADER = struct.Struct('<4sqIHI')
+SEGMENT_MAGIC = b'SEG1'
+PCM_SCALE = 32767.0
+
+log = logging.getLogger(__name__)
+
+def encode_segment(block, level=1):
+    """int16 (channels, samples) -> 按通道一阶差分后zlib压缩的字节串"""
+    delta = np.diff(block, axis=1, prepend=np.zeros((block.shape[0], 1), dtype=np.int16))
+    return zlib.compress(delta.tobytes(), level)
+
+def decode_segment(payload, channels, samples):
+    """encode_segment的逆运算，返回int16 (channels, samples)"""
+    delta = np.frombuffer(zlib.decompress(payload), dtype=np.int16).reshape(channels, samples)
+    # int16累加按模2^16回绕，与差分时的回绕抵消
+    return np.cumsum(delta, axis=1, dtype=np.int16)
+
+class MatchRecorder:
+    """
+    比赛录音：最近ring_minutes分钟的原始多通道音频保存在预分配的int16环形缓冲中，
+    每满segment_seconds秒由后台线程压缩成一段追加到audio.bin；逐帧遥测（位置、RMS、进球、BPM）
+    写入telemetry.bin（utils.log的FrameLog格式）。
+    index.jsonl记录每一段和每次进球在两个文件中的字节偏移，用RecordingReader可以直接跳到任意进球，
+    不需要从头扫描文件。
+    分析线程只做一次样本拷贝（float32 -> int16）和遥测记录赋值，压缩和文件I/O都在后台线程中完成。
+    实时采集时后台写线程跟不上则丢弃被覆盖的段，不阻塞分析线程；离线回放（block=True）时分析线程
+    等待写线程取走最旧的段，录音完整。
+    """
+
+    def __init__(self, directory, samplerate, channels, ring_minutes=2.0, segment_seconds=10.0,
+                 compression_level=1, block=False):
+        """
+        Args:
+            directory: 本次录音的目录（不存在时创建）
+            samplerate: 采样率
+            channels: 录制的通道数（帧的全部通道）
+            ring_minutes: 内存中保留的音频时长（分钟），决定环形缓冲大小
+            segment_seconds: 每段的时长（秒）
+            compression_level: zlib压缩级别（1最快）
+            block: 环形缓冲中还有未落盘的段将被覆盖时，是否等待写线程（离线回放时使用）
+        """
+        self.directory = directory
+        self.samplerate = samplerate
+        self.channels = channels
+        self.segment_samples = max(1, int(samplerate * segment_seconds))
+        self.capacity = max(int(samplerate * ring_minutes * 60), 2 * self.segment_samples)
+        self.compression_level = compression_level
+        self.block = block
+        os.makedirs(directory, exist_ok=True)
+
+        # 通道主序的环形缓冲 (channels, capacity)，按行写入帧的新样本不需要转置
+        self._ring = np.zeros((channels, self.capacity), dtype=np.int16)
+        self._scratch = np.zeros((channels, 0), dtype=np.float32)
+        # 已写入环形缓冲的样本总数，以及它对应的下一个流样本序号
+        self._written = 0
+        self._next_sample = None
+        # 单次写入的最大样本数：写入期间这些位置上最旧的样本已被覆盖，_written却还没有更新
+        self._max_write = 0
+        # 写线程已经复制完的样本计数，block模式下分析线程不会覆盖它之后的数据
+        self._consumed = 0
+        self._consumed_event = threading.Event()
+        # 当前未落盘段的起点（环形缓冲计数和流样本序号）
+        self._segment_written = 0
+        self._segment_sample = 0
+        self._frames = 0
+        # 后台写线程来不及、段被覆盖而丢弃的次数
+        self.dropped_segments = 0
+        # 写线程中的异常（压缩或文件写入失败），block模式下在分析线程中重新抛出
+        self.error = None
+
+        self._audio = open(os.path.join(directory, "audio.bin"), 'wb')
+        self._audio.write(AUDIO_MAGIC)
+        self._audio.write(json.dumps({'samplerate': samplerate, 'channels': channels, 'dtype': 'int16',
+                                      'scale': 1.0 / PCM_SCALE, 'encoding': 'delta-zlib'}).encode() + b"\n")
+        self._index = open(os.path.join(directory, "index.jsonl"), 'w')
+        self.telemetry = FrameLog(os.path.join(directory, "telemetry.bin"), fmt='binary')
+        self._start_time = time.time()
+
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._run_writer, name="recorder", daemon=True)
+        self._writer.start()
+
+    def record(self, audio_chunk, new_start, frame_start_sample, result):
+        """
+        记录一帧：audio_chunk[:, new_start:]为本帧的新样本，result为该帧的分析结果
+        在分析线程中调用
+        """
+        first_sample = frame_start_sample + new_start
+        if self._next_sample is not None and first_sample != self._next_sample:
+            # 采集出现间隙（例如读取过慢时跳帧）：结束当前段，新段从新的样本序号开始
+            self._flush_segment()
+        if self._segment_written == self._written:
+            self._segment_sample = first_sample
+        self._write_samples(audio_chunk[:self.channels, new_start:])
+        self._next_sample = first_sample + audio_chunk.shape[1] - new_start
+
+        # 遥测记录在telemetry.bin中的序号；进球事件在写线程中换算为字节偏移
+        frame_index = self._frames
+        self._frames += 1
+        self.telemetry.write(result)
+        events = result.get('goal_events')
+        if events:
+            for goal_index, sample_index, _ in events:
+                self._queue.put(('goal', int(goal_index), int(sample_index), frame_index))
+        else:
+            for goal_index, flag in enumerate(result['goal_detection']):
+                if flag:
+                    self._queue.put(('goal', goal_index, self._next_sample, frame_index))
+
+        if self._written - self._segment_written >= self.segment_samples:
+            self._flush_segment()
+
+    def _write_samples(self, samples):
+        n = samples.shape[1]
+        if self.block:
+            # 等待写线程取走将被覆盖的段（写线程只在处理完一段后更新_consumed）
+            while self._written + n - self._consumed > self.capacity:
+                self._check_writer()
+                self._consumed_event.wait(0.1)
+                self._consumed_event.clear()
+        if n > self._max_write:
+            self._max_write = n
+        if self._scratch.shape[1] < n:
+            self._scratch = np.zeros((self.channels, n), dtype=np.float32)
+        scratch = self._scratch[:, :n]
+        np.multiply(samples, PCM_SCALE, out=scratch)
+        np.clip(scratch, -PCM_SCALE, PCM_SCALE, out=scratch)
+        np.rint(scratch, out=scratch)
+        start = self._written % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            np.copyto(self._ring[:, start:end], scratch, casting='unsafe')
+        else:
+            first = self.capacity - start
+            np.copyto(self._ring[:, start:], scratch[:, :first], casting='unsafe')
+            np.copyto(self._ring[:, :end - self.capacity], scratch[:, first:], casting='unsafe')
+        self._written += n
+
+    def _flush_segment(self):
+        """把当前段交给写线程"""
+        if self._written > self._segment_written:
+            self._queue.put(('segment', self._segment_written, self._written, self._segment_sample))
+        self._segment_written = self._written
+
+    def _copy_ring(self, begin, end):
+        """复制环形缓冲中计数[begin, end)的样本；已被覆盖时返回None"""
+        start = begin % self.capacity
+        n = end - begin
+        if start + n <= self.capacity:
+            block = self._ring[:, start:start + n].copy()
+        else:
+            first = self.capacity - start
+            block = np.concatenate((self._ring[:, start:], self._ring[:, :n - first]), axis=1)
+        # 复制后再检查：复制期间分析线程可能已经覆盖了这段数据，正在进行的一次写入也算在内
+        # （block模式下分析线程不会写到_consumed之后一个缓冲长度以外，不需要余量）
+        margin = 0 if self.block else self._max_write
+        if self._written + margin - begin > self.capacity:
+            return None
+        return block
+
+    def snapshot(self, seconds):
+        """内存中最近seconds秒的音频，float32 (channels, samples)；在分析线程中调用"""
+        n = min(int(seconds * self.samplerate), self._written, self.capacity)
+        block = self._copy_ring(self._written - n, self._written)
+        return block.astype(np.float32) / PCM_SCALE
+
+    def _check_writer(self):
+        """写线程出错或已退出时抛出异常，block模式下不再无限等待"""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if not self._writer.is_alive():
+            raise RuntimeError("录音写线程已退出")
+
+    def _run_writer(self):
+        try:
+            self._write_loop()
+        except Exception as e:
+            log.error("录音写线程出错，停止录音: %s", e)
+            self.error = e
+            self._consumed_event.set()
+
+    def _write_loop(self):
+        pending_goals = []
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if item[0] == 'goal':
+                pending_goals.append(item[1:])
+                continue
+            _, begin, end, start_sample = item
+            end_sample = start_sample + end - begin
+            block = self._copy_ring(begin, end)
+            self._consumed = end
+            self._consumed_event.set()
+            offset = None
+            if block is None:
+                self.dropped_segments += 1
+                log.warning("录音段被覆盖，已丢弃: 样本 %d 起 %d 个", start_sample, end - begin)
+            else:
+                payload = encode_segment(block, self.compression_level)
+                offset = self._audio.tell()
+                self._audio.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, start_sample, block.shape[1], self.channels,
+                                                      len(payload)))
+                self._audio.write(payload)
+                self._audio.flush()
+                self._write_index({'type': 'segment', 'start_sample': start_sample, 'samples': block.shape[1],
+                                   'offset': offset, 'bytes': SEGMENT_HEADER.size + len(payload)})
+            pending_goals = self._index_goals(pending_goals, start_sample, end_sample, offset)
+
+    def _index_goals(self, pending_goals, start_sample, end_sample, offset):
+        """
+        为落在已处理段之前或之中的进球写索引，返回仍在后续段中的进球
+        所在段被丢弃（或位于采集间隙）时segment_offset为None，遥测偏移仍然有效
+        """
+        remaining = []
+        for goal_index, sample_index, frame_index in pending_goals:
+            if sample_index >= end_sample:
+                remaining.append((goal_index, sample_index, frame_index))
+                continue
+            in_segment = offset is not None and sample_index >= start_sample
+            self._write_index({
+                'type': 'goal', 'goal': goal_index, 'sample': sample_index,
+                'time': sample_index / self.samplerate,
+                'wall_time': self._start_time + sample_index / self.samplerate,
+                'segment_offset': offset if in_segment else None,
+                'segment_start_sample': start_sample if in_segment else None,
+                'telemetry_offset': self.telemetry.header_bytes + frame_index * FRAME_DTYPE.itemsize})
+        return remaining
+
+    def _write_index(self, entry):
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+
+    def close(self):
+        """写出当前段和未满的遥测记录并关闭文件"""
+        if self._audio is None:
+            return
+        self._flush_segment()
+        self._queue.put(None)
+        self._writer.join()
+        self.telemetry.close()
+        self._audio.close()
+        self._index.close()
+        self._audio = None
+        if self.block and self.error is not None:
+            # 离线回放时录音不完整必须报告（已在写入时抛出过的异常不再重复抛出）
+            error, self.error = self.error, None
+            raise error
+
+class RecordingReader:
+    """
+    读取MatchRecorder的录音目录
+    只加载index.jsonl；音频按段偏移直接定位，只解压需要的段；遥测按记录偏移读取。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "audio.bin"), 'rb') as f:
+            if f.readline() != AUDIO_MAGIC:
+                raise ValueError(f"不是录音文件: {directory}")
+            header = json.loads(f.readline())
+        self.samplerate = header['samplerate']
+        self.channels = header['channels']
+        self.scale = header['scale']
+        self.segments = []
+        self.goals = []
+        with open(os.path.join(directory, "index.jsonl")) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry['type'] == 'segment':
+                    self.segments.append(entry)
+                elif entry['type'] == 'goal':
+                    self.goals.append(entry)
+        self._segment_starts = np.array([s['start_sample'] for s in self.segments], dtype=np.int64)
+        with open(os.path.join(directory, "telemetry.bin"), 'rb') as f:
+            f.readline()
+            f.readline()
+            self._telemetry_header_bytes = f.tell()
+
+    def read_audio(self, start_sample, end_sample):
+        """
+        读取流样本序号[start_sample, end_sample)的音频，float32 (channels, samples)
+        录音中的间隙填0
+        """
+        out = np.zeros((self.channels, max(0, end_sample - start_sample)), dtype=np.float32)
+        first = max(0, int(np.searchsorted(self._segment_starts, start_sample, side='right')) - 1)
+        with open(os.path.join(self.directory, "audio.bin"), 'rb') as f:
+            for segment in self.segments[first:]:
+                seg_start = segment['start_sample']
+                if seg_start >= end_sample:
+                    break
+                seg_end = seg_start + segment['samples']
+                if seg_end <= start_sample:
+                    continue
+                f.seek(segment['offset'])
+                _, _, samples, channels, length = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+                block = decode_segment(f.read(length), channels, samples)
+                lo = max(start_sample, seg_start)
+                hi = min(end_sample, seg_end)
+                out[:, lo - start_sample:hi - start_sample] = block[:, lo - seg_start:hi - seg_start] * self.scale
+        return out
+
+    def goal_audio(self, index, before=3.0, after=1.0):
+        """第index次进球前before秒到后after秒的音频"""
+        sample = self.goals[index]['sample']
+        return self.read_audio(sample - int(before * self.samplerate), sample + int(after * self.samplerate))
+
+    def telemetry(self, offset=None, count=None):
+        """
+        读取遥测记录（FRAME_DTYPE），offset为index中的telemetry_offset，count为记录数
+        都为None时读取全部
+        """
+        path = os.path.join(self.directory, "telemetry.bin")
+        if offset is None:
+            from utils.log import read_frame_log
+            return read_frame_log(path)
+        return np.fromfile(path, dtype=FRAME_DTYPE, count=-1 if count is None else count, offset=offset)
+
+    def goal_telemetry(self, index, before=100, after=20):
+        """第index次进球前before帧到后after帧的遥测记录"""
+        offset = self.goals[index]['telemetry_offset']
+        start = max(self._telemetry_header_bytes, offset - before * FRAME_DTYPE.itemsize)
+        return self.telemetry(start, (offset - start) // FRAME_DTYPE.itemsize + after + 1)
+
+def create_recorder(config, live=True):
+    """
+    根据配置创建MatchRecorder，未启用时返回None；每次启动在directory下新建一个以时间命名的子目录
+    live为False（离线回放，分析速度不受采集限制）时写线程跟不上则等待，不丢段
+    """
+    runtime = as_runtime_config(config)
+    recorder_config = runtime.section('recorder')
+    if not recorder_config.get('enabled', False):
+        return None
+    directory = os.path.join(recorder_config.get('directory', 'recordings'), time.strftime("%Y%m%d-%H%M%S"))
+    return MatchRecorder(directory, runtime.sample_rate, runtime.channels,
+                         ring_minutes=recorder_config.get('ring_minutes', 2.0),
+                         segment_seconds=recorder_config.get('segment_seconds', 10.0),
+                         compression_level=recorder_config.get('compression_level', 1),
+                         block=not live)
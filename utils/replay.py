@@ -0,0 +1,193 @@
+import csv
+import os
+import struct
+import time
+import numpy as np
+
+# WAVE格式标签
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def open_wav_memmap(path):
+    """
+    以内存映射方式打开WAV文件
+    返回 (data, samplerate, scale)：data为 (frames, channels) 的np.memmap（24位PCM为 (frames, channels, 3) 的uint8），
+    scale为把整数样本转换到[-1, 1)的系数（浮点格式为1.0）
+    """
+    with open(path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError(f"不是有效的WAV文件: {path}")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"WAV文件缺少data块: {path}")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                if chunk_size % 2:
+                    f.seek(1, 1)
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                data_size = chunk_size
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)
+    if fmt is None:
+        raise ValueError(f"WAV文件缺少fmt块: {path}")
+
+    format_tag, channels, samplerate = struct.unpack('<HHI', fmt[:8])
+    bits = struct.unpack('<H', fmt[14:16])[0]
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        # 扩展格式的子格式GUID前两个字节即格式标签
+        format_tag = struct.unpack('<H', fmt[24:26])[0]
+
+    bytes_per_sample = bits // 8
+    # 部分录音软件写入的data长度为0或超出文件大小，按实际文件长度截断
+    available = os.path.getsize(path) - data_offset
+    if data_size == 0 or data_size > available:
+        data_size = available
+    frames = data_size // (bytes_per_sample * channels)
+
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        dtype, scale = ('<f4' if bits == 32 else '<f8'), 1.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 16:
+        dtype, scale = '<i2', 1.0 / 32768.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 32:
+        dtype, scale = '<i4', 1.0 / 2147483648.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 24:
+        data = np.memmap(path, dtype=np.uint8, mode='r', offset=data_offset, shape=(frames, channels, 3))
+        return data, samplerate, 1.0 / 8388608.0
+    else:
+        raise ValueError(f"不支持的WAV格式: format={format_tag}, bits={bits}")
+
+    data = np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(frames, channels))
+    return data, samplerate, scale
+
+class FileAudioStream:
+    """
+    基于录音文件的音频源，接口与AudioStream一致
+    WAV文件以内存映射方式读取，FLAC文件通过可选依赖soundfile按帧解码。
+    文件读完后get_audio_chunk返回None。
+    """
+
+    def __init__(self, path, chunk_duration=0.1, hop_duration=None):
+        """
+        Args:
+            path: 16通道WAV/FLAC录音文件路径
+            chunk_duration: 每帧分析窗口时长（秒）
+            hop_duration: 帧移（秒），默认等于chunk_duration
+        """
+        self.path = path
+        self._soundfile = None
+        if path.lower().endswith('.flac'):
+            import soundfile
+            self._soundfile = soundfile.SoundFile(path)
+            self.samplerate = self._soundfile.samplerate
+            self.channels = self._soundfile.channels
+            self.total_samples = self._soundfile.frames
+            self._data, self._scale = None, 1.0
+        else:
+            self._data, self.samplerate, self._scale = open_wav_memmap(path)
+            self.total_samples = self._data.shape[0]
+            self.channels = self._data.shape[1]
+
+        self.chunk_duration = chunk_duration
+        self.chunk_samples = int(self.samplerate * chunk_duration)
+        self.hop_samples = int(self.samplerate * hop_duration) if hop_duration else self.chunk_samples
+        if self.hop_samples <= 0 or self.hop_samples > self.chunk_samples:
+            self.close()
+            raise ValueError("hop_duration必须大于0且不大于chunk_duration")
+        self.frame_start_sample = 0
+        self.overruns = 0
+        self._next_start = 0
+        # 预分配的输出帧 (channels, samples)，每次读取复用
+        self._frame = np.zeros((self.channels, self.chunk_samples), dtype=np.float32)
+
+    def start(self):
+        pass
+
+    def read_frame(self):
+        """读取下一帧，返回预分配缓冲；文件读完时返回None"""
+        start = self._next_start
+        end = start + self.chunk_samples
+        if end > self.total_samples:
+            return None
+
+        if self._soundfile is not None:
+            self._soundfile.seek(start)
+            block = self._soundfile.read(self.chunk_samples, dtype='float32', always_2d=True)
+            self._frame[:] = block.T
+        elif self._data.ndim == 3:
+            # 24位PCM：把3个字节拼成带符号整数
+            raw = self._data[start:end].astype(np.int32)
+            samples = (raw[..., 0] | (raw[..., 1] << 8) | (raw[..., 2] << 16))
+            samples = np.where(samples >= 0x800000, samples - 0x1000000, samples)
+            np.multiply(samples.T, self._scale, out=self._frame, casting='unsafe')
+        else:
+            np.multiply(self._data[start:end].T, self._scale, out=self._frame, casting='unsafe')
+
+        self.frame_start_sample = start
+        self._next_start = start + self.hop_samples
+        return self._frame
+
+    def get_audio_chunk(self):
+        return self.read_frame()
+
+    def close(self):
+        if self._soundfile is not None:
+            self._soundfile.close()
+            self._soundfile = None
+        self._data = None
+
+class ResultWriter:
+    """把逐帧分析结果写入CSV文件，代替OSC输出"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['time'] + [f'mapped_{i + 1}' for i in range(6)] +
+                              ['x', 'y', 'osc_x', 'osc_y', 'goal_left', 'goal_right', 'bpm'])
+
+    def write(self, frame_time, result):
+        raw_pos = result['raw_pos']
+        osc_x, osc_y = result['osc_pos']
+        self._writer.writerow([f'{frame_time:.4f}'] + [int(v) for v in result['mapped_channels']] +
+                              [f'{raw_pos[0]:.2f}', f'{raw_pos[1]:.2f}', f'{osc_x:.4f}', f'{osc_y:.4f}'] +
+                              list(result['goal_detection']) + [f"{result['bpm']:.2f}"])
+
+    def close(self):
+        self._file.close()
+
+def run_replay(audio_stream, processor, writer=None):
+    """
+    以CPU允许的最快速度处理整个录音
+    audio_stream: FileAudioStream
+    processor: FrameProcessor
+    writer: 可选的ResultWriter
+    返回统计字典: 帧数、录音时长、处理耗时、帧率和实时倍数
+    """
+    frames = 0
+    start_time = time.perf_counter()
+    while True:
+        audio_chunk = audio_stream.get_audio_chunk()
+        if audio_chunk is None:
+            break
+        result = processor.process(audio_chunk, audio_stream.frame_start_sample)
+        if writer is not None:
+            frame_time = (audio_stream.frame_start_sample + audio_stream.chunk_samples) / audio_stream.samplerate
+            writer.write(frame_time, result)
+        frames += 1
+    elapsed = time.perf_counter() - start_time
+
+    audio_seconds = audio_stream.total_samples / audio_stream.samplerate
+    return {
+        'frames': frames,
+        'audio_seconds': audio_seconds,
+        'elapsed_seconds': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else 0.0,
+        'realtime_factor': audio_seconds / elapsed if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,61 @@
+import numpy as np
+from utils.kernels import NUMPY_KERNELS
+
+class SlidingRMS:
+    """
+    滑动窗口RMS
+    窗口由最近若干次更新组成：每次更新只对新样本求一次平方和，存入按更新次数循环的环形缓冲，
+    并维护窗口内的总平方和（加上新块、减去移出窗口的块），代价与新样本数成正比，与窗口长度无关。
+    环形缓冲每转一圈重新求和一次，消除浮点累积误差。窗口尚未填满时按已有样本计算。
+    """
+
+    def __init__(self, channels, window_samples, hop_samples, kernels=None):
+        """
+        Args:
+            channels: 通道数
+            window_samples: 窗口长度（样本），按hop_samples取整为整数个块
+            hop_samples: 每次更新的新样本数（帧移）
+            kernels: 计算平方和的内核后端（utils.kernels），默认NumPy
+        """
+        if window_samples <= 0 or hop_samples <= 0:
+            raise ValueError("window_samples和hop_samples必须大于0")
+        self.channels = channels
+        self.kernels = kernels if kernels is not None else NUMPY_KERNELS
+        self.blocks = max(1, int(round(window_samples / hop_samples)))
+        self.window_samples = self.blocks * hop_samples
+        # 每个块的各通道平方和，以及块的样本数
+        self._energies = np.zeros((self.blocks, channels))
+        self._counts = [0] * self.blocks
+        self._sum = np.zeros(channels)
+        self._samples = 0
+        self._pos = 0
+
+    def reset(self):
+        self._energies.fill(0.0)
+        self._counts = [0] * self.blocks
+        self._sum.fill(0.0)
+        self._samples = 0
+        self._pos = 0
+
+    def update(self, samples, start=0):
+        """
+        加入新样本并返回窗口内各通道的RMS
+        samples: np.array, shape (channels, n) - 从start开始为新样本（传入整帧的行切片，不必先按样本切片）
+        返回 np.array, shape (channels,)
+        """
+        pos = self._pos
+        energy = self._energies[pos]
+        self._sum -= energy
+        self.kernels.sum_squares(samples, start, energy)
+        self._sum += energy
+        n = samples.shape[1] - start
+        self._samples += n - self._counts[pos]
+        self._counts[pos] = n
+        self._pos = pos + 1
+        if self._pos == self.blocks:
+            self._pos = 0
+            np.sum(self._energies, axis=0, out=self._sum)
+
+        if self._samples <= 0:
+            return np.zeros(self.channels)
+        return np.sqrt(np.maximum(self._sum, 0.0) / self._samples)
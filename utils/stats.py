@@ -0,0 +1,136 @@
+import json
+import os
+import time
+import numpy as np
+from utils.config import as_runtime_config
+
+# 热路径各阶段名称
+STAGES = ('capture', 'rms', 'position', 'goals', 'tempo', 'osc', 'frame', 'latency')
+
+class NullStats:
+    """关闭统计时使用的空实现，接口与PerformanceStats一致"""
+
+    def record(self, stage, seconds):
+        pass
+
+    def end_frame(self, seconds):
+        pass
+
+    def maybe_publish(self, sender=None):
+        return None
+
+    def close(self):
+        pass
+
+class PerformanceStats:
+    """
+    热路径耗时统计
+    每个阶段把最近window次耗时写入预分配的环形数组，只在发布时计算p50/p95/p99，
+    记录一次耗时只是一次数组赋值，可以在生产环境常开。
+    """
+
+    def __init__(self, frame_budget, stages=STAGES, window=1024, publish_interval=5.0,
+                 log_path=None, address="/foosball_stats"):
+        """
+        Args:
+            frame_budget: 每帧处理时间预算（秒），超过即计为一次overrun，通常等于帧移
+            stages: 阶段名称
+            window: 每个阶段保留的最近样本数
+            publish_interval: 发布间隔（秒）
+            log_path: JSON lines统计文件路径，为None时不写文件
+            address: 统计数据的OSC地址前缀
+        """
+        self.frame_budget = frame_budget
+        self.stages = tuple(stages)
+        self.window = window
+        self.publish_interval = publish_interval
+        self.log_path = log_path
+        self.address = address
+
+        self._stage_index = {name: i for i, name in enumerate(self.stages)}
+        self._samples = np.zeros((len(self.stages), window))
+        # 每个阶段累计记录次数（只由记录该阶段的线程修改）
+        self._counts = [0] * len(self.stages)
+        self.frames = 0
+        self.overruns = 0
+
+        self._last_publish = time.monotonic()
+        self._last_frames = 0
+        self._log_file = None
+        if log_path is not None:
+            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+            self._log_file = open(log_path, 'a')
+
+    def record(self, stage, seconds):
+        """记录一次阶段耗时（秒）"""
+        i = self._stage_index[stage]
+        self._samples[i, self._counts[i] % self.window] = seconds
+        self._counts[i] += 1
+
+    def end_frame(self, seconds):
+        """记录一帧的总处理时间，超过预算时计为overrun"""
+        self.record('frame', seconds)
+        self.frames += 1
+        if seconds > self.frame_budget:
+            self.overruns += 1
+
+    def summary(self):
+        """
+        计算各阶段耗时分位数（毫秒）
+        返回字典: {'stages': {name: {'p50', 'p95', 'p99', 'max', 'count'}}, 'frames', 'overruns', 'fps'}
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._last_publish, 1e-9)
+        stages = {}
+        for i, name in enumerate(self.stages):
+            count = self._counts[i]
+            if count == 0:
+                continue
+            samples = self._samples[i, :min(count, self.window)] * 1000.0
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            stages[name] = {'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+                            'max': float(samples.max()), 'count': count}
+        return {
+            'time': time.time(),
+            'stages': stages,
+            'frames': self.frames,
+            'overruns': self.overruns,
+            'fps': (self.frames - self._last_frames) / elapsed,
+        }
+
+    def maybe_publish(self, sender=None):
+        """
+        到达发布间隔时写入JSON lines文件并通过OSC发送统计
+        sender: 带send_stats方法的OSC发送器，为None时只写文件
+        返回发布的统计字典，未到发布时间时返回None
+        """
+        now = time.monotonic()
+        if now - self._last_publish < self.publish_interval:
+            return None
+        summary = self.summary()
+        self._last_publish = now
+        self._last_frames = self.frames
+
+        if self._log_file is not None:
+            self._log_file.write(json.dumps(summary) + "\n")
+            self._log_file.flush()
+        if sender is not None:
+            sender.send_stats(summary, self.address)
+        return summary
+
+    def close(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+def create_stats(config):
+    """根据配置创建统计对象，未启用时返回NullStats"""
+    runtime = as_runtime_config(config)
+    stats_config = runtime.section('stats')
+    if not stats_config.get('enabled', False):
+        return NullStats()
+    return PerformanceStats(runtime.frame_duration,
+                            window=stats_config.get('window', 1024),
+                            publish_interval=stats_config.get('publish_interval', 5.0),
+                            log_path=stats_config.get('log_path'),
+                            address=stats_config.get('address', "/foosball_stats"))
@@ -0,0 +1,301 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import yaml
+from utils.config import load_runtime_config
+
+# 共享内存中每帧结果记录的字段
+RECORD_FIELDS = ('seq', 'frame_start_sample',
+                 'mapped_1', 'mapped_2', 'mapped_3', 'mapped_4', 'mapped_5', 'mapped_6',
+                 'x', 'y', 'osc_x', 'osc_y', 'goal_left', 'goal_right', 'bpm',
+                 'ball_speed', 'ball_direction')
+# 进球事件：每帧每个球门最多一个，每个事件 [球门, 时间, 样本序号]，球门为-1表示没有事件
+RECORD_GOAL_EVENTS = 2
+RECORD_FIELDS += tuple(f'event{k}_{field}' for k in range(RECORD_GOAL_EVENTS) for field in ('goal', 'time', 'sample'))
+# 射门事件：每帧最多一次射门（有冷却）和每个球门一次射门得分，每个事件 [类型, 球门, 速度, 时间]，类型为-1表示没有事件
+RECORD_SHOT_EVENTS = 3
+RECORD_FIELDS += tuple(f'shot{k}_{field}' for k in range(RECORD_SHOT_EVENTS)
+                       for field in ('event', 'goal', 'speed', 'time'))
+# 多声源定位的输出：每个声源 [source序号, osc_x, osc_y]，序号为-1表示该位置没有声源
+RECORD_SOURCES = 4
+RECORD_FIELDS += tuple(f'source{k}_{field}' for k in range(RECORD_SOURCES) for field in ('id', 'osc_x', 'osc_y'))
+FIELD_INDEX = {name: i for i, name in enumerate(RECORD_FIELDS)}
+# 头部：int64写入计数
+HEADER_BYTES = 8
+
+log = logging.getLogger(__name__)
+
+class ResultRing:
+    """
+    共享内存中的单生产者单消费者结果环形缓冲
+    工作进程写入每帧分析结果（固定长度的float64记录），主进程读取并集中输出。
+    写入顺序为 记录字段 -> 记录序号 -> 头部计数，读取时校验序号，读到被覆盖的记录会丢弃。
+    """
+
+    def __init__(self, slots=256, name=None):
+        """
+        Args:
+            slots: 记录数
+            name: 已存在的共享内存名称，为None时新建
+        """
+        size = HEADER_BYTES + slots * len(RECORD_FIELDS) * 8
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        self.slots = slots
+        self._count = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self._records = np.ndarray((slots, len(RECORD_FIELDS)), dtype=np.float64,
+                                   buffer=self.shm.buf, offset=HEADER_BYTES)
+        if self.owner:
+            self._count[0] = 0
+        self._read_count = int(self._count[0])
+        # 读取过慢被覆盖而丢弃的记录数
+        self.dropped = 0
+
+    def write(self, record):
+        """
+        写入一条记录（record为长度len(RECORD_FIELDS)的数组，seq字段由本方法填写）
+        先把槽位的序号置为-1再写字段，读取方在拷贝前后看到的序号不一致时丢弃该记录
+        """
+        seq = int(self._count[0])
+        slot = self._records[seq % self.slots]
+        slot[0] = -1
+        slot[1:] = record[1:]
+        slot[0] = seq
+        self._count[0] = seq + 1
+
+    def read_new(self):
+        """读取上次读取之后的新记录，返回记录副本列表"""
+        count = int(self._count[0])
+        if count - self._read_count > self.slots:
+            self.dropped += count - self._read_count - self.slots
+            self._read_count = count - self.slots
+        records = []
+        for seq in range(self._read_count, count):
+            slot = self._records[seq % self.slots]
+            record = slot.copy()
+            # 拷贝之后槽位序号仍为seq、且写入方还没有开始覆盖该槽位（计数只在写完后增加）时记录才完整
+            if int(record[0]) == seq and int(slot[0]) == seq and int(self._count[0]) - seq < self.slots:
+                records.append(record)
+            else:
+                self.dropped += 1
+        self._read_count = count
+        return records
+
+    def reset_reader(self):
+        """工作进程重启后从当前位置开始读取"""
+        self._read_count = int(self._count[0])
+
+    def close(self):
+        self._count = None
+        self._records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def table_worker(name, config_path, cpu, ring_name, ring_slots):
+    """
+    球桌工作进程：采集和分析一张球桌，结果写入共享内存
+    在独立进程中运行，绑定到指定CPU核心；崩溃只影响本球桌
+    """
+    # 主进程退出时terminate工作进程：按Ctrl+C处理，写完逐帧记录、录音和校准状态再退出
+    signal.signal(signal.SIGTERM, _interrupt)
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError as e:
+            log.warning("[%s] 无法绑定到CPU %s: %s，不绑定核心继续运行", name, cpu, e)
+
+    # 在子进程中导入采集和分析模块，主进程不需要音频设备
+    from utils.audio_stream import create_audio_stream
+    from utils.log import create_frame_log, setup_logging
+    from utils.processor import create_processor
+
+    # 主进程已校验过配置，这里命中同一个编译缓存
+    runtime, _ = load_runtime_config(config_path)
+    logging_service = setup_logging(runtime)
+    # 逐帧记录在工作进程中写（主进程只转发OSC），每张球桌的配置应使用各自的frame_log路径
+    frame_log = create_frame_log(runtime)
+    ring = ResultRing(ring_slots, name=ring_name)
+    audio_stream = create_audio_stream(runtime)
+    processor = create_processor(runtime, audio_stream.chunk_samples, hop_samples=audio_stream.hop_samples)
+    record = np.zeros(len(RECORD_FIELDS))
+    try:
+        audio_stream.start()
+        while True:
+            audio_chunk = audio_stream.get_audio_chunk()
+            result = processor.process(audio_chunk, audio_stream.frame_start_sample)
+            record[FIELD_INDEX['frame_start_sample']] = audio_stream.frame_start_sample
+            record[FIELD_INDEX['mapped_1']:FIELD_INDEX['mapped_6'] + 1] = result['mapped_channels']
+            record[FIELD_INDEX['x']:FIELD_INDEX['y'] + 1] = result['raw_pos']
+            record[FIELD_INDEX['osc_x']:FIELD_INDEX['osc_y'] + 1] = result['osc_pos']
+            record[FIELD_INDEX['goal_left']:FIELD_INDEX['goal_right'] + 1] = result['goal_detection']
+            record[FIELD_INDEX['bpm']] = result['bpm']
+            events = record[FIELD_INDEX['event0_goal']:FIELD_INDEX['event0_goal'] + 3 * RECORD_GOAL_EVENTS]
+            events = events.reshape(RECORD_GOAL_EVENTS, 3)
+            events[:, 0] = -1
+            for k, (goal_index, sample_index, stream_time) in enumerate(result['goal_events'][:RECORD_GOAL_EVENTS]):
+                events[k] = (goal_index, stream_time, sample_index)
+            # 射门分析：每帧的球速、方向（ball_speed为-1表示未启用）和本帧的全部射门事件
+            record[FIELD_INDEX['ball_speed']:FIELD_INDEX['ball_direction'] + 1] = result['ball'] or (-1, 0)
+            shots = record[FIELD_INDEX['shot0_event']:FIELD_INDEX['shot0_event'] + 4 * RECORD_SHOT_EVENTS]
+            shots = shots.reshape(RECORD_SHOT_EVENTS, 4)
+            shots[:, 0] = -1
+            for k, event in enumerate((result['shot_events'] or ())[:RECORD_SHOT_EVENTS]):
+                shots[k] = event
+            sources = record[FIELD_INDEX['source0_id']:].reshape(RECORD_SOURCES, 3)
+            sources[:, 0] = -1
+            for k, source in enumerate((result['osc_sources'] or ())[:RECORD_SOURCES]):
+                sources[k] = source
+            ring.write(record)
+            frame_log.write(result)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # 清理期间再收到的Ctrl+C或terminate不打断文件写出
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        audio_stream.close()
+        processor.close()
+        frame_log.close()
+        ring.close()
+        logging_service.close()
+
+class TableHandle:
+    """主进程中一张球桌的状态：工作进程、结果环形缓冲和OSC发送器"""
+
+    def __init__(self, name, config_path, cpu, ring_slots):
+        from utils.osc_sender import create_osc_sender
+        # 配置无效时抛出ConfigError，不启动任何工作进程
+        self.config, _ = load_runtime_config(config_path)
+        self.name = name
+        self.config_path = config_path
+        self.cpu = cpu
+        self.ring = ResultRing(ring_slots)
+        self.sender = create_osc_sender(self.config)
+        self.process = None
+        self.restarts = 0
+        self.restart_at = None
+        self.frames = 0
+        self.last_record = None
+
+class Supervisor:
+    """
+    多球桌调度：每张球桌一个绑定CPU核心的工作进程，结果经共享内存汇总到主进程统一发送OSC。
+    工作进程退出后按restart_delay自动重启，不影响其他球桌。
+    """
+
+    def __init__(self, tables, restart_delay=2.0, poll_interval=0.002, report_interval=5.0, ring_slots=256):
+        """
+        Args:
+            tables: [{'name', 'config', 'cpu'}] 球桌配置列表
+            restart_delay: 工作进程退出后重启前的等待时间（秒）
+            poll_interval: 主进程轮询共享内存的间隔（秒）
+            report_interval: 打印汇总状态的间隔（秒）
+            ring_slots: 每张球桌结果环形缓冲的记录数
+        """
+        self.restart_delay = restart_delay
+        self.poll_interval = poll_interval
+        self.report_interval = report_interval
+        self._context = multiprocessing.get_context('spawn')
+        self.tables = [TableHandle(t.get('name', f"table{i + 1}"), t['config'], t.get('cpu'), ring_slots)
+                       for i, t in enumerate(tables)]
+
+    def _start_worker(self, table):
+        table.process = self._context.Process(
+            target=table_worker, name=f"foosball-{table.name}",
+            args=(table.name, table.config_path, table.cpu, table.ring.name, table.ring.slots),
+            daemon=True)
+        table.process.start()
+        table.ring.reset_reader()
+        table.restart_at = None
+
+    def _check_worker(self, table, now):
+        if table.process.is_alive():
+            return
+        if table.restart_at is None:
+            log.error("[%s] 工作进程退出 (exitcode=%s)，%s秒后重启", table.name, table.process.exitcode,
+                      self.restart_delay)
+            table.restart_at = now + self.restart_delay
+        elif now >= table.restart_at:
+            table.restarts += 1
+            self._start_worker(table)
+
+    def _publish(self, table, record):
+        """把共享内存中的一条记录按该球桌的OSC配置发送"""
+        i = FIELD_INDEX
+        sender = table.sender
+        mapped_channels = record[i['mapped_1']:i['mapped_6'] + 1]
+        goal_detection = record[i['goal_left']:i['goal_right'] + 1]
+        sender.send_full_status(mapped_channels, record[i['x']], record[i['y']], goal_detection, record[i['bpm']])
+        sender.send_position(record[i['osc_x']], record[i['osc_y']])
+        sources = record[i['source0_id']:].reshape(RECORD_SOURCES, 3)
+        sender.send_sources([(int(source_id), source_x, source_y)
+                             for source_id, source_x, source_y in sources if source_id >= 0])
+        events = record[i['event0_goal']:i['event0_goal'] + 3 * RECORD_GOAL_EVENTS].reshape(RECORD_GOAL_EVENTS, 3)
+        for goal_index, stream_time, sample_index in events:
+            if goal_index >= 0:
+                sender.send_goal_event(int(goal_index), stream_time, int(sample_index))
+        if record[i['ball_speed']] >= 0:
+            sender.send_ball(record[i['ball_speed']], record[i['ball_direction']])
+        shots = record[i['shot0_event']:i['shot0_event'] + 4 * RECORD_SHOT_EVENTS].reshape(RECORD_SHOT_EVENTS, 4)
+        for event, goal, speed, shot_time in shots:
+            if event >= 0:
+                sender.send_shot_event(int(event), int(goal), speed, shot_time)
+        sender.flush()
+
+    def _report(self, elapsed):
+        for table in self.tables:
+            state = "运行中" if table.process is not None and table.process.is_alive() else "已停止"
+            line = f"[{table.name}] {state}, 帧率: {table.frames / elapsed:.1f} fps, 重启: {table.restarts}, 丢弃: {table.ring.dropped}"
+            if table.last_record is not None:
+                i = FIELD_INDEX
+                line += f", 位置: ({table.last_record[i['x']]:.1f}, {table.last_record[i['y']]:.1f}), BPM: {table.last_record[i['bpm']]:.1f}"
+            print(line)
+            table.frames = 0
+
+    def run(self):
+        """启动所有工作进程并在主进程中汇总输出，直到KeyboardInterrupt"""
+        for table in self.tables:
+            self._start_worker(table)
+        last_report = time.monotonic()
+        try:
+            while True:
+                now = time.monotonic()
+                for table in self.tables:
+                    for record in table.ring.read_new():
+                        self._publish(table, record)
+                        table.frames += 1
+                        table.last_record = record
+                    self._check_worker(table, now)
+                if now - last_report >= self.report_interval:
+                    self._report(now - last_report)
+                    last_report = now
+                time.sleep(self.poll_interval)
+        finally:
+            self.close()
+
+    def close(self):
+        for table in self.tables:
+            if table.process is not None and table.process.is_alive():
+                table.process.terminate()
+                table.process.join(1.0)
+            table.sender.close()
+            table.ring.close()
+
+def load_tables(path):
+    """读取多球桌配置文件"""
+    with open(path, 'r') as f:
+        data = yaml.safe_load(f)
+    return data['tables'], data.get('supervisor', {})
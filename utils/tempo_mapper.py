@@ -1,10 +1,79 @@
 import numpy as np
 import time
 
+# 平滑速率和各窗口按100ms帧整定；帧移不同时按实际帧时长换算，使响应速度与帧移无关
+REFERENCE_FRAME_DURATION = 0.1
+
+# 强度分段映射的分段点：[0, 0.001), [0.001, 0.01), [0.01, 0.05), [0.05, 0.1), [0.1, 1.0), [1.0, +inf)
+INTENSITY_BREAKPOINTS = np.array([0.001, 0.01, 0.05, 0.1, 1.0])
+
+class PiecewiseCurve:
+    """
+    预计算的分段映射曲线，与标量映射函数逐段一致
+    每段形如 offset + scale * ((x - x0) * mul / div) ** power，参数按段存成数组，
+    映射任意数量的强度值只需一次searchsorted和几次向量运算
+    """
+
+    def __init__(self, segments, zero_value, min_value, max_value, integer=False):
+        """
+        Args:
+            segments: 每段的 (x0, mul, div, power, scale, offset)，与INTENSITY_BREAKPOINTS对应共6段
+            zero_value: 强度<=0时的取值
+            min_value, max_value: 结果的限制范围
+            integer: 是否截断为整数（0-127映射）
+        """
+        params = np.array(segments, dtype=float)
+        self.x0, self.mul, self.div, self.power, self.scale, self.offset = params.T
+        self.zero_value = zero_value
+        self.min_value = min_value
+        self.max_value = max_value
+        self.integer = integer
+
+    def __call__(self, intensities):
+        x = np.asarray(intensities, dtype=float)
+        segment = np.searchsorted(INTENSITY_BREAKPOINTS, x, side='right')
+        t = np.maximum((x - self.x0[segment]) * self.mul[segment] / self.div[segment], 0.0)
+        values = self.offset[segment] + np.power(t, self.power[segment]) * self.scale[segment]
+        values = np.clip(values, self.min_value, self.max_value)
+        if self.integer:
+            values = np.floor(values).astype(np.int64)
+        return np.where(x <= 0, self.zero_value, values)
+
+# 0-127映射：很小的值映射到0-60，小值0-100，中等值分段线性0-127，大值127
+CURVE_0_127 = PiecewiseCurve([
+    (0.0, 1000.0, 1.0, 0.25, 60.0, 0.0),
+    (0.0, 100.0, 1.0, 0.35, 100.0, 0.0),
+    (0.01, 1.0, 0.04, 1.0, 80.0, 0.0),
+    (0.05, 1.0, 0.05, 1.0, 47.0, 80.0),
+    (0.0, 1.0, 1.0, 1.0, 0.0, 127.0),
+    (0.0, 1.0, 1.0, 1.0, 0.0, 127.0),
+], zero_value=0, min_value=-np.inf, max_value=127, integer=True)
+
+# 0-100映射：静音为50，很小的值40-50，小值40-60，中等值40-90，大值90-100
+CURVE_0_100 = PiecewiseCurve([
+    (0.0, 1000.0, 1.0, 0.25, 10.0, 40.0),
+    (0.0, 100.0, 1.0, 0.35, 20.0, 40.0),
+    (0.01, 1.0, 0.04, 1.0, 25.0, 40.0),
+    (0.05, 1.0, 0.05, 1.0, 25.0, 65.0),
+    (0.1, 1.0, 0.9, 0.5, 10.0, 90.0),
+    (0.0, 1.0, 1.0, 1.0, 0.0, 100.0),
+], zero_value=50.0, min_value=-np.inf, max_value=100.0)
+
+# -10到10映射：很小的值0-2，小值0-4，中等值0-7，大值7-10
+CURVE_MINUS10_10 = PiecewiseCurve([
+    (0.0, 1000.0, 1.0, 0.25, 2.0, 0.0),
+    (0.0, 100.0, 1.0, 0.35, 4.0, 0.0),
+    (0.01, 1.0, 0.04, 1.0, 3.5, 0.0),
+    (0.05, 1.0, 0.05, 1.0, 3.5, 3.5),
+    (0.1, 1.0, 0.9, 0.5, 3.0, 7.0),
+    (0.0, 1.0, 1.0, 1.0, 0.0, 10.0),
+], zero_value=0.0, min_value=-10.0, max_value=10.0)
+
 class TempoMapper:
     def __init__(self, base_bpm=120, max_bpm=180, min_bpm=60, 
                  attack_rate=0.15, decay_rate=0.08, silence_decay_rate=0.2,
-                 silence_threshold=0.05, history_length=50):
+                 silence_threshold=0.05, history_length=50, boost_half_life=0.65,
+                 frame_duration=REFERENCE_FRAME_DURATION):
         """
         基于响度数据的BPM映射器
         
@@ -16,7 +85,11 @@ class TempoMapper:
             decay_rate: 下降速率 (0.08) - 更快的响应
             silence_decay_rate: 静音时下降速率 (0.2) - 更快的响应
             silence_threshold: 静音阈值 (0.05)
-            history_length: 历史记录长度 (50)
+            history_length: 历史记录长度 (50)，可以设到上千帧跟踪缓慢的速度趋势，每帧开销不随之增长
+            boost_half_life: 射门等事件加入的BPM增量的半衰期（秒，0.65），按帧移换算为每帧的衰减
+            frame_duration: 每次update_bpm对应的时长（秒，即帧移）。各速率是每100ms向目标靠近的比例，
+                帧移更短时按 1 - (1 - rate) ** (frame_duration / 0.1) 换算为每帧的比例；
+                最近RMS窗口（0.5秒）和强度变化率的跨度（0.2秒）也按时长换算为帧数
         """
         self.base_bpm = base_bpm
         self.max_bpm = max_bpm
@@ -26,12 +99,112 @@ class TempoMapper:
         self.silence_decay_rate = silence_decay_rate
         self.silence_threshold = silence_threshold
         self.history_length = history_length
+        self.boost_half_life = boost_half_life
+        self._boost_decay = 0.5 ** (frame_duration / boost_half_life)
+        self.frame_duration = frame_duration
+        self._frame_ratio = frame_duration / REFERENCE_FRAME_DURATION
         
         # 状态变量
         self.current_bpm = base_bpm
         self.last_update_time = time.time()
-        self.rms_history = []
-        self.intensity_history = []
+        # 事件（例如射门）加入的目标BPM增量，按boost_half_life随时间衰减
+        self.boost = 0.0
+
+        # 历史记录保存在预分配的NumPy环形缓冲中，维护滑动和，update_bpm每帧O(1)且不分配内存
+        self._capacity = max(1, history_length)
+        self._rms_ring = np.zeros(self._capacity)
+        self._intensity_ring = np.zeros(self._capacity)
+        self._pos = 0       # 下一个写入位置（也是缓冲满时最旧元素的位置）
+        self._length = 0    # 缓冲中的有效帧数
+        # 变化率参考的最近RMS窗口（0.5秒，100ms帧时为5帧），及其滑动和
+        self._recent_window = min(max(1, round(5 * REFERENCE_FRAME_DURATION / frame_duration)), self._capacity)
+        # 强度变化率的跨度（0.2秒，100ms帧时为2帧）
+        self._change_span = min(max(2, round(2 * REFERENCE_FRAME_DURATION / frame_duration)), self._capacity - 1)
+        self._recent_rms_sum = 0.0
+        # 整个历史窗口的滑动和，用于长时间的趋势
+        self._rms_sum = 0.0
+        self._intensity_sum = 0.0
+        # 按通道数缓存的加权平均权重
+        self._weights = {}
+
+    @property
+    def rms_history(self):
+        """RMS历史（从旧到新的列表副本，仅用于查看）"""
+        return self._ordered(self._rms_ring).tolist()
+
+    @property
+    def intensity_history(self):
+        """强度历史（从旧到新的列表副本，仅用于查看）"""
+        return self._ordered(self._intensity_ring).tolist()
+
+    def _ordered(self, ring):
+        order = np.arange(self._pos - self._length, self._pos) % self._capacity
+        return ring[order]
+
+    def _push(self, rms, intensity):
+        """写入一帧历史，O(1)更新滑动和"""
+        capacity = self._capacity
+        length = self._length
+        pos = self._pos
+        window = self._recent_window
+        if length >= window:
+            # 最近窗口最早的一帧移出窗口
+            self._recent_rms_sum -= self._rms_ring[(pos - window) % capacity]
+        if length == capacity:
+            # 缓冲已满，最旧的一帧移出
+            self._rms_sum -= self._rms_ring[pos]
+            self._intensity_sum -= self._intensity_ring[pos]
+        else:
+            self._length = length + 1
+        self._rms_ring[pos] = rms
+        self._intensity_ring[pos] = intensity
+        self._recent_rms_sum += rms
+        self._rms_sum += rms
+        self._intensity_sum += intensity
+        self._pos = (pos + 1) % capacity
+
+        if self._pos == 0:
+            # 每绕一圈按缓冲内容重算一次滑动和，消除浮点累积误差
+            self._resync()
+
+    def _resync(self):
+        rms = self._ordered(self._rms_ring)
+        self._recent_rms_sum = float(rms[-self._recent_window:].sum())
+        self._rms_sum = float(rms.sum())
+        self._intensity_sum = float(self._intensity_ring[:self._length].sum())
+
+    def _recent_rms_mean(self):
+        """最近5帧RMS的平均值，没有历史时返回None"""
+        if self._length == 0:
+            return None
+        return self._recent_rms_sum / min(self._length, self._recent_window)
+
+    def _recent_change(self):
+        """
+        最近0.2秒强度的平均变化率（每100ms），100ms帧时即 np.mean(np.diff(intensity_history[-3:]))
+        """
+        ring = self._intensity_ring
+        capacity = self._capacity
+        span = self._change_span
+        last = ring[(self._pos - 1) % capacity]
+        first = ring[(self._pos - 1 - span) % capacity]
+        return (last - first) / (span * self._frame_ratio)
+
+    def _frame_rate(self, rate):
+        """把每100ms的平滑比例换算为每帧的比例"""
+        if self._frame_ratio == 1.0:
+            return rate
+        return 1.0 - (1.0 - rate) ** self._frame_ratio
+
+    def add_boost(self, bpm):
+        """加入目标BPM增量，使BPM对射门等事件做出反应，而不只跟随响度"""
+        self.boost += bpm
+
+    def get_history_means(self):
+        """整个历史窗口的 (平均RMS, 平均强度)，用于缓慢的速度趋势；没有历史时返回 (0.0, 0.0)"""
+        if self._length == 0:
+            return 0.0, 0.0
+        return self._rms_sum / self._length, self._intensity_sum / self._length
         
     def map_intensity_to_minus10_10(self, intensity):
         """
@@ -191,6 +364,32 @@ class TempoMapper:
             
             return min(127, int(mapped_value))
     
+    def map_intensity_to_minus10_10_batch(self, intensities):
+        """map_intensity_to_minus10_10的向量版本：强度数组 -> -10到10数组"""
+        return CURVE_MINUS10_10(intensities)
+
+    def map_intensity_to_0_100_batch(self, intensities):
+        """map_intensity_to_0_100的向量版本：强度数组 -> 0-100数组"""
+        return CURVE_0_100(intensities)
+
+    def map_intensity_to_0_127_batch(self, intensities):
+        """map_intensity_to_0_127的向量版本：强度数组 -> 0-127整数数组"""
+        return CURVE_0_127(intensities)
+
+    def calculate_intensity_batch(self, rms_values):
+        """
+        逐通道计算声音强度，等价于对每个通道分别调用calculate_intensity([channel_rms])
+        rms_values: np.array, shape (channels,)
+        返回 np.array, shape (channels,)
+        """
+        rms_values = np.asarray(rms_values, dtype=float)
+        recent_mean = self._recent_rms_mean()
+        if recent_mean is not None:
+            rms_change = np.abs(rms_values - recent_mean)
+        else:
+            rms_change = 0.0
+        return rms_values * 0.7 + rms_change * 0.3
+
     def calculate_intensity(self, rms_values):
         """
         计算声音强度指标
@@ -200,12 +399,17 @@ class TempoMapper:
             return 0.0
         
         # 计算加权平均（前面的麦克风权重更高）
-        weights = np.linspace(1.0, 0.5, len(rms_values))
-        weighted_rms = np.average(rms_values, weights=weights)
+        count = len(rms_values)
+        if count not in self._weights:
+            weights = np.linspace(1.0, 0.5, count)
+            self._weights[count] = (weights, weights.sum())
+        weights, weight_sum = self._weights[count]
+        weighted_rms = np.dot(weights, rms_values) / weight_sum
         
         # 计算RMS变化率
-        if len(self.rms_history) > 0:
-            rms_change = abs(weighted_rms - np.mean(self.rms_history[-5:]))
+        recent_mean = self._recent_rms_mean()
+        if recent_mean is not None:
+            rms_change = abs(weighted_rms - recent_mean)
         else:
             rms_change = 0.0
         
@@ -228,15 +432,8 @@ class TempoMapper:
         # 映射到-10到10范围
         mapped_intensity = self.map_intensity_to_minus10_10(intensity)
         
-        # 更新历史记录
-        self.rms_history.append(np.mean(rms_values))
-        self.intensity_history.append(intensity)
-        
-        # 保持历史记录长度
-        if len(self.rms_history) > self.history_length:
-            self.rms_history.pop(0)
-        if len(self.intensity_history) > self.history_length:
-            self.intensity_history.pop(0)
+        # 更新历史记录（环形缓冲，超出history_length的最旧记录被覆盖）
+        self._push(np.mean(rms_values), intensity)
         
         # 计算目标BPM - 让变化更明显
         if intensity < self.silence_threshold:
@@ -264,8 +461,8 @@ class TempoMapper:
                 target_bpm = self.base_bpm + bpm_range * (0.8 + normalized * 0.2)
             
             # 根据强度变化率调整，让变化更明显
-            if len(self.intensity_history) > 3:
-                recent_change = np.mean(np.diff(self.intensity_history[-3:]))
+            if self._length > self._change_span + 1:
+                recent_change = self._recent_change()
                 if recent_change > 0.005:  # 强度在上升
                     target_bpm *= 1.05  # 更明显的上升
                 elif recent_change < -0.005:  # 强度在下降
@@ -274,14 +471,21 @@ class TempoMapper:
             # 限制在合理范围内
             target_bpm = max(self.min_bpm, min(self.max_bpm, target_bpm))
             decay_rate = self.decay_rate
+
+        if self.boost > 0.0:
+            # 事件增量叠加在目标BPM上，之后逐帧衰减
+            target_bpm = min(self.max_bpm, target_bpm + self.boost)
+            self.boost *= self._boost_decay
+            if self.boost < 0.01:
+                self.boost = 0.0
         
         # 平滑过渡到目标BPM，但响应更快
         if target_bpm > self.current_bpm:
             # 上升时使用attack_rate
-            self.current_bpm += (target_bpm - self.current_bpm) * self.attack_rate
+            self.current_bpm += (target_bpm - self.current_bpm) * self._frame_rate(self.attack_rate)
         else:
             # 下降时使用decay_rate
-            self.current_bpm += (target_bpm - self.current_bpm) * decay_rate
+            self.current_bpm += (target_bpm - self.current_bpm) * self._frame_rate(decay_rate)
         
         return self.current_bpm, mapped_intensity
     
@@ -292,6 +496,12 @@ class TempoMapper:
     def reset(self):
         """重置状态"""
         self.current_bpm = self.base_bpm
-        self.rms_history = []
-        self.intensity_history = []
+        self.boost = 0.0
+        self._rms_ring.fill(0.0)
+        self._intensity_ring.fill(0.0)
+        self._pos = 0
+        self._length = 0
+        self._recent_rms_sum = 0.0
+        self._rms_sum = 0.0
+        self._intensity_sum = 0.0
         self.last_update_time = time.time() 
\ No newline at end of file
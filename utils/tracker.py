@@ -0,0 +1,127 @@
+import numpy as np
+
+# 输出位置的范围（与OSC坐标映射一致）：x: -10到127, y: 0到68
+X_RANGE = (-10.0, 127.0)
+Y_RANGE = (0.0, 68.0)
+
+def rms_confidence(rms_values, noise_threshold=0.01):
+    """
+    由定位麦克风的RMS分布计算位置估计的置信度 (0-1)
+    各麦克风响度差别越大，重心定位越可信；全部接近噪声或彼此相同时置信度为0
+    """
+    max_rms = float(np.max(rms_values))
+    if max_rms < noise_threshold:
+        return 0.0
+    spread = (max_rms - float(np.min(rms_values))) / max_rms
+    # 响度刚超过噪声阈值时降低置信度
+    level = min(1.0, (max_rms - noise_threshold) / noise_threshold)
+    return spread * level
+
+class BallTracker:
+    """
+    匀速运动模型的卡尔曼滤波跟踪器，代替固定系数的指数平滑
+    状态为每个坐标轴的 [位置, 速度]；两轴共用同一个时间步长和观测噪声，协方差矩阵只需维护一个2x2矩阵。
+    观测噪声随置信度变化：置信度高的估计跟得快，置信度低的估计只做少量修正，置信度为0时只做预测。
+    """
+
+    def __init__(self, process_noise=1000.0, measurement_noise=4.0, min_confidence=0.05,
+                 reset_distance=50.0, latency_smoothing=0.1):
+        """
+        Args:
+            process_noise: 加速度噪声标准差（厘米/秒²），越大越相信观测、对快速射门跟得越紧
+            measurement_noise: 置信度为1时的观测噪声标准差（厘米）
+            min_confidence: 低于该置信度的观测被忽略
+            reset_distance: 观测与预测相差超过该距离（厘米）时直接重置到观测位置
+            latency_smoothing: 测量延迟的指数平滑系数
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.min_confidence = min_confidence
+        self.reset_distance = reset_distance
+        self.latency_smoothing = latency_smoothing
+
+        # 状态 (2轴, [位置, 速度])
+        self.state = np.zeros((2, 2))
+        self.covariance = np.eye(2)
+        self.last_time = None
+        # 平滑后的流水线延迟（秒），预测时向前外推
+        self.latency = 0.0
+
+    def reset(self):
+        self.state.fill(0.0)
+        self.covariance = np.eye(2)
+        self.last_time = None
+
+    def report_latency(self, latency):
+        """记录一次测量到的流水线延迟（秒）"""
+        self.latency += self.latency_smoothing * (latency - self.latency)
+
+    @property
+    def position(self):
+        return self.state[:, 0].copy()
+
+    @property
+    def velocity(self):
+        return self.state[:, 1].copy()
+
+    def _initialize(self, measurement, confidence):
+        self.state[:, 0] = measurement
+        self.state[:, 1] = 0.0
+        r = (self.measurement_noise / max(confidence, self.min_confidence)) ** 2
+        # 初始速度未知，给较大的速度方差
+        self.covariance = np.array([[r, 0.0], [0.0, (self.reset_distance * 10.0) ** 2]])
+
+    def update(self, measurement, confidence, timestamp):
+        """
+        输入一次位置观测
+        measurement: 原始位置估计 [x, y]
+        confidence: 观测置信度 (0-1)，见rms_confidence
+        timestamp: 观测对应的流时间（秒）
+        返回 (位置, 速度)
+        """
+        if self.last_time is None:
+            self.last_time = timestamp
+            self._initialize(measurement, confidence)
+            return self.position, self.velocity
+
+        dt = max(0.0, timestamp - self.last_time)
+        self.last_time = timestamp
+
+        # 预测：x = F x, P = F P F^T + Q
+        self.state[:, 0] += self.state[:, 1] * dt
+        p = self.covariance
+        q = self.process_noise ** 2
+        p00 = p[0, 0] + dt * (p[0, 1] + p[1, 0]) + dt * dt * p[1, 1] + q * dt ** 4 / 4.0
+        p01 = p[0, 1] + dt * p[1, 1] + q * dt ** 3 / 2.0
+        p11 = p[1, 1] + q * dt * dt
+        self.covariance = np.array([[p00, p01], [p01, p11]])
+
+        if confidence < self.min_confidence:
+            return self.position, self.velocity
+
+        innovation = np.asarray(measurement, dtype=float) - self.state[:, 0]
+        if np.hypot(innovation[0], innovation[1]) > self.reset_distance:
+            # 声源跳到了别处（例如另一侧的撞击），不做插值直接重置
+            self._initialize(measurement, confidence)
+            return self.position, self.velocity
+
+        # 修正：K = P H^T / (H P H^T + R)
+        r = (self.measurement_noise / confidence) ** 2
+        s = p00 + r
+        k0 = p00 / s
+        k1 = p01 / s
+        self.state[:, 0] += k0 * innovation
+        self.state[:, 1] += k1 * innovation
+        self.covariance = np.array([[(1.0 - k0) * p00, (1.0 - k0) * p01],
+                                    [(1.0 - k0) * p01, p11 - k1 * p01]])
+        return self.position, self.velocity
+
+    def predict(self, lead_time=None):
+        """
+        外推lead_time秒后的位置，默认外推平滑后的流水线延迟
+        结果限制在桌面坐标范围内
+        """
+        if lead_time is None:
+            lead_time = self.latency
+        x, y = self.state[:, 0] + self.state[:, 1] * lead_time
+        return np.array([np.clip(x, *X_RANGE), np.clip(y, *Y_RANGE)])